@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""Benchmark del plano de control (GlobalChannelManager) usando fake_ffmpeg.py en lugar de feeds SRT.
+
+Para cada tamaño N levanta el servidor en un directorio temporal con N canales falsos,
+conecta M clientes WebSocket a /ws y mide:
+
+    startup_s               tiempo desde el arranque hasta ver todos los canales activos
+    loop_lag_ms             latencia de una petición HTTP trivial con todo en marcha (p50/p99)
+    server_lag_ms           retraso del event loop medido por el propio servidor (/api/debug/stats)
+    status_latency_ms       desde que un ffmpeg cae hasta que cada cliente recibe el cambio (p50/p99/max)
+    restart_throughput_cps  canales/s al reiniciar todos con /api/channels/bulk
+    cpu_percent, rss_mb     consumo del proceso gestor durante la medición
+
+Uso:
+    python bench.py --channels 10,100,1000 --clients 10 --output resultados.json
+    python bench.py --channels 10,100 --compare resultados.json   # marca regresiones
+    python bench.py --channels 10,100 --monitor-mode analyzer      # canales con analizador MPEG-TS
+
+Los números son comparables entre commits si se ejecutan en la misma máquina.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import websockets
+
+REPO = Path(__file__).resolve().parent
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+# Métricas donde un valor mayor es mejor; en el resto, menor es mejor
+HIGHER_IS_BETTER = {"restart_throughput_cps"}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def proc_usage(pid: int):
+    """(segundos de CPU, RSS en MB) leídos de /proc"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    rss = 0.0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1]) / 1024
+    return cpu, rss
+
+
+async def http(port: int, method: str, path: str, body=None, timeout: float = 120.0):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = json.dumps(body).encode() if body is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n".encode() + payload
+    )
+    await writer.drain()
+    response = await asyncio.wait_for(reader.read(), timeout)
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), content
+
+
+class DashboardClient:
+    """Cliente de /ws que aplica snapshots y deltas y registra cuándo ve cada cambio"""
+    def __init__(self, port: int):
+        self.url = f"ws://127.0.0.1:{port}/ws"
+        self.states = {}
+        self.changes = asyncio.Queue()
+        self.task = None
+
+    async def start(self):
+        self.ws = await websockets.connect(self.url, max_size=None)
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        async for raw in self.ws:
+            now = time.monotonic()
+            message = json.loads(raw)
+            if message.get("type") == "snapshot":
+                self.states = {}
+            for state in message.get("channels", []):
+                self.states[state["id"]] = state
+                self.changes.put_nowait((now, state))
+            for channel_id in message.get("removed", []):
+                self.states.pop(channel_id, None)
+
+    def count(self, status: str) -> int:
+        return sum(1 for state in self.states.values() if state["status"] == status)
+
+    async def wait_for(self, predicate, timeout: float):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline:
+                raise TimeoutError("condición no alcanzada")
+            await asyncio.sleep(0.02)
+        return time.monotonic()
+
+    async def close(self):
+        self.task.cancel()
+        await self.ws.close()
+
+
+def write_config(workdir: Path, channels: int, fake_args, monitor_mode: str):
+    config = json.loads((REPO / "config.json").read_text())
+    config.update({
+        "channels": [
+            {"id": i, "name": f"bench-{i}", "enabled": True, "srt_port": 20000 + i}
+            for i in range(1, channels + 1)
+        ],
+        "srt_base_port": 20000,
+        "log_directory": str(workdir / "logs"),
+        "ffmpeg_command_template": [str(REPO / "fake_ffmpeg.py"), "-i", "{srt_url}", *fake_args, "-f", "null", "-"],
+        # En modo analyzer el fake escribe un TS sintético en stdout que analiza el propio gestor
+        "monitor_mode": monitor_mode,
+        "analyzer_command_template": [str(REPO / "fake_ffmpeg.py"), "-i", "{srt_url}", *fake_args, "-f", "data", "pipe:1"],
+        "state_db": None,
+        "config_watch_interval": 3600,
+        # Reinicio inmediato y sin cuarentena: se mide el plano de control, no la política
+        "restart_backoff_base": 0.01,
+        "crash_loop_threshold": 1_000_000,
+        "startup_interval": 0,
+    })
+    (workdir / "config.json").write_text(json.dumps(config, indent=2))
+    (workdir / "frontend").symlink_to(REPO / "frontend")
+
+
+async def bench_size(channels: int, clients: int, args) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix=f"bench-{channels}-"))
+    write_config(workdir, channels, args.fake_args.split(), args.monitor_mode)
+    port = free_port()
+    started = time.monotonic()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", str(REPO), "--port", str(port),
+         "--log-level", "warning"],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=open(workdir / "server.log", "w"),
+        env={**os.environ, "FFPROBE_MODE": "standalone"}
+    )
+    dashboards = []
+    try:
+        while True:
+            try:
+                await http(port, "GET", "/api/channels/1/logs?tail=0", timeout=5)
+                break
+            except OSError:
+                if server.poll() is not None:
+                    raise RuntimeError(f"el servidor terminó; ver {workdir / 'server.log'}")
+                await asyncio.sleep(0.05)
+
+        dashboards = [DashboardClient(port) for _ in range(clients)]
+        await asyncio.gather(*(d.start() for d in dashboards))
+        first = dashboards[0]
+        ready = await first.wait_for(lambda: first.count("active") == channels, args.timeout)
+        startup = ready - started
+        cpu_before, _ = proc_usage(server.pid)
+        measure_started = time.monotonic()
+        await http(port, "GET", "/api/debug/stats?reset=true")
+
+        # Latencia de una petición trivial mientras todo corre (refleja el retraso del event loop)
+        lag = []
+        for _ in range(args.samples):
+            t = time.monotonic()
+            await http(port, "GET", "/api/channels/1/logs?tail=0")
+            lag.append((time.monotonic() - t) * 1000)
+            await asyncio.sleep(0.02)
+
+        # Latencia de un cambio de estado: provocar caídas y esperar a que todos los clientes lo vean
+        status_latency = []
+        for channel_id in list(first.states)[:min(channels, args.crashes)]:
+            for d in dashboards:
+                while not d.changes.empty():
+                    d.changes.get_nowait()
+            pid = first.states[channel_id]["pid"]
+            crashed_at = time.monotonic()
+            os.kill(pid, signal.SIGUSR2)
+            for d in dashboards:
+                while True:
+                    seen, state = await asyncio.wait_for(d.changes.get(), args.timeout)
+                    if state["id"] == channel_id and state["status"] != "active":
+                        status_latency.append((seen - crashed_at) * 1000)
+                        break
+            await first.wait_for(lambda: first.states[channel_id]["status"] == "active", args.timeout)
+
+        # Throughput de reinicio masivo
+        t = time.monotonic()
+        status, _ = await http(port, "POST", "/api/channels/bulk", {
+            "action": "restart", "ids": list(range(1, channels + 1)), "concurrency": args.concurrency
+        }, timeout=args.timeout)
+        if status != 200:
+            raise RuntimeError(f"/api/channels/bulk devolvió {status}")
+        await first.wait_for(lambda: first.count("active") == channels, args.timeout)
+        restart_elapsed = time.monotonic() - t
+
+        cpu_after, rss = proc_usage(server.pid)
+        status, content = await http(port, "GET", "/api/debug/stats")
+        server_lag = json.loads(content)["timings"].get("event_loop_lag", {}) if status == 200 else {}
+        return {
+            "channels": channels,
+            "clients": clients,
+            "monitor_mode": args.monitor_mode,
+            "startup_s": round(startup, 3),
+            "loop_lag_ms": {"p50": round(percentile(lag, 50), 2), "p99": round(percentile(lag, 99), 2)},
+            "server_lag_ms": {"p99": server_lag["p99_ms"], "max": server_lag["max_ms"]} if server_lag.get("count") else None,
+            "status_latency_ms": {
+                "p50": round(percentile(status_latency, 50), 2),
+                "p99": round(percentile(status_latency, 99), 2),
+                "max": round(max(status_latency), 2)
+            } if status_latency else None,
+            "restart_throughput_cps": round(channels / restart_elapsed, 1),
+            "cpu_percent": round(100 * (cpu_after - cpu_before) / (time.monotonic() - measure_started), 1),
+            "rss_mb": round(rss, 1),
+        }
+    finally:
+        for d in dashboards:
+            await d.close()
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        # Los fake_ffmpeg detectan la muerte del gestor en el siguiente tick
+
+
+def flatten(result: dict) -> dict:
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update({f"{key}.{k}": v for k, v in value.items()})
+        elif key not in ("channels", "clients", "monitor_mode"):
+            flat[key] = value
+    return flat
+
+
+def compare(current: dict, previous: dict, threshold: float) -> int:
+    """Imprime la variación respecto a una ejecución previa; devuelve el número de regresiones"""
+    regressions = 0
+    previous_by_size = {r["channels"]: r for r in previous.get("results", [])}
+    for result in current["results"]:
+        old = previous_by_size.get(result["channels"])
+        if not old:
+            continue
+        print(f"\nN={result['channels']} vs {previous.get('commit', '?')[:10]}")
+        old_flat = flatten(old)
+        for key, value in flatten(result).items():
+            before = old_flat.get(key)
+            if not isinstance(value, (int, float)) or not before:
+                continue
+            change = (value - before) / before
+            worse = -change if key.split(".")[0] in HIGHER_IS_BETTER else change
+            flag = "  REGRESIÓN" if worse > threshold else ""
+            regressions += bool(flag)
+            print(f"  {key:28} {before:>10} -> {value:>10} ({change:+.1%}){flag}")
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channels", default="10,100,1000", help="tamaños N separados por comas")
+    parser.add_argument("--clients", type=int, default=10, help="clientes WebSocket M")
+    parser.add_argument("--samples", type=int, default=100, help="peticiones para medir el lag")
+    parser.add_argument("--crashes", type=int, default=10, help="caídas provocadas para medir latencia")
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrencia del reinicio masivo")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--fake-args", default="--fake-stats-period 0.5", help="opciones para fake_ffmpeg.py")
+    parser.add_argument("--monitor-mode", default="decode", choices=("decode", "analyzer"),
+                        help="modo de monitoreo de los canales (analyzer: el gestor analiza el TS)")
+    parser.add_argument("--output", help="guardar resultados en JSON")
+    parser.add_argument("--compare", help="JSON de una ejecución previa para comparar")
+    parser.add_argument("--threshold", type=float, default=0.2, help="empeoramiento que cuenta como regresión")
+    args = parser.parse_args()
+
+    report = {"commit": git_commit(), "python": sys.version.split()[0], "timestamp": time.time(), "results": []}
+    for size in (int(n) for n in args.channels.split(",")):
+        print(f"--- N={size} canales, M={args.clients} clientes", flush=True)
+        result = await bench_size(size, args.clients, args)
+        print(json.dumps(result), flush=True)
+        report["results"].append(result)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.compare:
+        regressions = compare(report, json.loads(Path(args.compare).read_text()), args.threshold)
+        if regressions:
+            print(f"\n{regressions} regresiones por encima del {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
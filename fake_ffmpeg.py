@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""Sustituto de ffmpeg para pruebas de carga del gestor de canales (sin feeds SRT reales).
+
+Imita lo que el gestor lee de ffmpeg: el banner "Input #0" en stderr y los bloques
+clave=valor de `-progress` (pipe:1, pipe:2 o un archivo). Se selecciona desde config.json:
+
+    "ffmpeg_command_template": ["./fake_ffmpeg.py", "-i", "{srt_url}", "--fake-fps", "25", "-f", "null", "-"]
+
+Opciones propias (las demás opciones de ffmpeg se ignoran):
+    --fake-fps N             frames por segundo informados (25)
+    --fake-stats-period S    segundos entre bloques de progreso (0.5, como -stats_period)
+    --fake-signal-delay S    segundos "escuchando" antes de recibir video (0)
+    --fake-crash-after S     termina con código 1 tras S segundos de video
+    --fake-stall-after S     deja de informar progreso tras S segundos (señal perdida)
+    --fake-exit-after S      termina normalmente (código 0) tras S segundos
+    --fake-resolution WxH    resolución del stream de video (1920x1080)
+    --fake-bitrate KBPS      bitrate del transport stream sintético (4000)
+    --fake-cc-errors N       errores de continuity counter inyectados por segundo (0)
+
+Con salida "-f data" o "-f mpegts" escribe un transport stream en lugar de progreso, como el
+modo analyzer del gestor: sintético (PAT/PMT, video con PCR cada 40 ms, audio y relleno nulo) o,
+si la entrada es udp://, el que llegue por ese puerto. Para generar TS local hacia un canal:
+
+    ./fake_ffmpeg.py -i synthetic -f mpegts udp://127.0.0.1:5000
+
+Si el comando incluye la salida de miniaturas del gestor (-f image2pipe pipe:N) escribe un JPEG
+en ese descriptor cada tantos segundos como indique el filtro select (prev_selected_t,N).
+
+Control en caliente: SIGUSR1 alterna la pérdida de señal, SIGUSR2 provoca una caída
+(código 1) y SIGTERM/SIGINT terminan como ffmpeg ("Exiting normally, received signal").
+"""
+import base64
+import os
+import random
+import re
+import signal
+import socket
+import sys
+import time
+from urllib.parse import urlsplit
+
+
+def crc32_mpeg(data: bytes) -> int:
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc ^= byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7 if crc & 0x80000000 else crc << 1) & 0xFFFFFFFF
+    return crc
+
+
+class TSGenerator:
+    """Transport stream CBR sintético: PAT y PMT cada 100 ms, video (PID 0x100, con PCR), audio y nulos"""
+    PMT_PID, VIDEO_PID, AUDIO_PID, NULL_PID = 0x1000, 0x100, 0x101, 0x1FFF
+    PCR_INTERVAL = 0.03
+    PSI_INTERVAL = 0.1
+
+    def __init__(self, bitrate_kbps: float, cc_errors_per_s: float):
+        self.packets_per_s = bitrate_kbps * 1000 / (188 * 8)
+        self.cc_error_probability = cc_errors_per_s / self.packets_per_s
+        self.continuity = {}
+        self.sent = 0
+        self.next_pcr = 0.0
+        self.next_psi = 0.0
+        pat = bytes([0x00, 0xB0, 13, 0x00, 0x01, 0xC1, 0x00, 0x00, 0x00, 0x01,
+                     0xE0 | self.PMT_PID >> 8, self.PMT_PID & 0xFF])
+        pmt = bytes([0x02, 0xB0, 23, 0x00, 0x01, 0xC1, 0x00, 0x00,
+                     0xE0 | self.VIDEO_PID >> 8, self.VIDEO_PID & 0xFF, 0xF0, 0x00,
+                     0x1B, 0xE0 | self.VIDEO_PID >> 8, self.VIDEO_PID & 0xFF, 0xF0, 0x00,
+                     0x0F, 0xE0 | self.AUDIO_PID >> 8, self.AUDIO_PID & 0xFF, 0xF0, 0x00])
+        self.pat = b"\x00" + pat + crc32_mpeg(pat).to_bytes(4, "big")
+        self.pmt = b"\x00" + pmt + crc32_mpeg(pmt).to_bytes(4, "big")
+
+    def packet(self, pid: int, payload: bytes = b"", start: bool = False, pcr: int = None) -> bytes:
+        cc = (self.continuity.get(pid, -1) + 1) & 0x0F
+        if self.cc_error_probability and random.random() < self.cc_error_probability:
+            cc = (cc + 1) & 0x0F  # Paquete "perdido"
+        self.continuity[pid] = cc
+        adaptation = b""
+        flags = 0x10
+        if pcr is not None:
+            base, extension = divmod(pcr, 300)
+            adaptation = bytes([7, 0x10]) + (base << 15 | 0x3F << 9 | extension).to_bytes(6, "big")
+            flags = 0x30
+        header = bytes([0x47, (0x40 if start else 0) | pid >> 8, pid & 0xFF, flags | cc])
+        body = adaptation + payload
+        return header + body + b"\xFF" * (184 - len(body))
+
+    def until(self, elapsed: float) -> bytes:
+        """Paquetes pendientes hasta `elapsed` segundos; el PCR sigue la posición en el stream (CBR)"""
+        target = int(elapsed * self.packets_per_s)
+        packets = []
+        while self.sent < target:
+            position = self.sent / self.packets_per_s
+            if position >= self.next_psi:
+                packets.append(self.packet(0, self.pat, start=True))
+                packets.append(self.packet(self.PMT_PID, self.pmt, start=True))
+                self.sent += 2
+                self.next_psi += self.PSI_INTERVAL
+                continue
+            slot = self.sent % 10
+            if position >= self.next_pcr:
+                packets.append(self.packet(self.VIDEO_PID, pcr=int(position * 27_000_000), start=True))
+                self.next_pcr += self.PCR_INTERVAL
+            elif slot < 8:
+                packets.append(self.packet(self.VIDEO_PID, bytes(184)))
+            elif slot == 8:
+                packets.append(self.packet(self.AUDIO_PID, bytes(184)))
+            else:
+                packets.append(b"\x47\x1F\xFF\x10" + b"\xFF" * 184)
+            self.sent += 1
+        return b"".join(packets)
+
+
+# JPEG de 2x2 píxeles; cada miniatura lleva además un segmento COM distinto para que cambie su ETag
+THUMBNAIL_JPEG = base64.b64decode(
+    "/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDAAgGBgcGBQgHBwcJCQgKDBQNDAsLDBkSEw8UHRofHh0aHBwgJC4nICIsIxwcKDcpLDAxNDQ0Hyc5"
+    "PTgyPC4zNDL/wAALCAACAAIBAREA/8QAHwAAAQUBAQEBAQEAAAAAAAAAAAECAwQFBgcICQoL/8QAtRAAAgEDAwIEAwUFBAQAAAF9AQIDAAQR"
+    "BRIhMUEGE1FhByJxFDKBkaEII0KxwRVS0fAkM2JyggkKFhcYGRolJicoKSo0NTY3ODk6Q0RFRkdISUpTVFVWV1hZWmNkZWZnaGlqc3R1dnd4"
+    "eXqDhIWGh4iJipKTlJWWl5iZmqKjpKWmp6ipqrKztLW2t7i5usLDxMXGx8jJytLT1NXW19jZ2uHi4+Tl5ufo6erx8vP09fb3+Pn6/9oACAEB"
+    "AAA/ACv/2Q=="
+)
+
+
+class Interrupted(Exception):
+    """Interrumpe la espera en curso para terminar en cuanto llega la señal"""
+
+
+class FakeFFmpeg:
+    def __init__(self, argv):
+        self.url = "pipe:"
+        self.progress_target = None
+        self.stats = True
+        self.fps = 25.0
+        self.stats_period = 0.5
+        self.signal_delay = 0.0
+        self.crash_after = None
+        self.stall_after = None
+        self.exit_after = None
+        self.resolution = "1920x1080"
+        self.bitrate = 4000.0
+        self.cc_errors = 0.0
+        self.output_format = None
+        self.output = argv[-1] if argv else "-"
+        self.thumbnail_fd = None
+        self.thumbnail_interval = 10.0
+        self.parse_args(argv)
+        self.ts_output = self.output_format in ("data", "mpegts")
+
+        self.stalled = False
+        self.crash_requested = False
+        self.exit_signal = None
+        # Lanzado en su propia sesión (detached_processes del gestor) sobrevive al gestor, como ffmpeg
+        self.parent = os.getppid() if os.getsid(0) != os.getpid() else None
+
+    def parse_args(self, argv):
+        options = {
+            "--fake-fps": ("fps", float),
+            "--fake-stats-period": ("stats_period", float),
+            "--fake-signal-delay": ("signal_delay", float),
+            "--fake-crash-after": ("crash_after", float),
+            "--fake-stall-after": ("stall_after", float),
+            "--fake-exit-after": ("exit_after", float),
+            "--fake-resolution": ("resolution", str),
+            "--fake-bitrate": ("bitrate", float),
+            "--fake-cc-errors": ("cc_errors", float),
+        }
+        args = iter(argv)
+        for arg in args:
+            if arg == "-i":
+                self.url = next(args, self.url)
+            elif arg == "-progress":
+                self.progress_target = next(args, None)
+            elif arg == "-nostats":
+                self.stats = False
+            elif arg == "-f":
+                self.output_format = next(args, None)
+                if self.output_format == "image2pipe":
+                    # Salida de miniaturas: no es la salida principal
+                    self.output_format = None
+                    target = next(args, "")
+                    if target.startswith("pipe:"):
+                        self.thumbnail_fd = int(target[5:])
+            elif arg == "-vf":
+                interval = re.search(r"prev_selected_t,([\d.]+)", next(args, ""))
+                if interval:
+                    self.thumbnail_interval = float(interval.group(1))
+            elif arg in options:
+                attr, cast = options[arg]
+                setattr(self, attr, cast(next(args)))
+
+    def open_progress(self):
+        if self.progress_target in ("pipe:1", "pipe:"):
+            return sys.stdout
+        if self.progress_target == "pipe:2":
+            return sys.stderr
+        if self.progress_target:
+            return open(self.progress_target, "a")
+        return None
+
+    def banner(self) -> str:
+        width, height = self.resolution.split("x")
+        fps = f"{self.fps:g}"
+        return (
+            f"Input #0, mpegts, from '{self.url}':\n"
+            "  Duration: N/A, start: 0.000000, bitrate: N/A\n"
+            "  Program 1 \n"
+            "    Metadata:\n"
+            "      service_name    : Service01\n"
+            "      service_provider: FFmpeg\n"
+            f"    Stream #0:0[0x100]: Video: h264 (High) ([27][0][0][0] / 0x001B), yuv420p(tv, bt709, progressive), "
+            f"{width}x{height} [SAR 1:1 DAR 16:9], {fps} fps, {fps} tbr, 90k tbn\n"
+            "    Stream #0:1[0x101](spa): Audio: aac (LC) ([15][0][0][0] / 0x000F), 48000 Hz, stereo, fltp, 128 kb/s\n"
+            "Stream mapping:\n"
+            "  Stream #0:0 -> #0:0 (h264 (native) -> wrapped_avframe (native))\n"
+            "  Stream #0:1 -> #0:1 (aac (native) -> pcm_s16le (native))\n"
+            "Output #0, null, to 'pipe:':\n"
+            "Press [q] to stop, [?] for help\n"
+        )
+
+    def on_signal(self, signum, frame):
+        if signum == signal.SIGUSR1:
+            self.stalled = not self.stalled
+        elif signum == signal.SIGUSR2:
+            self.crash_requested = True
+            raise Interrupted()
+        else:
+            self.exit_signal = signum
+            raise Interrupted()
+
+    def run(self) -> int:
+        for signum in (signal.SIGUSR1, signal.SIGUSR2, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self.on_signal)
+        try:
+            if self.ts_output and self.url.startswith("udp://"):
+                return self.relay_udp()
+            return self.stream()
+        except Interrupted:
+            return self.finish()
+
+    def stream(self) -> int:
+        sys.stderr.write("ffmpeg version n7.0-fake Copyright (c) 2000-2024 the FFmpeg developers\n")
+        sys.stderr.flush()
+        # Esperando al emisor (listener) o conectando (caller)
+        deadline = time.monotonic() + self.signal_delay
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+
+        sys.stderr.write(self.banner())
+        sys.stderr.flush()
+        progress = self.open_progress()
+        ts_writer = self.open_ts_output() if self.ts_output else None
+        generator = TSGenerator(self.bitrate, self.cc_errors) if self.ts_output else None
+        # El TS se escribe en ráfagas cortas; el progreso a ritmo de -stats_period
+        period = 0.01 if self.ts_output else self.stats_period
+
+        started = time.monotonic()
+        drop = 0
+        next_tick = started
+        next_stats = started
+        next_thumbnail = started
+        while True:
+            next_tick += period
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+            elapsed = time.monotonic() - started
+
+            if self.parent is not None and os.getppid() != self.parent:
+                return 1  # El gestor murió: no quedar huérfano
+            if self.crash_after is not None and elapsed >= self.crash_after:
+                self.crash_requested = True
+                return self.finish()
+            if self.exit_after is not None and elapsed >= self.exit_after:
+                return 0
+            if self.stall_after is not None and elapsed >= self.stall_after:
+                self.stalled = True
+            if self.stalled:
+                continue
+
+            frame = int(elapsed * self.fps)
+            out_time_us = int(elapsed * 1_000_000)
+            try:
+                if ts_writer:
+                    ts_writer(generator.until(elapsed))
+                if time.monotonic() >= next_stats:
+                    next_stats += self.stats_period
+                    self.write_progress(progress, frame, out_time_us, drop)
+                if self.thumbnail_fd is not None and time.monotonic() >= next_thumbnail:
+                    next_thumbnail += self.thumbnail_interval
+                    comment = f"frame {frame}".encode()
+                    os.write(self.thumbnail_fd, THUMBNAIL_JPEG[:2] + b"\xff\xfe" +
+                             (len(comment) + 2).to_bytes(2, "big") + comment + THUMBNAIL_JPEG[2:])
+            except BrokenPipeError:
+                return 1
+
+    def open_ts_output(self):
+        """Función que escribe TS en stdout o lo envía por UDP en datagramas de 7 paquetes"""
+        if self.output.startswith("udp://"):
+            target = urlsplit(self.output)
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            address = (target.hostname, target.port)
+
+            def send(data):
+                for offset in range(0, len(data), 1316):
+                    sock.sendto(data[offset:offset + 1316], address)
+            return send
+
+        def write(data):
+            sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+        return write
+
+    def relay_udp(self) -> int:
+        """Copia a la salida el TS que llegue por UDP, como "ffmpeg -f data -i udp://... -c copy -f data" """
+        source = urlsplit(self.url)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((source.hostname or "0.0.0.0", source.port))
+        sock.settimeout(self.stats_period)
+        sys.stderr.write("ffmpeg version n7.0-fake Copyright (c) 2000-2024 the FFmpeg developers\n")
+        sys.stderr.flush()
+        write = self.open_ts_output()
+        received = False
+        while True:
+            try:
+                data = sock.recv(65536)
+            except socket.timeout:
+                data = b""
+            if self.parent is not None and os.getppid() != self.parent:
+                return 1
+            if not data or self.stalled:
+                continue
+            if not received:
+                received = True
+                sys.stderr.write(f"Input #0, data, from '{self.url}':\n  Duration: N/A, start: 0.000000, bitrate: N/A\n"
+                                 "  Stream #0:0: Data: none\nOutput #0, data, to 'pipe:1':\n")
+                sys.stderr.flush()
+            try:
+                write(data)
+            except BrokenPipeError:
+                return 1
+
+    def write_progress(self, progress, frame, out_time_us, drop):
+        hours, rest = divmod(out_time_us / 1_000_000, 3600)
+        minutes, seconds = divmod(rest, 60)
+        out_time = f"{int(hours):02d}:{int(minutes):02d}:{seconds:09.6f}"
+        if progress:
+            progress.write(
+                f"frame={frame}\nfps={self.fps:.2f}\nstream_0_0_q=-0.0\nbitrate=N/A\ntotal_size=N/A\n"
+                f"out_time_us={out_time_us}\nout_time_ms={out_time_us}\nout_time={out_time}\n"
+                f"dup_frames=0\ndrop_frames={drop}\nspeed=1.00x\nprogress=continue\n"
+            )
+            progress.flush()
+        if self.stats:
+            sys.stderr.write(f"frame={frame:5d} fps={self.fps:.1f} q=-0.0 size=N/A time={out_time} "
+                             f"bitrate=N/A speed=1.00x    \r")
+            sys.stderr.flush()
+
+    def finish(self) -> int:
+        if self.crash_requested:
+            sys.stderr.write("[in#0/mpegts @ 0x0] Error during demuxing: I/O error\n")
+            sys.stderr.flush()
+            return 1
+        sys.stderr.write(f"Exiting normally, received signal {self.exit_signal}.\n")
+        sys.stderr.flush()
+        return 255
+
+
+if __name__ == "__main__":
+    if "-version" in sys.argv[1:]:
+        # El gestor consulta la versión para elegir las opciones de la salida de miniaturas
+        print("ffmpeg version n7.0-fake Copyright (c) 2000-2024 the FFmpeg developers")
+        sys.exit(0)
+    sys.exit(FakeFFmpeg(sys.argv[1:]).run())
@@ -3,6 +3,14 @@ document.addEventListener('DOMContentLoaded', () => {
     const statusMessage = document.getElementById('status-message');
     let socket;
     let dataTable;
+    let statusVersion = 0;  // Última versión de estado aplicada
+    let resyncPending = false;  // Snapshot pedido tras un hueco de versiones: se ignoran los deltas hasta que llegue
+    const channelsById = new Map();  // Estado de cada canal por ID
+    const rowNodes = new Map();      // Fila <tr> de cada canal por ID
+    const pendingRows = new Set();   // IDs con cambios pendientes de pintar
+    let renderScheduled = false;
+    let logSocket = null;   // WebSocket del log en vivo abierto en el modal
+    let thumbnailTimer = null;  // Temporizador de refresco de miniaturas (null si la vista está oculta)
 
     // Inicializar DataTable
     function initializeDataTable() {
@@ -10,6 +18,7 @@ document.addEventListener('DOMContentLoaded', () => {
             responsive: true,
             pageLength: 25,
             order: [[0, 'asc']],
+            columnDefs: [{ targets: 3, className: 'action-buttons', orderable: false }],
             language: {
                 search: "Buscar:",
                 lengthMenu: "Mostrar _MENU_ canales por página",
@@ -28,11 +37,13 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     function connect() {
-        const wsUrl = `ws://${window.location.host}/ws`;
+        // Los parámetros de la página (?status=...&q=...) se pasan al servidor como filtro de suscripción
+        const wsUrl = `ws://${window.location.host}/ws${window.location.search}`;
         socket = new WebSocket(wsUrl);
 
         socket.onopen = function() {
             console.log("WebSocket connection established.");
+            resyncPending = false;  // La conexión nueva empieza con un snapshot
             if (statusMessage) {
                 statusMessage.textContent = 'Conectado al servidor';
                 statusMessage.className = 'status-connected';
@@ -41,36 +52,39 @@ document.addEventListener('DOMContentLoaded', () => {
 
         socket.onmessage = function(event) {
             try {
-                const updatedChannels = JSON.parse(event.data);
-                console.log("Datos recibidos:", updatedChannels);
+                const message = JSON.parse(event.data);
 
-                // Convertir a array si es un solo canal
-                const channelsArray = Array.isArray(updatedChannels) ? updatedChannels : [updatedChannels];
-                
-                // Si no hay canales en window.channels, inicializarlo como array vacío
-                if (!window.channels || !Array.isArray(window.channels)) {
-                    window.channels = [];
+                if (message.type === 'snapshot') {
+                    resyncPending = false;
+                    // Las filas que no estén en el snapshot se eliminarán al pintar
+                    rowNodes.forEach((node, id) => pendingRows.add(id));
+                    channelsById.clear();
+                } else if (message.type === 'delta') {
+                    // Los deltas que llegan antes del snapshot pedido ya van incluidos en él
+                    if (resyncPending) return;
+                    // Si se perdió una versión, pedir un snapshot completo al servidor (una sola vez)
+                    const since = message.since ?? message.version - 1;
+                    if (since !== statusVersion) {
+                        resyncPending = true;
+                        socket.send(JSON.stringify({ type: 'resync' }));
+                        return;
+                    }
+                    (message.removed || []).forEach(id => {
+                        channelsById.delete(id);
+                        pendingRows.add(id);
+                    });
                 }
+                statusVersion = message.version;
 
-                // Actualizar o agregar cada canal recibido
-                channelsArray.forEach(updatedChannel => {
+                (message.channels || []).forEach(updatedChannel => {
                     if (!updatedChannel || typeof updatedChannel.id === 'undefined') {
                         console.error("Datos de canal no válidos:", updatedChannel);
                         return;
                     }
-
-                    const existingIndex = window.channels.findIndex(c => c.id === updatedChannel.id);
-                    if (existingIndex >= 0) {
-                        // Actualizar canal existente
-                        window.channels[existingIndex] = { ...window.channels[existingIndex], ...updatedChannel };
-                    } else {
-                        // Agregar nuevo canal
-                        window.channels.push(updatedChannel);
-                    }
+                    channelsById.set(updatedChannel.id, { ...channelsById.get(updatedChannel.id), ...updatedChannel });
+                    pendingRows.add(updatedChannel.id);
                 });
-
-                // Actualizar la tabla con la lista completa de canales
-                updateChannelsTable([...window.channels]);
+                scheduleRender();
             } catch (error) {
                 console.error("Error al procesar el mensaje:", error);
             }
@@ -91,60 +105,70 @@ document.addEventListener('DOMContentLoaded', () => {
         };
     }
 
-    function updateChannelsTable(channels) {
-        // Limpiar la tabla actual
-        if (dataTable) {
-            dataTable.clear().destroy();
-        }
-        
-        // Ordenar canales por nombre
-        channels.sort((a, b) => (a.name || '').localeCompare(b.name || ''));
-        
-        // Llenar la tabla con los datos actualizados
-        const tableBody = document.getElementById('channels-body');
-        tableBody.innerHTML = ''; // Limpiar el cuerpo de la tabla
-        
-        channels.forEach(channel => {
-            if (!channel || typeof channel.id === 'undefined') {
-                console.error("Datos de canal no válidos:", channel);
+    // Agrupa todos los mensajes recibidos en un mismo frame en un solo repintado
+    function scheduleRender() {
+        if (renderScheduled) return;
+        renderScheduled = true;
+        requestAnimationFrame(renderPendingRows);
+    }
+
+    // Actualiza solo las filas de los canales que cambiaron, sin reconstruir la tabla
+    function renderPendingRows() {
+        renderScheduled = false;
+        pendingRows.forEach(id => {
+            const channel = channelsById.get(id);
+            let node = rowNodes.get(id);
+            if (!channel) {
+                if (node) {
+                    dataTable.row(node).remove();
+                    rowNodes.delete(id);
+                }
                 return;
             }
-            
-            const isActive = channel.status && (channel.status.toLowerCase() === 'active' || channel.status.toLowerCase() === 'activo');
-            const statusClass = isActive ? 'active' : getStatusClass(channel.status);
-            const statusText = isActive ? 'Activo' : (channel.status || 'UNKNOWN').toUpperCase();
-            
-            const row = document.createElement('tr');
-            row.id = `channel-${channel.id}`;
-            row.classList.add('status-row', statusClass);
-            
-            row.innerHTML = `
-                <td>${channel.name || 'Canal sin nombre'}</td>
-                <td>
-                    <span class="status-text">
-                        <span class="status-indicator ${statusClass}"></span>
-                        ${statusText}
-                    </span>
-                </td>
-                <td>${channel.pid || 'N/A'}</td>
-                <td class="action-buttons">
-                    <button class="start-btn ${isActive ? 'active' : ''}" data-id="${channel.id}">
-                        ${isActive ? 'Activo' : 'Reiniciar'}
-                    </button>
-                    <button class="restart-btn ${isActive ? 'active' : ''}" data-id="${channel.id}">
-                        ${isActive ? 'Activo' : 'Stop'}
-                    </button>
-                    <button class="configure-btn" data-id="${channel.id}">
-                        Configurar
-                    </button>
-                </td>
-            `;
-            
-            tableBody.appendChild(row);
+
+            const statusClass = getStatusClass(channel.status);
+            if (node) {
+                dataTable.row(node).data(channelCells(channel));
+            } else {
+                node = dataTable.row.add(channelCells(channel)).node();
+                node.id = `channel-${id}`;
+                rowNodes.set(id, node);
+            }
+            node.classList.remove('active', 'listening', 'inactive', 'crashed');
+            node.classList.add('status-row', statusClass);
         });
-        
-        // Re-inicializar DataTable
-        initializeDataTable();
+        pendingRows.clear();
+        // Reordena y refiltra en memoria manteniendo la página actual
+        dataTable.draw(false);
+    }
+
+    function channelCells(channel) {
+        const statusClass = getStatusClass(channel.status);
+        const isActive = statusClass === 'active';
+        const statusText = isActive ? 'Activo' : (channel.status || 'UNKNOWN').toUpperCase();
+        return [
+            escapeHtml(channel.name || 'Canal sin nombre'),
+            `<span class="status-text">
+                <span class="status-indicator ${statusClass}"></span>
+                ${statusText}
+            </span>`,
+            `${channel.pid || 'N/A'}`,
+            `<button class="start-btn ${isActive ? 'active' : ''}" data-id="${channel.id}">
+                ${isActive ? 'Activo' : 'Reiniciar'}
+            </button>
+            <button class="restart-btn ${isActive ? 'active' : ''}" data-id="${channel.id}">
+                ${isActive ? 'Activo' : 'Stop'}
+            </button>
+            <button class="configure-btn" data-id="${channel.id}">Configurar</button>
+            <button class="info-btn" data-id="${channel.id}">Info</button>
+            <button class="logs-btn" data-id="${channel.id}">Logs</button>`
+        ];
+    }
+
+    function escapeHtml(text) {
+        return String(text).replace(/[&<>"']/g, c => ({
+            '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+        })[c]);
     }
     
     function getStatusClass(status) {
@@ -153,6 +177,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const statusLower = status.toLowerCase();
         if (statusLower === 'activo' || statusLower === 'active') return 'active';
         if (statusLower === 'listening' || statusLower === 'escuchando') return 'listening';
+        if (statusLower === 'crashed' || statusLower === 'quarantined') return 'crashed';
         if (statusLower.includes('error') || statusLower.includes('fail') || statusLower.includes('caído')) return 'crashed';
         return 'inactive';
     }
@@ -217,9 +242,31 @@ document.addEventListener('DOMContentLoaded', () => {
                     console.error(`Error al reiniciar el canal ${channelId}:`, error);
                     statusCell.innerHTML = '<span class="status-indicator error"></span> Error';
                 });
+        } else if (event.target && event.target.classList.contains('info-btn')) {
+            const channelId = event.target.getAttribute('data-id');
+            const body = document.getElementById('streamInfoBody');
+            body.textContent = 'Analizando...';
+            document.getElementById('streamInfoModal').style.display = 'block';
+
+            fetch(`/api/channels/${channelId}/probe`)
+                .then(response => response.json().then(data => ({ ok: response.ok, data })))
+                .then(({ ok, data }) => {
+                    document.getElementById('streamInfoTitle').textContent = `Información del Stream - ${data.name || channelId}`;
+                    body.textContent = ok ? formatStreamInfo(data) : (data.detail || 'Sin información');
+                })
+                .catch(error => {
+                    console.error(`Error al analizar el canal ${channelId}:`, error);
+                    body.textContent = 'Error: ' + error.message;
+                });
+        } else if (event.target && event.target.classList.contains('logs-btn')) {
+            const channelId = event.target.getAttribute('data-id');
+            const channel = channelsById.get(parseInt(channelId));
+            document.getElementById('logsTitle').textContent = `Log del Canal - ${channel ? channel.name : channelId}`;
+            openLogStream(channelId);
+            document.getElementById('logsModal').style.display = 'block';
         } else if (event.target && event.target.classList.contains('configure-btn')) {
             const channelId = event.target.getAttribute('data-id');
-            const channel = window.channels.find(c => c.id === parseInt(channelId));
+            const channel = channelsById.get(parseInt(channelId));
             
             if (channel) {
                 // Llenar el formulario con los datos del canal
@@ -246,6 +293,103 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    function openLogStream(channelId) {
+        closeLogStream();
+        const body = document.getElementById('logsBody');
+        body.textContent = '';
+        logSocket = new WebSocket(`ws://${window.location.host}/ws/logs/${channelId}?tail=200`);
+        logSocket.onmessage = function(event) {
+            // Seguir el final solo si el usuario no se ha desplazado hacia arriba
+            const atBottom = body.scrollTop + body.clientHeight >= body.scrollHeight - 5;
+            body.textContent += event.data + '\n';
+            if (body.textContent.length > 200000) {
+                body.textContent = body.textContent.slice(-100000);
+            }
+            if (atBottom) {
+                body.scrollTop = body.scrollHeight;
+            }
+        };
+    }
+
+    function closeLogStream() {
+        if (logSocket) {
+            logSocket.close();
+            logSocket = null;
+        }
+    }
+
+    function formatStreamInfo(info) {
+        const lines = [`Formato: ${info.format || 'N/A'} (fuente: ${info.source})`];
+        (info.programs || []).forEach(program => {
+            lines.push(`Programa ${program.program_id}: ${program.service_name || ''}` +
+                (program.pmt_pid ? ` PMT PID ${program.pmt_pid}` : ''));
+        });
+        (info.streams || []).forEach(stream => {
+            let detail = `  #${stream.index} PID ${stream.pid ?? 'N/A'} ${stream.type} ${stream.codec}`;
+            if (stream.type === 'video') {
+                detail += ` ${stream.width}x${stream.height} @ ${stream.frame_rate ?? '?'} fps`;
+            } else if (stream.type === 'audio') {
+                detail += ` ${stream.sample_rate ?? '?'} Hz ${stream.channel_layout || ''}` +
+                    (stream.language ? ` [${stream.language}]` : '');
+            }
+            lines.push(detail);
+        });
+        return lines.join('\n');
+    }
+
+    // Miniaturas: se consulta el índice de ETags y solo se recargan las imágenes que cambiaron
+    function refreshThumbnails() {
+        fetch('/api/thumbnails')
+            .then(response => response.json())
+            .then(data => {
+                if (thumbnailTimer === null) return;  // La vista se ocultó mientras tanto
+                const grid = document.getElementById('thumbnails-grid');
+                const seen = new Set();
+                data.channels.sort((a, b) => (a.name || '').localeCompare(b.name || ''));
+                data.channels.forEach(channel => {
+                    const id = String(channel.id);
+                    seen.add(id);
+                    let card = grid.querySelector(`.thumbnail-card[data-id="${id}"]`);
+                    if (!card) {
+                        card = document.createElement('div');
+                        card.className = 'channel-card thumbnail-card';
+                        card.dataset.id = id;
+                        card.innerHTML = '<img class="thumbnail" alt=""><div class="card-header"><h2></h2></div>';
+                    }
+                    grid.appendChild(card);  // Mantiene el orden por nombre sin recargar la imagen
+                    card.querySelector('h2').textContent = channel.name;
+                    card.classList.remove('active', 'listening', 'inactive', 'crashed');
+                    card.classList.add(getStatusClass(channel.status));
+                    if (channel.etag && card.dataset.etag !== channel.etag) {
+                        card.dataset.etag = channel.etag;
+                        card.querySelector('img').src =
+                            `/api/channels/${id}/thumbnail?v=${encodeURIComponent(channel.etag)}`;
+                    }
+                });
+                grid.querySelectorAll('.thumbnail-card').forEach(card => {
+                    if (!seen.has(card.dataset.id)) card.remove();
+                });
+                thumbnailTimer = setTimeout(refreshThumbnails, Math.max(1, data.interval || 10) * 1000);
+            })
+            .catch(error => {
+                console.error('Error al actualizar las miniaturas:', error);
+                if (thumbnailTimer !== null) thumbnailTimer = setTimeout(refreshThumbnails, 5000);
+            });
+    }
+
+    document.getElementById('toggleThumbnails').addEventListener('click', function() {
+        const grid = document.getElementById('thumbnails-grid');
+        const show = grid.classList.contains('hidden');
+        grid.classList.toggle('hidden', !show);
+        if (show) {
+            thumbnailTimer = 0;
+            refreshThumbnails();
+        } else {
+            clearTimeout(thumbnailTimer);
+            thumbnailTimer = null;
+        }
+    });
+
     // Manejar cambio de modo
     document.querySelectorAll('input[name="mode"]').forEach(radio => {
         radio.addEventListener('change', function() {
@@ -301,8 +445,11 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
     // Cerrar el modal al hacer clic en la X
-    document.querySelector('.close').addEventListener('click', function() {
-        document.getElementById('channelConfigModal').style.display = 'none';
+    document.querySelectorAll('.close').forEach(button => {
+        button.addEventListener('click', function() {
+            this.closest('.modal').style.display = 'none';
+            closeLogStream();
+        });
     });
 
     // Cerrar el modal al hacer clic en Cancelar
@@ -312,9 +459,9 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // Cerrar el modal al hacer clic fuera del contenido
     window.addEventListener('click', function(event) {
-        const modal = document.getElementById('channelConfigModal');
-        if (event.target === modal) {
-            modal.style.display = 'none';
+        if (event.target.classList && event.target.classList.contains('modal')) {
+            event.target.style.display = 'none';
+            closeLogStream();
         }
     });
 
@@ -1,14 +1,35 @@
 import asyncio
+import ctypes
+import fcntl
+import glob
+import gzip
+import hashlib
+import heapq
+import hmac
 import json
 import logging
+import math
 import os
+import platform
+import random
+import re
+import signal
+import sqlite3
 import subprocess
+import sys
+import threading
 import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
-from fastapi.responses import FileResponse
+from typing import List, Dict, Tuple
+import websockets
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Header, Query
+from fastapi.responses import FileResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
+from metrics import MetricsRing, TSAnalyzer
 
 # --- Configuración de Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -20,25 +41,1144 @@ def load_config():
 
 config = load_config()
 
+# Modo de ejecución: standalone (por defecto), agent (gestiona un subconjunto de canales asignado
+# por el coordinador) o coordinator (reparte los canales entre agentes, no lanza ffmpeg)
+MODE = os.environ.get("FFPROBE_MODE", config.get("mode", "standalone"))
+
+def _to_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+def _to_float(value, suffix: str = "") -> float:
+    """Convierte valores de -progress ("1234.5kbits/s", "1.01x", "N/A") a float; NaN si no hay dato"""
+    if value is None:
+        return math.nan
+    value = value.strip()
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return float(value)
+    except ValueError:
+        return math.nan
+
+# --- Instrumentación ---
+class TimingHistogram:
+    """Histograma de duraciones con cubetas logarítmicas fijas (x2 desde 50 µs); observe() es O(log n)"""
+    BOUNDS = tuple(0.00005 * 2 ** i for i in range(22))  # 50 µs .. ~105 s
+
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * (len(self.BOUNDS) + 1)))  # La última cubeta es +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Límite superior de la cubeta que contiene el cuantil q (acotado por el máximo observado)"""
+        target = q * self.count
+        seen = 0
+        for idx, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= target:
+                return min(self.BOUNDS[idx], self.max) if idx < len(self.BOUNDS) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        ms = lambda seconds: round(seconds * 1000, 3)
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.total / self.count),
+            "p50_ms": ms(self.quantile(0.5)),
+            "p90_ms": ms(self.quantile(0.9)),
+            "p99_ms": ms(self.quantile(0.99)),
+            "max_ms": ms(self.max),
+            "buckets": [
+                {"le_ms": ms(self.BOUNDS[idx]) if idx < len(self.BOUNDS) else None, "count": n}
+                for idx, n in enumerate(self.counts) if n
+            ]
+        }
+
+class HotPathStats:
+    """Histogramas por nombre de los caminos calientes del gestor (monitor, broadcast, spawn, event loop)"""
+    def __init__(self):
+        self.histograms: Dict[str, TimingHistogram] = {}
+        self.since = time.time()
+
+    def observe(self, name: str, seconds: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = TimingHistogram()
+        histogram.observe(seconds)
+
+    def reset(self):
+        self.histograms = {}
+        self.since = time.time()
+
+    def summary(self) -> dict:
+        return {
+            "since": self.since,
+            "timings": {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+        }
+
+    async def watch_loop_lag(self):
+        """Retraso del event loop: cuánto tarda en despertar un sleep respecto a lo pedido"""
+        interval = config.get('loop_lag_interval', 0.25)
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.observe("event_loop_lag", max(0.0, time.perf_counter() - started - interval))
+
+class SamplingProfiler:
+    """Profiler de muestreo bajo demanda: un hilo lee sys._current_frames() cada `interval` segundos.
+
+    Fuera de una sesión no hay ningún hook instalado, así que el coste con el profiler apagado es nulo.
+    El resultado son pilas colapsadas ("marco;marco;marco N"), el formato de flamegraph.pl y speedscope.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def frame_label(frame) -> str:
+        code = frame.f_code
+        module = frame.f_globals.get('__name__') or os.path.basename(code.co_filename)
+        return f"{code.co_name} ({module}:{code.co_firstlineno})"
+
+    def sample(self, duration: float, interval: float) -> str:
+        if not self.lock.acquire(blocking=False):
+            raise RuntimeError("Ya hay una sesión de profiling en curso")
+        try:
+            me = threading.get_ident()
+            stacks: Dict[str, int] = {}
+            deadline = time.monotonic() + duration
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    labels = []
+                    while frame is not None:
+                        labels.append(self.frame_label(frame))
+                        frame = frame.f_back
+                    labels.append(names.get(ident, f"thread-{ident}"))
+                    key = ";".join(reversed(labels))
+                    stacks[key] = stacks.get(key, 0) + 1
+                time.sleep(interval)
+            return "".join(f"{stack} {n}\n" for stack, n in sorted(stacks.items()))
+        finally:
+            self.lock.release()
+
+hot_path_stats = HotPathStats()
+
+# --- Persistencia ---
+class ConfigStore:
+    """Guarda config.json con escrituras serializadas, agrupadas (debounce) y atómicas en un hilo"""
+    def __init__(self, path: str = "config.json"):
+        self.path = Path(path)
+        self.delay = config.get('config_save_delay', 0.5)
+        self.lock = asyncio.Lock()
+        self.pending = None
+        self.last_written_mtime = None  # Permite al watcher ignorar nuestras propias escrituras
+        self.state_db = StateDB(config['state_db']) if config.get('state_db') else None
+
+    def schedule_save(self):
+        """Agenda una escritura; las ediciones dentro de la ventana de debounce se guardan juntas"""
+        if self.pending is None or self.pending.done():
+            self.pending = asyncio.create_task(self._save_later())
+
+    async def _save_later(self):
+        await asyncio.sleep(self.delay)
+        # A partir de aquí una nueva edición agenda otra escritura
+        self.pending = None
+        await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            # Serializar en el event loop para tomar una foto consistente de `config`
+            data = json.dumps(config, indent=2)
+            channels = list(config.get('channels', []))
+            # Primero la base de datos, así config.json queda siempre igual o más reciente que su copia
+            if self.state_db:
+                await asyncio.wrap_future(self.state_db.save_channels(channels))
+            try:
+                self.last_written_mtime = await asyncio.to_thread(self._write_atomic, data)
+            except OSError as e:
+                logging.error(f"Error al guardar {self.path}: {e}")
+
+    def _write_atomic(self, data: str) -> int:
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        return os.stat(self.path).st_mtime_ns
+
+    async def close(self):
+        if self.pending and not self.pending.done():
+            self.pending.cancel()
+            await self.flush()
+        if self.state_db:
+            self.state_db.close()
+
+class StateDB:
+    """Almacén SQLite opcional (modo WAL) con las definiciones de canales y su estado en ejecución.
+
+    config.json sigue siendo la fuente de las definiciones; la copia de la base de datos solo se usa al
+    arrancar si es más reciente que el archivo (ver GlobalChannelManager.reconcile_definitions).
+
+    Todas las operaciones se ejecutan en un único hilo dedicado, que además serializa las escrituras.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-db")
+        self.conn = self.executor.submit(self._connect).result()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS channels (id INTEGER PRIMARY KEY, definition TEXT NOT NULL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS channel_state ("
+            "id INTEGER PRIMARY KEY, status TEXT, restart_count INTEGER, crash_count INTEGER, "
+            "last_exit_code INTEGER, updated_at REAL)"
+        )
+        # Marca de tiempo del último guardado de definiciones, para compararla con la de config.json
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL)")
+        conn.commit()
+        return conn
+
+    def save_channels(self, channels: List[dict]):
+        return self.executor.submit(self._save_channels, channels, time.time())
+
+    def load_channels(self):
+        """Devuelve (definiciones, instante del guardado); el instante es None en bases anteriores a la marca"""
+        def load():
+            rows = self.conn.execute("SELECT definition FROM channels ORDER BY id").fetchall()
+            saved_at = self.conn.execute("SELECT value FROM meta WHERE key = 'channels_saved_at'").fetchone()
+            return [json.loads(row[0]) for row in rows], saved_at[0] if saved_at else None
+        return self.executor.submit(load).result()
+
+    def _save_channels(self, channels: List[dict], timestamp: float):
+        try:
+            with self.conn:
+                self.conn.execute("DELETE FROM channels")
+                self.conn.executemany(
+                    "INSERT INTO channels (id, definition) VALUES (?, ?)",
+                    [(ch['id'], json.dumps(ch)) for ch in channels]
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('channels_saved_at', ?)", (timestamp,)
+                )
+        except sqlite3.Error as e:
+            logging.error(f"Error al guardar canales en {self.path}: {e}")
+
+    def save_states(self, states: List[dict]):
+        self.executor.submit(self._save_states, states, time.time())
+
+    def _save_states(self, states: List[dict], timestamp: float):
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO channel_state "
+                    "(id, status, restart_count, crash_count, last_exit_code, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(s['id'], s['status'], s.get('restart_count'), s.get('crash_count'),
+                      s.get('last_exit_code'), timestamp) for s in states]
+                )
+        except sqlite3.Error as e:
+            logging.error(f"Error al guardar estado en {self.path}: {e}")
+
+    def load_states(self) -> Dict[int, dict]:
+        def load():
+            rows = self.conn.execute(
+                "SELECT id, status, restart_count, crash_count, last_exit_code FROM channel_state"
+            ).fetchall()
+            return {
+                row[0]: {"status": row[1], "restart_count": row[2], "crash_count": row[3], "last_exit_code": row[4]}
+                for row in rows
+            }
+        return self.executor.submit(load).result()
+
+    def close(self):
+        self.executor.submit(self.conn.close)
+        self.executor.shutdown(wait=True)
+
+class HistoryStore:
+    """Histórico en SQLite (modo WAL) de los cambios de estado y de las métricas de cada canal.
+
+    Los eventos de estado se guardan tal cual (solo se añaden). Las métricas se guardan como una
+    muestra por segundo y se agregan a minutos y a horas (media ponderada por número de muestras);
+    cada resolución tiene su propia retención. Las escrituras se agrupan y se ejecutan en un hilo
+    dedicado; las consultas usan otra conexión en otro hilo para no esperar a las escrituras.
+    """
+    RESOLUTIONS = {"1s": 1, "1m": 60, "1h": 3600}
+    FIELDS = ("fps", "bitrate_kbps", "speed", "drop_frames", "dup_frames")
+    DEFAULT_RETENTION = {"1s": 6 * 3600, "1m": 30 * 86400, "1h": 400 * 86400, "events": 400 * 86400}
+
+    def __init__(self, path: str):
+        self.path = path
+        self.retention = {**self.DEFAULT_RETENTION, **config.get('history_retention', {})}
+        self.pending_events = []  # (canal, instante, estado) a la espera del siguiente volcado
+        self.last_retention = 0.0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-db")
+        self.reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-query")
+        self.conn = self.executor.submit(self._connect).result()
+        self.read_conn = self.reader.submit(sqlite3.connect, self.path, check_same_thread=False).result()
+        # Antes de que los canales registren su estado actual
+        self.executor.submit(self._close_open_intervals).result()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS status_events (channel_id INTEGER, at REAL, status TEXT)")
+        # Latido: instante del último volcado, para saber hasta cuándo vigiló el gestor si no se cerró limpiamente
+        conn.execute("CREATE TABLE IF NOT EXISTS heartbeat (id INTEGER PRIMARY KEY CHECK (id = 0), at REAL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS status_events_channel ON status_events (channel_id, at)")
+        columns = ", ".join(f"{field} REAL" for field in self.FIELDS)
+        for seconds in self.RESOLUTIONS.values():
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS metrics_{seconds} (channel_id INTEGER, bucket INTEGER, "
+                f"samples INTEGER, {columns}, PRIMARY KEY (channel_id, bucket)) WITHOUT ROWID"
+            )
+        # Hasta dónde está agregada cada resolución (buckets completos)
+        conn.execute("CREATE TABLE IF NOT EXISTS rollups (resolution INTEGER PRIMARY KEY, done_until INTEGER)")
+        conn.commit()
+        return conn
+
+    def _close_open_intervals(self):
+        """Si el gestor cayó o lo mataron, el último estado de cada canal seguiría abierto durante toda la
+        interrupción: se cierra con "offline" en el último latido (o tras la última muestra del canal)"""
+        try:
+            with self.conn:
+                heartbeat = self.conn.execute("SELECT at FROM heartbeat WHERE id = 0").fetchone()
+                # SQLite devuelve las demás columnas de la fila con el MAX
+                last_events = self.conn.execute(
+                    "SELECT channel_id, status, MAX(at) FROM status_events GROUP BY channel_id"
+                ).fetchall()
+                events = []
+                for channel_id, status, at in last_events:
+                    if status == "offline":
+                        continue
+                    if heartbeat:
+                        offline_at = heartbeat[0]
+                    else:
+                        bucket = self.conn.execute(
+                            "SELECT MAX(bucket) FROM metrics_1 WHERE channel_id = ?", (channel_id,)
+                        ).fetchone()[0]
+                        offline_at = bucket + 1 if bucket is not None else at
+                    events.append((channel_id, max(offline_at, at), "offline"))
+                self.conn.executemany("INSERT INTO status_events (channel_id, at, status) VALUES (?, ?, ?)", events)
+        except sqlite3.Error as e:
+            logging.error(f"Error al revisar el histórico en {self.path}: {e}")
+            return
+        if events:
+            logging.warning(
+                f"El gestor no se cerró limpiamente: {len(events)} canales quedan offline en el histórico "
+                f"desde el último latido"
+            )
+
+    def record_status(self, channel_id: int, status: str, timestamp: float = None):
+        self.pending_events.append((channel_id, timestamp or time.time(), status))
+
+    def record_samples(self, timestamp: float, samples: List[tuple]):
+        """Vuelca los eventos pendientes y una muestra por canal: (id, valores de FIELDS)"""
+        events, self.pending_events = self.pending_events, []
+        self.executor.submit(self._write, events, int(timestamp), samples)
+
+    def _write(self, events: list, bucket: int, samples: List[tuple]):
+        try:
+            with self.conn:
+                self.conn.executemany("INSERT INTO status_events (channel_id, at, status) VALUES (?, ?, ?)", events)
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO metrics_1 VALUES (?, ?, 1, {', '.join('?' * len(self.FIELDS))})",
+                    [(channel_id, bucket, *(None if math.isnan(v) else v for v in values))
+                     for channel_id, values in samples]
+                )
+                self.conn.execute("INSERT OR REPLACE INTO heartbeat (id, at) VALUES (0, ?)", (bucket,))
+        except sqlite3.Error as e:
+            logging.error(f"Error al guardar el histórico en {self.path}: {e}")
+
+    def maintain(self):
+        self.executor.submit(self._maintain, time.time())
+
+    def _maintain(self, now: float):
+        """Agrega los buckets completos a la resolución superior y aplica la retención"""
+        averages = ", ".join(
+            f"SUM({field} * samples) / SUM(CASE WHEN {field} IS NULL THEN 0 ELSE samples END)"
+            for field in self.FIELDS
+        )
+        resolutions = sorted(self.RESOLUTIONS.values())
+        try:
+            with self.conn:
+                for source, target in zip(resolutions, resolutions[1:]):
+                    row = self.conn.execute("SELECT done_until FROM rollups WHERE resolution = ?", (target,)).fetchone()
+                    done = row[0] if row else 0
+                    until = int(now) // target * target
+                    if until <= done:
+                        continue
+                    self.conn.execute(
+                        f"INSERT OR REPLACE INTO metrics_{target} "
+                        f"SELECT channel_id, bucket / {target} * {target}, SUM(samples), {averages} "
+                        f"FROM metrics_{source} WHERE bucket >= ? AND bucket < ? GROUP BY channel_id, bucket / {target}",
+                        (done // target * target, until)
+                    )
+                    self.conn.execute("INSERT OR REPLACE INTO rollups VALUES (?, ?)", (target, until))
+
+                # La retención se aplica como mucho una vez por hora, canal a canal (por clave primaria)
+                if now - self.last_retention < 3600:
+                    return
+                self.last_retention = now
+                channel_ids = [row[0] for row in self.conn.execute("SELECT DISTINCT channel_id FROM status_events")]
+                for name, seconds in self.RESOLUTIONS.items():
+                    self.conn.executemany(
+                        f"DELETE FROM metrics_{seconds} WHERE channel_id = ? AND bucket < ?",
+                        [(channel_id, now - self.retention[name]) for channel_id in channel_ids]
+                    )
+                self.conn.execute("DELETE FROM status_events WHERE at < ?", (now - self.retention['events'],))
+        except sqlite3.Error as e:
+            logging.error(f"Error al agregar el histórico en {self.path}: {e}")
+
+    def pick_resolution(self, start: float, end: float, max_points: int) -> str:
+        """La resolución más fina que cubre el rango (según retención) sin superar max_points"""
+        now = time.time()
+        for name, seconds in self.RESOLUTIONS.items():
+            if start >= now - self.retention[name] and (end - start) / seconds <= max_points:
+                return name
+        return "1h"
+
+    async def query(self, channel_id: int, start: float, end: float, resolution: str) -> dict:
+        future = self.reader.submit(self._query, channel_id, start, end, self.RESOLUTIONS[resolution])
+        return await asyncio.wrap_future(future)
+
+    def _query(self, channel_id: int, start: float, end: float, seconds: int) -> dict:
+        rows = self.read_conn.execute(
+            f"SELECT bucket, samples, {', '.join(self.FIELDS)} FROM metrics_{seconds} "
+            "WHERE channel_id = ? AND bucket >= ? AND bucket < ? ORDER BY bucket",
+            (channel_id, int(start) // seconds * seconds, end)
+        ).fetchall()
+        series = {"timestamp": [row[0] for row in rows], "samples": [row[1] for row in rows]}
+        for k, field in enumerate(self.FIELDS):
+            series[field] = [row[k + 2] for row in rows]
+
+        # Estado vigente al inicio del rango y transiciones dentro de él
+        before = self.read_conn.execute(
+            "SELECT at, status FROM status_events WHERE channel_id = ? AND at < ? ORDER BY at DESC LIMIT 1",
+            (channel_id, start)
+        ).fetchone()
+        transitions = self.read_conn.execute(
+            "SELECT at, status FROM status_events WHERE channel_id = ? AND at >= ? AND at < ? ORDER BY at",
+            (channel_id, start, end)
+        ).fetchall()
+        end = min(end, time.time())
+        # Solo hay buckets dentro de la retención y, en minutos y horas, una vez agregados:
+        # fuera de esa ventana la falta de muestras no es un hueco
+        resolution = next(name for name, value in self.RESOLUTIONS.items() if value == seconds)
+        rolled_up = self.read_conn.execute("SELECT done_until FROM rollups WHERE resolution = ?", (seconds,)).fetchone()
+        sampled = (time.time() - self.retention[resolution],
+                   end if seconds == 1 else min(end, rolled_up[0] if rolled_up else 0))
+        uptime = self.uptime(before, transitions, start, end, series["timestamp"], seconds, sampled)
+        return {"series": series, "uptime": uptime}
+
+    @staticmethod
+    def uptime(before, transitions: list, start: float, end: float, buckets: list = None,
+               bucket_seconds: int = 1, sampled: tuple = None) -> dict:
+        """Tiempo en cada estado dentro de [start, end), disponibilidad y caídas desde "active".
+
+        "uptime" es la fracción del rango en activo; "sla" descuenta el tiempo en que el canal
+        estaba detenido a propósito o el gestor no lo vigilaba (inactive, stopping, offline).
+        Con `buckets` (inicio de los buckets con muestras), los huecos sin muestras de más de dos
+        buckets dentro de un periodo activo cuentan como offline: nadie estaba midiendo el canal
+        (solo dentro de la ventana `sampled` en la que debería haber buckets, si se indica).
+        """
+        durations = {}
+        drops = []
+        intervals = []
+        status = before[1] if before else None
+        since = start
+        for at, new_status in transitions:
+            if status is not None:
+                intervals.append((status, since, at))
+            if status == "active" and new_status != "active":
+                drops.append({"at": at, "status": new_status})
+            status, since = new_status, at
+        if status is not None and end > since:
+            intervals.append((status, since, end))
+
+        grace = max(2 * bucket_seconds, 5.0)
+        for status, begin, finish in intervals:
+            gaps = []
+            if status == "active" and buckets is not None:
+                sampled_from, sampled_until = sampled or (begin, finish)
+                cursor = max(begin, sampled_from)
+                for bucket in buckets:
+                    if bucket + bucket_seconds <= cursor:
+                        continue
+                    if bucket >= finish:
+                        break
+                    if bucket - cursor > grace:
+                        gaps.append((cursor, bucket))
+                    cursor = max(cursor, bucket + bucket_seconds)
+                if min(finish, sampled_until) - cursor > grace:
+                    gaps.append((cursor, min(finish, sampled_until)))
+            offline = sum(b - a for a, b in gaps)
+            durations[status] = durations.get(status, 0.0) + finish - begin - offline
+            if gaps:
+                durations["offline"] = durations.get("offline", 0.0) + offline
+                drops.extend({"at": a, "status": "offline"} for a, b in gaps)
+        drops.sort(key=lambda drop: drop["at"])
+
+        total = max(end - start, 0.0)
+        active = durations.get("active", 0.0)
+        # Antes del primer evento no hay datos: no cuenta para el SLA
+        expected = sum(durations.values()) - sum(durations.get(s, 0.0) for s in ("inactive", "stopping", "offline"))
+        return {
+            "seconds": round(total, 3),
+            "durations": {s: round(d, 3) for s, d in durations.items()},
+            "uptime": round(active / total, 6) if total else None,
+            "sla": round(active / expected, 6) if expected > 0 else None,
+            "drops": drops,
+            "transitions": [{"at": at, "status": s} for at, s in transitions]
+        }
+
+    def close(self):
+        events, self.pending_events = self.pending_events, []
+        self.executor.submit(self._write, events, int(time.time()), [])
+        self.executor.submit(self.conn.close)
+        self.executor.shutdown(wait=True)
+        self.reader.submit(self.read_conn.close)
+        self.reader.shutdown(wait=True)
+
+# --- Análisis de streams ---
+class StreamBanner:
+    """Extrae codecs, resolución, programas y PIDs del banner "Input #0" que ffmpeg escribe en stderr"""
+    INPUT_RE = re.compile(r"^Input #\d+, ([\w,]+), from")
+    PROGRAM_RE = re.compile(r"^\s+Program (\d+)")
+    METADATA_RE = re.compile(r"^\s+(service_name|service_provider)\s*:\s*(.*)$")
+    STREAM_RE = re.compile(
+        r"^\s+Stream #\d+:(\d+)(?:\[(0x[0-9a-fA-F]+)\])?(?:\((\w+)\))?: (\w+): (\w+)(?: \(([^)]*)\))?(.*)$"
+    )
+
+    def __init__(self):
+        self.complete = False
+        self.info = {"format": None, "programs": [], "streams": []}
+        self._in_input = False
+        self._program = None
+
+    @classmethod
+    def from_log(cls, path: Path) -> "StreamBanner":
+        """Reconstruye el banner desde el log del canal (p. ej. al reengancharse a un proceso en marcha)"""
+        banner = cls()
+        try:
+            with open(path, errors='replace') as f:
+                for line in f:
+                    banner.feed(line)
+                    if banner.complete:
+                        break
+        except OSError:
+            pass
+        return banner
+
+    def feed(self, line: str):
+        match = self.INPUT_RE.match(line)
+        if match:
+            self._in_input = True
+            self.info["format"] = match.group(1)
+            return
+        if not self._in_input:
+            return
+        if line.startswith(("Output #", "Stream mapping:", "Press [q]")):
+            self.complete = True
+            return
+
+        match = self.PROGRAM_RE.match(line)
+        if match:
+            self._program = {"program_id": int(match.group(1)), "streams": []}
+            self.info["programs"].append(self._program)
+            return
+        match = self.METADATA_RE.match(line)
+        if match and self._program is not None:
+            self._program[match.group(1)] = match.group(2).strip()
+            return
+        match = self.STREAM_RE.match(line)
+        if match:
+            stream = parse_banner_stream(match)
+            self.info["streams"].append(stream)
+            if self._program is not None:
+                self._program["streams"].append(stream["index"])
+
+    def result(self):
+        if not self.info["streams"]:
+            return None
+        return {"source": "banner", **self.info}
+
+def parse_banner_stream(match) -> dict:
+    index, pid, language, codec_type, codec, profile, rest = match.groups()
+    stream = {
+        "index": int(index),
+        "pid": int(pid, 16) if pid else None,
+        "type": codec_type.lower(),
+        "codec": codec,
+        "profile": profile if profile and not profile.startswith('[') else None,
+        "language": language
+    }
+    if codec_type == "Video":
+        resolution = re.search(r"(\d{2,5})x(\d{2,5})", rest)
+        fps = re.search(r"([\d.]+) fps", rest)
+        pix_fmt = re.search(r"^(?: \([^)]*\))?, (\w+)", rest)
+        stream.update({
+            "width": int(resolution.group(1)) if resolution else None,
+            "height": int(resolution.group(2)) if resolution else None,
+            "frame_rate": float(fps.group(1)) if fps else None,
+            "pix_fmt": pix_fmt.group(1) if pix_fmt else None
+        })
+    elif codec_type == "Audio":
+        sample_rate = re.search(r"(\d+) Hz, ([^,]+)", rest)
+        stream.update({
+            "sample_rate": int(sample_rate.group(1)) if sample_rate else None,
+            "channel_layout": sample_rate.group(2).strip() if sample_rate else None
+        })
+    bitrate = re.search(r"(\d+) kb/s", rest)
+    stream["bitrate_kbps"] = int(bitrate.group(1)) if bitrate else None
+    return stream
+
+def parse_ffprobe(data: dict) -> dict:
+    """Normaliza la salida JSON de ffprobe al mismo formato que StreamBanner"""
+    streams = []
+    for s in data.get("streams", []):
+        rate = s.get("avg_frame_rate") or s.get("r_frame_rate") or "0/0"
+        num, _, den = rate.partition('/')
+        stream = {
+            "index": s.get("index"),
+            "pid": int(s["id"], 16) if str(s.get("id", "")).startswith("0x") else None,
+            "type": s.get("codec_type"),
+            "codec": s.get("codec_name"),
+            "profile": s.get("profile"),
+            "language": s.get("tags", {}).get("language"),
+            "bitrate_kbps": int(s["bit_rate"]) // 1000 if s.get("bit_rate", "").isdigit() else None
+        }
+        if s.get("codec_type") == "video":
+            stream.update({
+                "width": s.get("width"),
+                "height": s.get("height"),
+                "frame_rate": round(float(num) / float(den), 3) if _to_float(den) else None,
+                "pix_fmt": s.get("pix_fmt")
+            })
+        elif s.get("codec_type") == "audio":
+            stream.update({
+                "sample_rate": _to_int(s.get("sample_rate")) or None,
+                "channel_layout": s.get("channel_layout")
+            })
+        streams.append(stream)
+    programs = [
+        {
+            "program_id": p.get("program_id"),
+            "pmt_pid": p.get("pmt_pid"),
+            "pcr_pid": p.get("pcr_pid"),
+            "service_name": p.get("tags", {}).get("service_name"),
+            "service_provider": p.get("tags", {}).get("service_provider"),
+            "streams": [s.get("index") for s in p.get("streams", [])]
+        }
+        for p in data.get("programs", [])
+    ]
+    return {"source": "ffprobe", "format": data.get("format", {}).get("format_name"), "programs": programs,
+            "streams": streams}
+
+class StreamProber:
+    """Caché con TTL de análisis por canal, con peticiones concurrentes agrupadas y un pool acotado de ffprobe"""
+    def __init__(self):
+        self.cache: Dict[int, tuple] = {}  # channel_id -> (expira, info)
+        self.inflight: Dict[int, asyncio.Future] = {}
+        self.semaphore = asyncio.Semaphore(config.get('ffprobe_max_concurrency', 4))
+
+    def invalidate(self, channel_id: int):
+        self.cache.pop(channel_id, None)
+
+    async def probe(self, channel, refresh: bool = False) -> dict:
+        # El banner del ffmpeg en marcha está siempre al día y no cuesta ningún proceso extra
+        banner = channel.banner.result() if hasattr(channel, 'banner') else channel.stream_info
+        if banner and channel.is_running():
+            return banner
+        if not hasattr(channel, 'source_url'):
+            raise LookupError("El agente aún no ha informado la información de streams")
+
+        cached = self.cache.get(channel.id)
+        if cached and cached[0] > time.time() and not refresh:
+            return {**cached[1], "cached": True}
+
+        if channel.id not in self.inflight:
+            self.inflight[channel.id] = asyncio.ensure_future(self._probe(channel))
+            self.inflight[channel.id].add_done_callback(lambda _: self.inflight.pop(channel.id, None))
+        info = await asyncio.shield(self.inflight[channel.id])
+        return {**info, "cached": False}
+
+    async def _probe(self, channel) -> dict:
+        if channel.is_running() and channel.channel_config.get('mode', 'listener') == 'listener':
+            # El puerto de escucha lo ocupa el ffmpeg del canal; solo queda esperar a su banner
+            raise LookupError("El canal aún no ha recibido señal; sin información de streams")
+
+        async with self.semaphore:
+            command = [
+                config.get('ffprobe_path', 'ffprobe'), "-v", "error", "-show_programs", "-show_streams",
+                "-show_format", "-of", "json", channel.source_url()
+            ]
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(
+                    process.communicate(), timeout=config.get('ffprobe_timeout', 10.0)
+                )
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise TimeoutError(f"ffprobe no respondió para el canal {channel.name}")
+            if process.returncode != 0:
+                raise RuntimeError(stderr.decode('utf-8', errors='replace').strip() or "ffprobe falló")
+
+        info = {**parse_ffprobe(json.loads(stdout)), "probed_at": time.time()}
+        self.cache[channel.id] = (time.time() + config.get('probe_cache_ttl', 300), info)
+        return info
+
+# ffmpeg copia el transport stream tal cual llega (-f data), sin demultiplexar ni decodificar, para que
+# los continuity counters y el PCR que se analizan sean los del origen
+ANALYZER_COMMAND_TEMPLATE = [
+    "ffmpeg", "-loglevel", "info", "-f", "data", "-i", "{srt_url}", "-map", "0", "-c", "copy", "-f", "data", "pipe:1"
+]
+
+# Salida secundaria de miniaturas: un JPEG pequeño cada `thumbnail_interval` segundos, solo de keyframes.
+# Reutiliza los frames que ffmpeg ya decodifica para la salida principal; si esta copia el video sin
+# decodificar, se añade -skip_frame nokey para que las miniaturas solo decodifiquen keyframes.
+# En spawn() el marcador se sustituye por el descriptor real del pipe que lee el gestor.
+THUMBNAIL_PIPE = "pipe:{thumbnail_fd}"
+VIDEO_COPY_OPTIONS = ("-c", "-c:v", "-codec", "-codec:v", "-vcodec")
+
+_ffmpeg_versions: Dict[str, tuple] = {}
+
+def ffmpeg_version(binary: str):
+    """(mayor, menor) según `binary -version`, consultado una sola vez por binario; None si no se sabe"""
+    if binary not in _ffmpeg_versions:
+        version = None
+        try:
+            output = subprocess.run(
+                [binary, "-hide_banner", "-version"], capture_output=True, text=True, timeout=5
+            ).stdout
+            match = re.search(r"version n?(\d+)\.(\d+)", output)
+            if match:
+                version = (int(match.group(1)), int(match.group(2)))
+            elif "version N-" in output:
+                version = (math.inf, 0)  # Compilación desde git: posterior a cualquier versión publicada
+        except (OSError, subprocess.SubprocessError):
+            pass
+        _ffmpeg_versions[binary] = version
+    return _ffmpeg_versions[binary]
+
+# --- Procesos desacoplados (detached_processes): sobreviven a los reinicios del gestor ---
+# (salvo los canales en modo analyzer, cuyo stdout con el TS completo no puede quedar sin lector)
+class ProcessRegistry:
+    """Archivo de estado con el ffmpeg en marcha de cada canal, para reengancharse a él tras un reinicio"""
+    def __init__(self, run_directory: str):
+        self.run_directory = Path(run_directory)
+        self.run_directory.mkdir(exist_ok=True)
+        self.path = self.run_directory / "processes.json"
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.entries = {}
+
+    def fifo(self, channel_id: int, name: str) -> Path:
+        path = self.run_directory / f"channel_{channel_id}.{name}"
+        if not path.exists():
+            os.mkfifo(path)
+        return path
+
+    def get(self, channel_id: int):
+        return self.entries.get(str(channel_id))
+
+    def save(self, channel_id: int, entry: dict):
+        self.entries[str(channel_id)] = entry
+        self._write()
+
+    def drop(self, channel_id: int, pid: int):
+        entry = self.entries.get(str(channel_id))
+        if entry and entry['pid'] == pid:
+            del self.entries[str(channel_id)]
+            self._write()
+
+    def _write(self):
+        # Archivo pequeño que solo cambia al lanzar o al terminar un proceso: se escribe en el event loop
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+def process_start_ticks(pid: int):
+    """Instante de arranque del proceso (campo 22 de /proc/PID/stat), o None si ya no existe.
+
+    Junto con el PID identifica al proceso aunque el PID se reutilice.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rpartition(')')[2].split()
+    except OSError:
+        return None
+    if fields[0] in ('Z', 'X'):
+        return None  # Ya terminó y espera a que lo recojan
+    return int(fields[19])
+
+async def open_fifo_reader(path: Path, limit: int = 2 ** 16) -> asyncio.StreamReader:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=limit)
+    fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(fd, 'rb', 0))
+    return reader
+
+class DetachedProcess:
+    """ffmpeg lanzado en su propia sesión con stdout y stderr en FIFOs del directorio de ejecución.
+
+    Ofrece lo que el gestor usa de asyncio.subprocess.Process (pid, returncode, stdout, stderr,
+    wait, terminate, kill). ffmpeg abre cada FIFO también para lectura, así que sin gestor no recibe
+    SIGPIPE: la salida se acumula en el pipe hasta que un gestor nuevo se reengancha. El fin del
+    proceso se detecta con pidfd; si lo lanzó un gestor anterior, el código de salida es desconocido (-1).
+    """
+    def __init__(self, pid: int, start_ticks: int, child: bool, on_exit=None):
+        self.pid = pid
+        self.start_ticks = start_ticks
+        self.child = child
+        self.adopted = not child
+        self.on_exit = on_exit
+        self.returncode = None
+        self.stdout = None
+        self.stderr = None
+        self._exited = asyncio.get_running_loop().create_future()
+        self._pidfd = None
+        try:
+            self._pidfd = os.pidfd_open(pid)
+            asyncio.get_running_loop().add_reader(self._pidfd, self._check_exit)
+        except (AttributeError, OSError):
+            asyncio.create_task(self._poll_exit())  # Sin pidfd (kernel < 5.3)
+        self._check_exit()
+
+    def _check_exit(self):
+        if self.returncode is not None:
+            return
+        if self.child:
+            try:
+                pid, status = os.waitpid(self.pid, os.WNOHANG)
+            except ChildProcessError:
+                pid, status = self.pid, None
+            if pid == 0:
+                return
+            self.returncode = os.waitstatus_to_exitcode(status) if status is not None else -1
+        else:
+            if process_start_ticks(self.pid) == self.start_ticks:
+                return
+            self.returncode = -1
+        if self._pidfd is not None:
+            asyncio.get_running_loop().remove_reader(self._pidfd)
+            os.close(self._pidfd)
+            self._pidfd = None
+        self._exited.set_result(None)
+        if self.on_exit:
+            self.on_exit(self)
+
+    async def _poll_exit(self):
+        while self.returncode is None:
+            await asyncio.sleep(1.0)
+            self._check_exit()
+
+    async def wait(self) -> int:
+        await asyncio.shield(self._exited)
+        return self.returncode
+
+    def send_signal(self, sig: int):
+        if self.returncode is not None:
+            raise ProcessLookupError(self.pid)
+        if self._pidfd is not None:
+            signal.pidfd_send_signal(self._pidfd, sig)
+        else:
+            os.kill(self.pid, sig)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+# --- Recursos y ubicación de los procesos ffmpeg ---
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+# Consumo de cada ffmpeg expuesto en get_state() y en /metrics
+RESOURCE_METRICS = ("cpu_percent", "rss_mb", "threads", "io_read_kbps", "io_write_kbps")
+
+def read_proc_stats(pids: List[int]) -> Dict[int, tuple]:
+    """Una pasada por /proc para todos los PIDs: (ticks de CPU, RSS en bytes, hilos, rchar, wchar).
+
+    rchar/wchar cuentan toda la E/S del proceso, incluidos sockets y pipes (la ingesta SRT).
+    """
+    stats = {}
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", 'rb') as f:
+                fields = f.read().rpartition(b')')[2].split()
+        except OSError:
+            continue  # Terminó entre medias
+        io = {}
+        try:
+            with open(f"/proc/{pid}/io", 'rb') as f:
+                for line in f:
+                    key, _, value = line.partition(b':')
+                    io[key] = int(value)
+        except OSError:
+            pass
+        # Campos 14/15 (utime/stime), 20 (num_threads) y 24 (rss) de proc(5), contando desde el estado (3)
+        stats[pid] = (
+            int(fields[11]) + int(fields[12]), int(fields[21]) * PAGE_SIZE, int(fields[17]),
+            io.get(b'rchar'), io.get(b'wchar')
+        )
+    return stats
+
+def _rate_kbps(current, previous, elapsed: float):
+    if current is None or previous is None or elapsed <= 0:
+        return None
+    return round((current - previous) * 8 / 1000 / elapsed, 1)
+
+class PlacementPolicy:
+    """Ubicación opcional de los ffmpeg: afinidad de CPU, nice e ionice.
+
+    Con "placement": {"core_groups": [[0, 1], [2, 3]], "nice": {"0": 5, "10": 0}, "ionice": {"0": [2, 7]}}
+    cada canal va al grupo de núcleos con menos peso ("weight") en marcha, y nice/ionice salen de la
+    entrada de mayor prioridad que no supere la "priority" del canal. Cada canal puede fijar
+    "cpu_affinity", "nice" e "ionice" ([clase, nivel]) directamente.
+    """
+    IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "i686": 289, "armv7l": 314}  # Número de syscall
+
+    def __init__(self):
+        self.groups: Dict[int, int] = {}  # id de canal -> grupo de núcleos asignado
+
+    def plan(self, channel, channels: dict):
+        settings = config.get('placement') or {}
+        channel_config = channel.channel_config
+        if not settings and not any(key in channel_config for key in ('cpu_affinity', 'nice', 'ionice')):
+            return None
+        priority = channel_config.get('priority', 0)
+        cpus = channel_config.get('cpu_affinity')
+        core_groups = settings.get('core_groups')
+        if cpus is None and core_groups:
+            cpus = core_groups[self.pick_group(channel, channels, len(core_groups))]
+        return {
+            "cpus": cpus,
+            "nice": channel_config.get('nice', self.by_priority(settings.get('nice'), priority)),
+            "ionice": channel_config.get('ionice', self.by_priority(settings.get('ionice'), priority)),
+            "failed": False
+        }
+
+    def pick_group(self, channel, channels: dict, count: int) -> int:
+        group = self.groups.get(channel.id)
+        if group is not None and group < count:
+            return group
+        load = [0.0] * count
+        for channel_id, other_group in self.groups.items():
+            other = channels.get(channel_id)
+            if other is not None and other is not channel and other_group < count and other.is_running():
+                load[other_group] += other.channel_config.get('weight', 1)
+        group = self.groups[channel.id] = load.index(min(load))
+        return group
+
+    @staticmethod
+    def by_priority(table, priority: int):
+        if not table:
+            return None
+        eligible = [int(key) for key in table if int(key) <= priority]
+        return table[str(max(eligible))] if eligible else None
+
+    def apply(self, pid: int, plan: dict) -> int:
+        """Aplica el plan a cada hilo del proceso (en Linux afinidad, nice e ionice son por hilo).
+
+        Devuelve cuántos hilos había: los que ffmpeg cree después heredan del hilo que los crea, y el
+        muestreo de recursos vuelve a aplicar el plan si el número cambia.
+        """
+        try:
+            tids = [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+        except OSError:
+            return 0
+        for tid in tids:
+            try:
+                if plan['cpus'] is not None:
+                    os.sched_setaffinity(tid, plan['cpus'])
+                if plan['nice'] is not None:
+                    os.setpriority(os.PRIO_PROCESS, tid, plan['nice'])
+                if plan['ionice'] is not None:
+                    self.set_ioprio(tid, *plan['ionice'])
+            except ProcessLookupError:
+                continue
+            except OSError as e:
+                # Sin permisos (nice negativo, ionice de tiempo real) o núcleos inexistentes: no reintentar
+                logging.warning(f"No se pudo aplicar la ubicación {plan} al proceso {pid}: {e}")
+                plan['failed'] = True
+                break
+        return len(tids)
+
+    def set_ioprio(self, tid: int, io_class: int, level: int):
+        number = self.IOPRIO_SET.get(platform.machine())
+        if number is None:
+            raise OSError(f"ioprio_set no soportado en {platform.machine()}")
+        libc = ctypes.CDLL(None, use_errno=True)
+        # IOPRIO_WHO_PROCESS = 1; la clase va en los bits altos (IOPRIO_CLASS_SHIFT = 13)
+        if libc.syscall(number, 1, tid, (io_class << 13) | level) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
 # --- Gestor de Canales FFMPEG ---
+class SignalWatchdog:
+    """Plazos de pérdida de señal por canal en un heap: solo despierta cuando vence el más próximo.
+
+    Cada bloque de progreso solo mueve channel.signal_deadline; la entrada del heap se
+    reprograma de forma perezosa al vencer, así un canal sano cuesta una operación del heap
+    por cada plazo y no una por bloque.
+    """
+    def __init__(self):
+        self.heap = []  # (plazo monotónico, secuencia, id de canal)
+        self.armed: Dict[int, tuple] = {}  # id -> (canal, secuencia, plazo en el heap)
+        self.seq = 0
+        self.wakeup = asyncio.Event()
+
+    def arm(self, channel):
+        entry = self.armed.get(channel.id)
+        if entry is not None and entry[0] is channel and entry[2] <= channel.signal_deadline:
+            return
+        # Canal nuevo o plazo acortado (cambio de signal_timeout): nueva entrada, la anterior queda obsoleta
+        self.seq += 1
+        self.armed[channel.id] = (channel, self.seq, channel.signal_deadline)
+        heapq.heappush(self.heap, (channel.signal_deadline, self.seq, channel.id))
+        if self.heap[0][1] == self.seq:
+            self.wakeup.set()
+
+    def disarm(self, channel_id: int):
+        self.armed.pop(channel_id, None)
+
+    async def run(self, on_expire):
+        while True:
+            timeout = max(0.0, self.heap[0][0] - time.monotonic()) if self.heap else None
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            now = time.monotonic()
+            while self.heap and self.heap[0][0] <= now:
+                deadline, seq, channel_id = heapq.heappop(self.heap)
+                entry = self.armed.get(channel_id)
+                if entry is None or entry[1] != seq:
+                    continue  # Entrada obsoleta
+                channel = entry[0]
+                if channel.signal_deadline > now:
+                    # Llegaron bloques desde que se armó: reprogramar al plazo actual
+                    self.armed[channel_id] = (channel, seq, channel.signal_deadline)
+                    heapq.heappush(self.heap, (channel.signal_deadline, seq, channel_id))
+                    continue
+                del self.armed[channel_id]
+                hot_path_stats.observe("signal_detection_delay", now - channel.signal_deadline)
+                await on_expire(channel)
+
 class ChannelManager:
     def __init__(self, channel_config, channel_manager):
         self.id = channel_config['id']
         self.name = channel_config['name']
+        self.channel_config = channel_config
+        self.channel_manager = channel_manager
+        self._command = None  # Comando de ffmpeg cacheado; se invalida cuando cambia la configuración
         self.process = None
+        self._status = None
         self.status = "inactive"
         self.log_path = Path(config['log_directory']) / f"channel_{self.id}_{self.name}.log"
         self.log_file = None
+        self.log_bytes = 0
+        self.log_opened_at = None
+        self.log_tail = deque(maxlen=config.get('log_tail_lines', 1000))
+        self.log_subscribers = set()
         self.last_active_timestamp = None
-        self.channel_manager = channel_manager
+        self.signal_deadline = 0.0  # Instante (monotónico) en que se da la señal por perdida
+        self.signal_lost_at = None  # Último frame antes de la pérdida de señal en curso
+        self.signal_events = deque(maxlen=config.get('signal_events_history', 100))
+        self.progress = {}  # Último bloque de -progress recibido
+        self.banner = StreamBanner()  # Información de streams extraída del stderr de ffmpeg
+        self.metrics = MetricsRing(config.get('metrics_history_size', 600))
+        self.spawned_at = None  # Para medir la latencia desde el spawn hasta el primer frame
+        self.first_frame_latency = None
+        self.ts_stats = {}  # Último informe del analizador MPEG-TS (modo analyzer)
+        self.thumbnail = None  # Último JPEG de la salida de miniaturas: {"jpeg", "etag", "updated_at"}
+        # Último muestreo de /proc del proceso ffmpeg (RESOURCE_METRICS). Cambia en cada muestreo, así que
+        # queda fuera de get_state() y de los deltas: se sirve por REST y /metrics
+        self.resources = {}
+        self.placement = None  # Plan de PlacementPolicy aplicado al proceso
+        self.placed_threads = 0
+
+        # Supervisión: reinicios, detección de bucles de caídas y MTTR
+        self.supervisor = None
+        self.restart_count = 0
+        self.consecutive_failures = 0
+        self.crash_count = 0
+        self.crash_times = deque(maxlen=100)  # Ventana para detectar bucles de caídas
+        self.crashed_at = None
+        self.status_before_crash = None
+        self.last_exit_code = None
+        self.quarantined = False
+        self.recovery_times = deque(maxlen=20)
 
         # Crear directorio de logs si no existe
         self.log_path.parent.mkdir(exist_ok=True)
 
+    @property
+    def status(self) -> str:
+        return self._status
+
+    @status.setter
+    def status(self, value: str):
+        # Cada cambio de estado mantiene al día el índice por estado del gestor global
+        self.channel_manager.status_changed(self, self._status, value)
+        self._status = value
+
     def build_command(self) -> List[str]:
-        # Get channel config
-        channel_config = next((ch for ch in self.channel_manager.config.get("channels", []) 
-                            if ch['id'] == self.id), {})
+        if self._command is None:
+            self._command = self.render_command()
+        return list(self._command)
+
+    def invalidate_command(self):
+        self._command = None
+
+    def update_config(self, channel_config: dict) -> bool:
+        """Aplica una nueva definición del canal; devuelve True si hay que reiniciarlo"""
+        old_command = self._command
+        old_log_path = self.log_path
+        self.channel_config = channel_config
+        self.name = channel_config['name']
+        self.log_path = Path(config['log_directory']) / f"channel_{self.id}_{self.name}.log"
+        self.invalidate_command()
+        try:
+            return self.build_command() != old_command or self.log_path != old_log_path
+        except ValueError as e:
+            logging.error(str(e))
+            return True
+
+    def source_url(self) -> str:
+        channel_config = self.channel_config
         
         # Get mode and validate
         mode = channel_config.get('mode', 'listener')
@@ -53,9 +1193,13 @@ class ChannelManager:
             if not remote_ip or not remote_port:
                 raise ValueError(f"Channel {self.name}: remote_ip and remote_port are required for Caller mode")
                 
-            srt_url = f"srt://{remote_ip}:{remote_port}?mode=caller"
-        else:  # Default to Listener mode
-            srt_url = f"srt://0.0.0.0:{port}?mode=listener"
+            return f"srt://{remote_ip}:{remote_port}?mode=caller"
+        # Default to Listener mode
+        return f"srt://0.0.0.0:{port}?mode=listener"
+
+    def render_command(self) -> List[str]:
+        mode = self.channel_config.get('mode', 'listener')
+        srt_url = self.source_url()
 
         # Construye la URL Multicast
         multicast_ip_parts = config['multicast_base_ip'].split('.')
@@ -70,49 +1214,135 @@ class ChannelManager:
         service_id = config['service_id_base'] + self.id
 
         # Reemplaza placeholders en la plantilla del comando 
-        command_template = config['ffmpeg_command_template']
+        if self.analyzer_mode():
+            command_template = config.get('analyzer_command_template', ANALYZER_COMMAND_TEMPLATE)
+        else:
+            command_template = config['ffmpeg_command_template']
         command = [
             str(arg).format(
                 srt_url=srt_url,
                 multicast_url=multicast_url,
                 channel_name=self.name,
-                service_id=service_id
+                service_id=service_id,
+                port=config['srt_base_port'] + self.id  # Para entradas distintas de SRT, p. ej. udp://0.0.0.0:{port}
             )
             for arg in command_template
         ]
+
+        # Progreso legible por máquina en stdout; sustituye la línea de estadísticas.
+        # En modo analyzer stdout transporta el TS, así que el progreso se deduce del propio stream.
+        if "-progress" not in command and not self.analyzer_mode():
+            command[1:1] = ["-progress", "pipe:1", "-nostats"]
+        if self.thumbnails_enabled():
+            if "-vn" in command or any(
+                    arg in VIDEO_COPY_OPTIONS and value == "copy" for arg, value in zip(command, command[1:])):
+                # La salida principal no decodifica video: solo las miniaturas lo hacen, y solo keyframes
+                position = command.index("-i") if "-i" in command else 1
+                command[position:position] = ["-skip_frame", "nokey"]
+            command += self.thumbnail_arguments(command[0])
         logging.info(f"Comando para canal {self.name} (modo {mode}): {' '.join(command)}")
         return command
 
+    def analyzer_mode(self) -> bool:
+        return self.channel_config.get('monitor_mode', config.get('monitor_mode', 'decode')) == 'analyzer'
+
+    def thumbnails_enabled(self) -> bool:
+        # En modo analyzer ffmpeg no decodifica, así que no hay frames de los que sacar miniaturas
+        return self.channel_config.get('thumbnails', config.get('thumbnails', False)) and not self.analyzer_mode()
+
+    def thumbnail_arguments(self, binary: str) -> List[str]:
+        interval = config.get('thumbnail_interval', 10)
+        width = config.get('thumbnail_width', 320)
+        select = f"select='eq(pict_type,I)*(isnan(prev_selected_t)+gte(t-prev_selected_t,{interval}))'"
+        fps_mode = config.get('thumbnail_fps_mode')  # true/false fuerza la variante sin consultar la versión
+        if fps_mode is None:
+            version = ffmpeg_version(binary)
+            fps_mode = version is not None and version >= (5, 1)
+        if fps_mode:
+            # Solo para esta salida; -vsync es global y cambiaría también el ritmo de la principal
+            filters, timing = f"{select},scale={width}:-2", ["-fps_mode:v", "vfr"]
+        else:
+            # ffmpeg < 5.1 no tiene -fps_mode: el filtro fps fija el ritmo de la salida para que image2pipe
+            # (CFR por defecto) no repita la miniatura al ritmo del video de entrada
+            filters, timing = f"{select},fps=1/{interval},scale={width}:-2", []
+        return [
+            "-map", "0:v:0?", "-vf", filters, *timing,
+            "-c:v", "mjpeg", "-q:v", str(config.get('thumbnail_quality', 7)), "-f", "image2pipe", THUMBNAIL_PIPE
+        ]
+
     async def start(self):
-        if self.process and self.process.poll() is None:
+        if self.is_running():
             logging.info(f"El proceso para el canal {self.name} ya está activo.")
             return
 
+        # Un arranque manual levanta la cuarentena y reinicia el backoff y la ventana de caídas
+        self.quarantined = False
+        self.consecutive_failures = 0
+        self.crash_times.clear()
+        await self.spawn()
+
+        # Una sola tarea supervisora por canal; reemplaza a la anterior (p. ej. en pausa de backoff)
+        if self.supervisor and not self.supervisor.done():
+            self.supervisor.cancel()
+        self.supervisor = asyncio.create_task(self.supervise(self.process))
+
+    async def spawn(self):
         command = self.build_command()
+        self.spawned_at = time.perf_counter()
+        self.banner = StreamBanner()
+        thumbnail_read_fd = thumbnail_write_fd = None
         try:
-            # Abrir archivo de log para stdout y stderr
-            self.log_file = open(self.log_path, 'w')  # Cambiado de 'a' a 'w'
-            logging.info(f"Iniciando proceso para canal {self.name} con comando: {' '.join(command)}")
-            
-            # Iniciar el proceso usando subprocess.Popen
-            self.process = subprocess.Popen(
-                command,
-                stdout=self.log_file,
-                stderr=subprocess.STDOUT,
-                text=True
-            )
+            detached = config.get('detached_processes', False)
+            if detached and self.analyzer_mode():
+                # En modo analyzer stdout lleva el TS completo: sin gestor leyendo, el FIFO se llenaría
+                # en segundos y ffmpeg quedaría bloqueado, así que estos canales se lanzan acoplados
+                # (y se retira el proceso desacoplado que hubiera de antes del cambio de modo)
+                detached = False
+                await self.adopt(self.channel_manager.process_registry(), None)
+            if detached:
+                self.process, thumbnail_read_fd = await self.spawn_detached(command)
+            else:
+                # Abrir archivo de log (rotando el de la ejecución anterior); recibe stderr y -progress
+                self.open_log()
+                logging.info(f"Iniciando proceso para canal {self.name} con comando: {' '.join(command)}")
+                if THUMBNAIL_PIPE in command:
+                    thumbnail_read_fd, thumbnail_write_fd = os.pipe()
+                    command = [f"pipe:{thumbnail_write_fd}" if arg == THUMBNAIL_PIPE else arg for arg in command]
+
+                # stdout transporta la salida de -progress, stderr el log de ffmpeg
+                self.process = await asyncio.create_subprocess_exec(
+                    *command,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    pass_fds=(thumbnail_write_fd,) if thumbnail_write_fd is not None else ()
+                )
             
             if not self.process:
                 raise Exception("No se pudo crear el proceso")
                 
             self.status = "listening"
+            self.progress = {}
+            self.ts_stats = {}
+            self.channel_manager.prober.invalidate(self.id)
             logging.info(f"Proceso para canal {self.name} iniciado con PID: {self.process.pid}")
+            self.resources = {}
+            self.placement = self.channel_manager.placement.plan(self, self.channel_manager.channels)
+            if self.placement:
+                self.placed_threads = self.channel_manager.placement.apply(self.process.pid, self.placement)
             
             # Notificar a los clientes WebSocket sobre el cambio de estado
             await self.channel_manager.broadcast_status()
             
-            # Iniciar tarea para leer la salida del proceso
-            asyncio.create_task(self.read_output())
+            # Iniciar tareas para leer la salida del proceso
+            asyncio.create_task(self.read_stderr(self.process))
+            if self.analyzer_mode():
+                asyncio.create_task(self.read_transport_stream(self.process))
+            else:
+                asyncio.create_task(self.read_output(self.process))
+            if thumbnail_read_fd is not None:
+                asyncio.create_task(self.read_thumbnails(thumbnail_read_fd))
+                thumbnail_read_fd = None
             
         except Exception as e:
             logging.exception(f"Error al iniciar el proceso para el canal {self.name}: {str(e)}")
@@ -120,56 +1350,436 @@ class ChannelManager:
             await self.channel_manager.broadcast_status()
             if self.log_file:
                 self.log_file.close()
+                self.log_file = None
+            if thumbnail_read_fd is not None:
+                os.close(thumbnail_read_fd)
+
+        finally:
+            # El extremo de escritura solo debe quedar abierto en ffmpeg, para que el lector vea EOF al salir
+            if thumbnail_write_fd is not None:
+                os.close(thumbnail_write_fd)
+
+    async def spawn_detached(self, command: List[str]):
+        """Modo detached_processes: reengancha el ffmpeg de un gestor anterior o lanza uno nuevo en su
+        propia sesión con la salida en FIFOs. Devuelve el proceso y el fd de lectura de miniaturas"""
+        registry = self.channel_manager.process_registry()
+        thumbnails = THUMBNAIL_PIPE in command
+        process = await self.adopt(registry, command)
+
+        if process is None:
+            self.open_log()
+            logging.info(f"Iniciando proceso desacoplado para canal {self.name} con comando: {' '.join(command)}")
+            names = ("stdout", "stderr", "thumbnails") if thumbnails else ("stdout", "stderr")
+            write_fds = {}
+            try:
+                for name in names:
+                    write_fds[name] = os.open(registry.fifo(self.id, name), os.O_RDWR)
+                    try:
+                        # Margen para la salida que se acumula mientras no hay gestor leyendo
+                        fcntl.fcntl(write_fds[name], fcntl.F_SETPIPE_SZ, config.get('detached_pipe_size', 1024 * 1024))
+                    except OSError:
+                        pass
+                argv = list(command)
+                if thumbnails:
+                    os.set_inheritable(write_fds["thumbnails"], True)
+                    argv = [f"pipe:{write_fds['thumbnails']}" if arg == THUMBNAIL_PIPE else arg for arg in argv]
+                pid = os.posix_spawnp(argv[0], argv, os.environ, file_actions=[
+                    (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+                    (os.POSIX_SPAWN_DUP2, write_fds["stdout"], 1),
+                    (os.POSIX_SPAWN_DUP2, write_fds["stderr"], 2),
+                ], setsid=True)
+            finally:
+                for fd in write_fds.values():
+                    os.close(fd)
+            process = DetachedProcess(pid, process_start_ticks(pid), child=True, on_exit=self.process_exited)
+            registry.save(self.id, {
+                "pid": pid, "start_ticks": process.start_ticks, "command": command, "started_at": time.time()
+            })
+
+        process.stdout = await open_fifo_reader(registry.fifo(self.id, "stdout"))
+        process.stderr = await open_fifo_reader(registry.fifo(self.id, "stderr"))
+        thumbnail_read_fd = None
+        if thumbnails:
+            thumbnail_read_fd = os.open(registry.fifo(self.id, "thumbnails"), os.O_RDONLY | os.O_NONBLOCK)
+        return process, thumbnail_read_fd
+
+    async def adopt(self, registry, command: List[str]):
+        """Devuelve el ffmpeg que dejó en marcha un gestor anterior si sigue vivo con el mismo comando"""
+        entry = registry.get(self.id)
+        if not entry:
+            return None
+        if process_start_ticks(entry['pid']) != entry['start_ticks']:
+            registry.drop(self.id, entry['pid'])
+            return None
+        process = DetachedProcess(entry['pid'], entry['start_ticks'], child=False, on_exit=self.process_exited)
+        if entry['command'] != command:
+            logging.info(f"El comando del canal {self.name} cambió: se detiene el proceso {entry['pid']}")
+            await self.terminate(process)
+            return None
+
+        # Continuar el log de la ejecución en curso y recuperar su banner, que ya se leyó antes del reinicio
+        self.open_log(append=True)
+        # El banner está al principio de la ejecución: en la parte más antigua si el log ya rotó por tamaño
+        self.banner = await asyncio.to_thread(StreamBanner.from_log, self.run_log_files(0)[-1])
+        self.spawned_at = None
+        logging.info(f"Proceso {entry['pid']} del canal {self.name} reenganchado tras el reinicio del gestor")
+        return process
+
+    def process_exited(self, process):
+        self.channel_manager.process_registry().drop(self.id, process.pid)
+
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    def open_log(self, append: bool = False):
+        if self.log_file and not self.log_file.closed:
+            self.log_file.close()
+        if append and self.log_path.exists():
+            self.log_file = open(self.log_path, 'a', encoding='utf-8')
+            self.log_bytes = self.log_path.stat().st_size
+        else:
+            self.rotate_log_files()
+            self.log_file = open(self.log_path, 'w', encoding='utf-8')
+            self.log_bytes = 0
+        self.log_opened_at = time.time()
+
+    def run_log_base(self, run: int) -> Path:
+        """Archivo principal de una ejecución: 0 es la actual (channel_X.log), 1 la anterior (.log.1)..."""
+        return self.log_path if run == 0 else self.log_path.with_name(f"{self.log_path.name}.{run}")
+
+    def run_log_files(self, run: int) -> List[Path]:
+        """Archivos de una ejecución, del más reciente al más antiguo: el principal y sus partes .part1, .part2..."""
+        base = self.run_log_base(run)
+        parts = {}
+        for path in base.parent.glob(glob.escape(base.name) + ".part*"):
+            number = path.name[len(base.name) + len(".part"):]
+            if number.isdigit():
+                parts[int(number)] = path
+        return [base] + [parts[number] for number in sorted(parts)]
 
-    async def read_output(self):
-        """Lee y registra la salida del proceso ffmpeg"""
+    def rotate_log_files(self):
+        """Archiva la ejecución anterior junto con sus partes: channel_X.log(.partN) -> .log.1(.partN) -> .log.2...
+
+        Conserva `log_backup_count` ejecuciones anteriores, independientemente de cuántas partes tenga cada una.
+        """
+        backups = config.get('log_backup_count', 5)
+        if not self.log_path.exists():
+            return
+        for path in self.run_log_files(max(backups, 0)):
+            path.unlink(missing_ok=True)
+        for run in range(backups - 1, -1, -1):
+            base, target = self.run_log_base(run), self.run_log_base(run + 1)
+            for path in self.run_log_files(run):
+                if path.exists():
+                    os.replace(path, target.with_name(target.name + path.name[len(base.name):]))
+
+    def rotate_log_part(self):
+        """Rotación por tamaño o antigüedad dentro de una ejecución: channel_X.log -> .part1 -> .part2...
+
+        Conserva `log_max_parts` partes de la ejecución en curso; no toca las ejecuciones anteriores.
+        """
+        self.log_file.close()
+        parts = config.get('log_max_parts', 5)
+        if parts > 0:
+            for number in range(parts - 1, 0, -1):
+                try:
+                    os.replace(f"{self.log_path}.part{number}", f"{self.log_path}.part{number + 1}")
+                except FileNotFoundError:
+                    pass
+            os.replace(self.log_path, f"{self.log_path}.part1")
+        self.log_file = open(self.log_path, 'w', encoding='utf-8')
+        self.log_bytes = 0
+        self.log_opened_at = time.time()
+
+    def _write_log(self, line: str, tail: bool = True):
+        if self.log_file and not self.log_file.closed:
+            self.log_file.write(line)
+            # Bytes en disco, no caracteres: los mensajes de ffmpeg pueden traer UTF-8 multibyte
+            self.log_bytes += len(line.encode('utf-8'))
+            # Rotación por tamaño o por antigüedad del archivo en curso
+            interval = config.get('log_rotate_interval', 86400)
+            if self.log_bytes >= config.get('log_max_bytes', 10 * 1024 * 1024) or (
+                    interval and time.time() - self.log_opened_at >= interval):
+                self.rotate_log_part()
+        if tail:
+            self.append_tail(line.rstrip('\n'))
+
+    def append_tail(self, text: str):
+        """Guarda la línea en el buffer en memoria y la reparte a los clientes de /ws/logs"""
+        self.log_tail.append(text)
+        for queue in self.log_subscribers:
+            try:
+                queue.put_nowait(text)
+            except asyncio.QueueFull:
+                pass  # Cliente lento: pierde líneas en lugar de frenar la lectura de ffmpeg
+
+    async def read_stderr(self, process):
+        """Copia el log de ffmpeg (stderr) al archivo del canal"""
         try:
             while True:
-                if self.process.poll() is not None:
+                line = await process.stderr.readline()
+                if not line:
                     break
-                    
-                # Leer línea por línea del archivo de log
-                with open(self.log_path, 'r') as f:
-                    f.seek(0, os.SEEK_END)  # Mover al final del archivo
-                    while True:
-                        line = f.readline()
-                        if not line:
-                            break
-                        
-                        decoded = line.strip()
-                        if decoded:
-                            logging.debug(f"[{self.name}] {decoded}")
-                            
-                            # Detectar si hay video activo (frame= y (fps= o bitrate=))
-                            if "frame=" in decoded and ("fps=" in decoded or "bitrate=" in decoded):
-                                prev_status = self.status
-                                self.status = "active"
-                                self.last_active_timestamp = time.time()
-                                
-                                # Notificar a los clientes WebSocket solo si el estado cambió
-                                if prev_status != "active":
-                                    await self.channel_manager.broadcast_status()
-                                    logging.info(f"Canal {self.name} detectado como ACTIVO (video recibido)")
-                            else:
-                                # Mantener el timestamp actualizado para cualquier actividad
-                                self.last_active_timestamp = time.time()
-                                
-                await asyncio.sleep(1)  # Esperar un segundo antes de leer nuevamente
+                decoded = line.decode('utf-8', errors='replace')
+                self._write_log(decoded)
+                if not self.banner.complete:
+                    self.banner.feed(decoded)
+                logging.debug(f"[{self.name}] {decoded.rstrip()}")
+        except Exception as e:
+            logging.error(f"Error leyendo stderr de ffmpeg para {self.name}: {str(e)}")
+
+    async def read_output(self, process):
+        """Procesa los bloques clave=valor de -progress a medida que llegan"""
+        block = {}
+        try:
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+
+                decoded = line.decode('utf-8', errors='replace')
+                # El progreso va al archivo pero no al buffer en memoria, que queda para el log de ffmpeg
+                self._write_log(decoded, tail=False)
+                key, sep, value = decoded.strip().partition('=')
+                if not sep:
+                    continue
+                block[key] = value.strip()
+
+                # "progress=" cierra cada bloque (continue/end)
+                if key == 'progress':
+                    started = time.perf_counter()
+                    await self.apply_progress(block)
+                    hot_path_stats.observe("progress_block", time.perf_counter() - started)
+                    block = {}
             
         except Exception as e:
             logging.error(f"Error leyendo salida de ffmpeg para {self.name}: {str(e)}")
-            
+
+        # Fuera de un finally: al cancelarse la tarea en el apagado no se espera a un ffmpeg desacoplado
+        await process.wait()
+        if self.log_file and self.process is process:
+            self.log_file.close()
+            self.log_file = None
+
+    async def read_thumbnails(self, read_fd: int):
+        """Lee los JPEG que ffmpeg escribe en el pipe de miniaturas y guarda el último en memoria"""
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=config.get('thumbnail_max_bytes', 1024 * 1024))
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(read_fd, 'rb', 0)
+        )
+        try:
+            while True:
+                # Cada JPEG termina en el marcador EOI (FF D9), que no aparece dentro de los datos codificados
+                try:
+                    data = await reader.readuntil(b'\xff\xd9')
+                except asyncio.LimitOverrunError as e:
+                    # JPEG mayor que thumbnail_max_bytes: descartarlo sin dejar de vaciar el pipe
+                    await reader.readexactly(e.consumed)
+                    continue
+                start = data.find(b'\xff\xd8')
+                if start < 0:
+                    continue
+                jpeg = data[start:]
+                self.thumbnail = {
+                    "jpeg": jpeg,
+                    "etag": f'"{hashlib.blake2b(jpeg, digest_size=8).hexdigest()}"',
+                    "updated_at": time.time()
+                }
+        except asyncio.IncompleteReadError:
+            pass
+        except Exception as e:
+            logging.error(f"Error leyendo miniaturas de {self.name}: {str(e)}")
         finally:
-            if self.log_file:
-                self.log_file.close()
-                self.log_file = None
-            # Si el proceso terminó inesperadamente, actualizar el estado
-            if self.process and self.process.poll() is not None:
-                self.status = "error"
-                await self.channel_manager.broadcast_status()
+            transport.close()
+
+    async def read_transport_stream(self, process):
+        """Modo analyzer: stdout trae el transport stream copiado por ffmpeg y se analiza sin decodificar"""
+        analyzer = TSAnalyzer(use_numpy=config.get('analyzer_use_numpy', True))
+        interval = config.get('analyzer_interval', 1.0)
+        next_report = time.monotonic() + interval
+        try:
+            while True:
+                chunk = await process.stdout.read(65536)
+                if not chunk:
+                    break
+
+                now = time.monotonic()
+                started = time.perf_counter()
+                analyzer.feed(chunk, now)
+                hot_path_stats.observe("ts_analyze", time.perf_counter() - started)
+                if now >= next_report:
+                    await self.apply_ts_report(analyzer.report(now))
+                    next_report = now + interval
+
+        except Exception as e:
+            logging.error(f"Error analizando el transport stream de {self.name}: {str(e)}")
+
+        await process.wait()
+        if self.log_file and self.process is process:
+            self.log_file.close()
+            self.log_file = None
+
+    async def apply_ts_report(self, report: dict):
+        self.ts_stats = report
+        self.metrics.append(time.time(), (
+            math.nan, report['bitrate_kbps'], math.nan, math.nan, math.nan, report['pcr_seconds']
+        ))
+        if report['signal']:
+            await self.mark_active()
+
+    async def supervise(self, process):
+        """Despierta en cuanto el hijo termina (child watcher de asyncio) y lo reinicia con backoff"""
+        while True:
+            if process is not None:
+                await process.wait()
+            # Detenido o reemplazado por un arranque manual: esta supervisión terminó
+            if self.process is not process or self.status == "stopping":
+                return
+
+            now = time.time()
+            exit_code = process.returncode if process else None
+            logging.warning(f"Process for {self.name} has CRASHED (código {exit_code}).")
+            if self.crashed_at is None:
+                self.crashed_at = now
+                self.status_before_crash = self.status
+            self.last_exit_code = exit_code
+            self.crash_count += 1
+            self.crash_times.append(now)
+            self.append_tail(f"*** ffmpeg terminó con código {exit_code} ***")
+            self.status = "crashed"
+            self.last_active_timestamp = None
+
+            # Demasiadas caídas dentro de la ventana: cuarentena, con un reintento espaciado para que un
+            # origen caído un rato (p. ej. un caller sin remoto) vuelva solo cuando se recupere
+            window = config.get('crash_loop_window', 300)
+            recent = sum(1 for t in self.crash_times if now - t <= window)
+            if recent >= config.get('crash_loop_threshold', 5):
+                logging.error(f"Canal {self.name} en CUARENTENA: {recent} caídas en {window}s")
+                self.quarantined = True
+                self.status = "quarantined"
+                delay = config.get('quarantine_retry_interval', config.get('restart_backoff_max', 60.0))
+                logging.info(f"Reintentando el canal en cuarentena {self.name} en {delay:.0f}s...")
+            else:
+                delay = self.backoff_delay()
+                self.consecutive_failures += 1
+                logging.info(f"Restarting crashed channel {self.name} in {delay:.1f}s...")
+            await self.channel_manager.broadcast_status()
+
+            await asyncio.sleep(delay)
+            if self.process is not process:
+                return
+
+            self.quarantined = False
+            self.restart_count += 1
+            await self.spawn()
+            if self.is_running() and self.status_before_crash != "active":
+                # El canal no recibía video antes de la caída: basta con volver a estar en marcha
+                self.record_recovery()
+            process = self.process
+
+    def backoff_delay(self) -> float:
+        """Backoff exponencial con jitter: base * 2^fallos, acotado, escalado al azar entre 50% y 100%"""
+        base = config.get('restart_backoff_base', 1.0)
+        cap = config.get('restart_backoff_max', 60.0)
+        return min(cap, base * 2 ** self.consecutive_failures) * random.uniform(0.5, 1.0)
+
+    def record_recovery(self):
+        if self.crashed_at is None:
+            return
+        self.recovery_times.append(time.time() - self.crashed_at)
+        self.crashed_at = None
+        self.status_before_crash = None
+        self.consecutive_failures = 0
+
+    def mttr(self):
+        if not self.recovery_times:
+            return None
+        return round(sum(self.recovery_times) / len(self.recovery_times), 3)
+
+    async def apply_progress(self, block: dict):
+        """Actualiza el estado del canal con un bloque de progreso completo"""
+        prev = self.progress
+        self.progress = block
+        self.record_metrics(block)
+
+        # Hay video activo si avanzan los frames o el tiempo de salida
+        advanced = (
+            _to_int(block.get('frame')) > _to_int(prev.get('frame')) or
+            _to_int(block.get('out_time_us')) > _to_int(prev.get('out_time_us'))
+        )
+        if advanced:
+            await self.mark_active()
+
+    async def mark_active(self):
+        """Registra que llega video (o transport stream con contenido) y notifica el paso a activo"""
+        if self.spawned_at is not None:
+            self.first_frame_latency = time.perf_counter() - self.spawned_at
+            self.spawned_at = None
+            hot_path_stats.observe("spawn_to_first_frame", self.first_frame_latency)
+
+        prev_status = self.status
+        self.status = "active"
+        self.last_active_timestamp = time.time()
+        self.signal_deadline = time.monotonic() + self.signal_timeout()
+        self.channel_manager.signal_watchdog.arm(self)
+
+        # Notificar a los clientes WebSocket solo si el estado cambió
+        if prev_status != "active":
+            self.record_recovery()
+            if self.signal_lost_at is not None:
+                outage = self.last_active_timestamp - self.signal_lost_at
+                self.record_signal_event("recovered", outage=round(outage, 3))
+                self.append_tail(f"*** Señal recuperada tras {outage:.1f}s ***")
+                self.signal_lost_at = None
+            await self.channel_manager.broadcast_status()
+            logging.info(f"Canal {self.name} detectado como ACTIVO (video recibido)")
+
+    def signal_timeout(self) -> float:
+        """Segundos sin avance de frames para dar la señal por perdida (por canal o global)"""
+        return self.channel_config.get('signal_timeout', config.get('signal_timeout', 15))
+
+    async def signal_lost(self):
+        """Vence el plazo de señal: vuelve a listening y registra la transición"""
+        if not self.is_running() or self.status != "active":
+            return
+        logging.warning(f"Stream TIMEOUT for channel {self.name}. Reverting to LISTENING.")
+        self.signal_lost_at = self.last_active_timestamp
+        self.status = "listening"
+        self.last_active_timestamp = None
+        self.record_signal_event("no_signal", last_frame_at=self.signal_lost_at, timeout=self.signal_timeout())
+        self.append_tail(f"*** Sin señal desde hace {self.signal_timeout()}s ***")
+        await self.channel_manager.broadcast_status()
+
+    def record_signal_event(self, event: str, **details):
+        self.signal_events.append({"event": event, "at": time.time(), **details})
+
+    def record_metrics(self, block: dict):
+        out_time_us = _to_float(block.get('out_time_us'))
+        self.metrics.append(time.time(), (
+            _to_float(block.get('fps')),
+            _to_float(block.get('bitrate'), 'kbits/s'),
+            _to_float(block.get('speed'), 'x'),
+            _to_float(block.get('drop_frames')),
+            _to_float(block.get('dup_frames')),
+            out_time_us / 1e6,
+        ))
 
     async def stop(self):
-        if self.process and self.process.poll() is None:
+        # Sin supervisor no hay reinicios automáticos mientras se detiene
+        if self.supervisor and not self.supervisor.done():
+            self.supervisor.cancel()
+        self.supervisor = None
+        # Una parada manual cierra la pérdida de señal en curso: no habrá "recovered"
+        self.signal_lost_at = None
+
+        if not self.is_running() and self.status in ("crashed", "quarantined", "error"):
+            self.process = None
+            self.status = "inactive"
+            self.quarantined = False
+            await self.channel_manager.broadcast_status()
+
+        if self.is_running():
             try:
                 # Primero actualizamos el estado a "stopping" para el feedback visual
                 prev_status = self.status
@@ -177,13 +1787,7 @@ class ChannelManager:
                 await self.channel_manager.broadcast_status()
                 
                 logging.info(f"Deteniendo proceso del canal {self.name}")
-                self.process.terminate()
-                try:
-                    self.process.wait(timeout=5.0)
-                except subprocess.TimeoutExpired:
-                    logging.warning(f"Forzando terminación del proceso para el canal {self.name}")
-                    self.process.kill()
-                    self.process.wait()
+                await self.terminate(self.process)
             except Exception as e:
                 logging.error(f"Error al detener el proceso del canal {self.name}: {e}")
             finally:
@@ -192,8 +1796,26 @@ class ChannelManager:
                     self.log_file = None
                 self.process = None
                 self.status = "inactive"
+                await self.channel_manager.broadcast_status()
                 logging.info(f"Canal {self.name} detenido exitosamente")
 
+    async def terminate(self, process):
+        """SIGTERM, espera asíncrona con plazo y SIGKILL si no termina; nunca bloquea el event loop"""
+        timeout = config.get('stop_timeout', 5.0)
+        try:
+            process.terminate()
+        except ProcessLookupError:
+            return
+        try:
+            await asyncio.wait_for(process.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Forzando terminación del proceso para el canal {self.name}")
+            try:
+                process.kill()
+            except ProcessLookupError:
+                return
+            await process.wait()
+
     async def restart(self):
         await self.stop()
         await self.start()
@@ -203,109 +1825,608 @@ class ChannelManager:
             "id": self.id,
             "name": self.name,
             "status": self.status,
-            "pid": self.process.pid if self.process else None
+            "pid": self.process.pid if self.process else None,
+            "restart_count": self.restart_count,
+            "crash_count": self.crash_count,
+            "last_exit_code": self.last_exit_code,
+            "mttr": self.mttr(),
+            "signal_lost_at": self.signal_lost_at
         }
 
+class WebSocketClient:
+    def __init__(self, websocket: WebSocket, queue_size: int, channel_filter=None):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.sender = None
+        self.resyncs = 0  # Resincronizaciones seguidas sin vaciar la cola
+        # Vista filtrada (estados, texto del nombre) o None para recibir todos los canales
+        self.filter = channel_filter
+        self.visible = set()  # IDs de la vista filtrada que el cliente tiene
+        self.version = 0  # Última versión enviada al cliente filtrado
+
+    def matches(self, state: dict) -> bool:
+        statuses, q = self.filter
+        return (not statuses or state['status'] in statuses) and (not q or q in state['name'].lower())
+
+class StatusBroadcaster:
+    """Agrupa los cambios de estado en ticks y los envía como deltas versionados"""
+    def __init__(self, channel_manager):
+        self.channel_manager = channel_manager
+        self.clients: Dict[WebSocket, WebSocketClient] = {}
+        self.version = 0
+        self.sent_states: Dict[int, dict] = {}
+        self.dirty = asyncio.Event()
+        self.published = asyncio.Event()
+        self.interval = config.get('broadcast_interval', 0.1)
+        self.queue_size = config.get('ws_queue_size', 32)
+        self.send_timeout = config.get('ws_send_timeout', 5.0)
+        self.max_resyncs = config.get('ws_max_resyncs', 3)
+        self._snapshot = (None, None)
+        # Documento de GET /api/status por versión: (versión, cuerpo, cuerpo gzip o None si aún no se pidió)
+        self._http_snapshot = (None, None, None)
+        self.epoch = os.urandom(4).hex()  # Distingue las versiones de un arranque y de otro en el ETag
+
+    def notify(self):
+        self.dirty.set()
+
+    async def run(self):
+        while True:
+            await self.dirty.wait()
+            # Esperar un tick para agrupar todos los cambios que lleguen mientras tanto
+            await asyncio.sleep(self.interval)
+            self.dirty.clear()
+            try:
+                self.publish()
+            except Exception as e:
+                logging.exception(f"Error al difundir el estado de los canales: {e}")
+
+    def publish(self):
+        """Calcula los canales que cambiaron desde la última versión y encola el delta serializado una sola vez"""
+        started = time.perf_counter()
+        current = {
+            channel_id: channel.get_state() for channel_id, channel in self.channel_manager.channels.items()
+        }
+        changed = [state for channel_id, state in current.items() if self.sent_states.get(channel_id) != state]
+        removed = [channel_id for channel_id in self.sent_states if channel_id not in current]
+        hot_path_stats.observe("broadcast_diff", time.perf_counter() - started)
+        if not changed and not removed:
+            return
+
+        self.version += 1
+        self.sent_states = current
+        # Despertar a quien espere cambios (p. ej. el enlace del agente con el coordinador)
+        self.published.set()
+        self.published = asyncio.Event()
+        state_db = self.channel_manager.config_store.state_db
+        if state_db and changed:
+            state_db.save_states(changed)
+        if not self.clients:
+            return
+
+        started = time.perf_counter()
+        shared = None
+        filtered = {}  # Un mensaje por (filtro, versión de partida): los clientes iguales lo comparten
+        for client in list(self.clients.values()):
+            if client.filter is None:
+                if shared is None:
+                    shared = json.dumps({
+                        "type": "delta",
+                        "version": self.version,
+                        "since": self.version - 1,
+                        "channels": changed,
+                        "removed": removed
+                    })
+                self.enqueue(client, shared)
+                continue
+
+            # Vista filtrada: los canales que dejan de coincidir salen de la vista como eliminados
+            shown = [state for state in changed if client.matches(state)]
+            hidden = [state['id'] for state in changed if state['id'] in client.visible and not client.matches(state)]
+            hidden += [channel_id for channel_id in removed if channel_id in client.visible]
+            if not shown and not hidden:
+                continue
+            key = (client.filter, client.version)
+            message = filtered.get(key)
+            if message is None:
+                message = filtered[key] = json.dumps({
+                    "type": "delta",
+                    "version": self.version,
+                    "since": client.version,
+                    "channels": shown,
+                    "removed": hidden
+                })
+            client.visible.difference_update(hidden)
+            client.visible.update(state['id'] for state in shown)
+            client.version = self.version
+            self.enqueue(client, message)
+        hot_path_stats.observe("broadcast_serialize", time.perf_counter() - started)
+
+    def snapshot(self) -> str:
+        version, message = self._snapshot
+        if version != self.version:
+            message = json.dumps({
+                "type": "snapshot",
+                "version": self.version,
+                "channels": list(self.sent_states.values())
+            })
+            self._snapshot = (self.version, message)
+        return message
+
+    def refresh(self):
+        """Publica ya el estado inicial o los cambios pendientes, sin esperar al próximo tick"""
+        if self.version == 0 or self.dirty.is_set():
+            self.publish()
+
+    def http_snapshot(self, compressed: bool) -> tuple:
+        """(ETag, versión, cuerpo) del snapshot para GET /api/status; se serializa y comprime una vez por versión"""
+        self.refresh()
+        version, body, gzipped = self._http_snapshot
+        if version != self.version:
+            version, body, gzipped = self.version, self.snapshot().encode(), None
+        if compressed and gzipped is None:
+            gzipped = gzip.compress(body, compresslevel=6)
+        self._http_snapshot = (version, body, gzipped)
+        # Cada representación lleva su propio ETag fuerte: el cuerpo gzip no es idéntico byte a byte
+        if compressed:
+            return f'"{self.epoch}-{version}-gz"', version, gzipped
+        return f'"{self.epoch}-{version}"', version, body
+
+    async def wait_version(self, version: int, timeout: float):
+        """Espera a que se publique una versión posterior a `version` (o a que venza el plazo)"""
+        self.refresh()
+        # Una versión futura viene de un arranque anterior del gestor (el contador empezó de cero):
+        # se responde ya con el snapshot actual
+        if version > self.version:
+            return
+        deadline = time.monotonic() + timeout
+        while self.version <= version:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(self.published.wait(), remaining)
+            except asyncio.TimeoutError:
+                return
+
+    def enqueue(self, client: WebSocketClient, message: str):
+        try:
+            client.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Cliente lento: descartar lo pendiente y reemplazarlo por un snapshot completo
+            client.resyncs += 1
+            if client.resyncs > self.max_resyncs:
+                logging.warning(f"Cliente {client.websocket.client} demasiado lento, desconectando.")
+                client.sender.cancel()
+                return
+            self.resync(client)
+
+    def client_snapshot(self, client: WebSocketClient) -> str:
+        if client.filter is None:
+            return self.snapshot()
+        channels = [state for state in self.sent_states.values() if client.matches(state)]
+        client.visible = {state['id'] for state in channels}
+        client.version = self.version
+        return json.dumps({"type": "snapshot", "version": self.version, "channels": channels})
+
+    def resync(self, client: WebSocketClient):
+        while not client.queue.empty():
+            client.queue.get_nowait()
+        client.queue.put_nowait(self.client_snapshot(client))
+
+    @staticmethod
+    def make_filter(status=None, q=None):
+        """Filtro de suscripción a partir de estados (lista o separados por comas) y texto del nombre"""
+        if isinstance(status, str):
+            status = status.split(',')
+        statuses = frozenset(s.strip() for s in status or () if s.strip())
+        q = (q or '').strip().lower()
+        return (statuses, q) if statuses or q else None
+
+    def subscribe(self, client: WebSocketClient, status=None, q=None):
+        client.filter = self.make_filter(status, q)
+        self.resync(client)
+
+    async def sender(self, client: WebSocketClient):
+        try:
+            while True:
+                message = await client.queue.get()
+                started = time.perf_counter()
+                await asyncio.wait_for(client.websocket.send_text(message), timeout=self.send_timeout)
+                hot_path_stats.observe("broadcast_send", time.perf_counter() - started)
+                if client.queue.empty():
+                    client.resyncs = 0
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logging.warning(f"Error al enviar a WebSocket {client.websocket.client}: {e}")
+        finally:
+            # Si el envío se cortó desde aquí, cerrar para que el handler de /ws termine
+            if self.clients.pop(client.websocket, None) is not None:
+                try:
+                    await asyncio.wait_for(client.websocket.close(code=1013), timeout=1.0)
+                except Exception:
+                    pass
+
+    async def connect(self, websocket: WebSocket, channel_filter=None) -> WebSocketClient:
+        await websocket.accept()
+        client = WebSocketClient(websocket, self.queue_size, channel_filter)
+        self.publish()
+        client.queue.put_nowait(self.client_snapshot(client))
+        self.clients[websocket] = client
+        client.sender = asyncio.create_task(self.sender(client))
+        return client
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client and client.sender:
+            client.sender.cancel()
+
 class GlobalChannelManager:
-    def __init__(self, channels_config):
-        self.channels: Dict[int, ChannelManager] = {
-            ch_conf['id']: ChannelManager(ch_conf, self) for ch_conf in channels_config if ch_conf['enabled']
-        }
-        self.active_websockets: List[WebSocket] = []
+    def __init__(self, channels_config, channel_class=None, restore_definitions=True):
+        self.channel_class = channel_class or ChannelManager
+        self.config_store = ConfigStore()
+        if self.config_store.state_db and restore_definitions:
+            channels_config = self.reconcile_definitions(channels_config)
+        # Registro de definiciones indexado por ID (incluye canales deshabilitados)
+        self.channel_configs: Dict[int, dict] = {ch_conf['id']: ch_conf for ch_conf in channels_config}
+        self.channels: Dict[int, ChannelManager] = {}
+        # Índices para consultas y suscripciones filtradas: IDs por estado y canales ordenados por nombre
+        self.status_index: Dict[str, set] = {}
+        self._name_index = None
+        self.signal_watchdog = SignalWatchdog()
+        self.history = HistoryStore(config['history_db']) if config.get('history_db') else None
+        self._process_registry = None
+        self.placement = PlacementPolicy()
+        for ch_conf in channels_config:
+            if ch_conf['enabled']:
+                self.add_channel(self.channel_class(ch_conf, self))
         self.config = config  # Añadir referencia a la configuración global
+        self.broadcaster = StatusBroadcaster(self)
+        self.config_lock = asyncio.Lock()
+        self.prober = StreamProber()
+        if self.config_store.state_db:
+            self.restore_states(self.config_store.state_db.load_states())
+        self.coordinator = None
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_websockets.append(websocket)
+    def reconcile_definitions(self, file_channels: List[dict]) -> List[dict]:
+        """Elige entre las definiciones de config.json y las de state_db comparando cuándo se guardó cada una.
+
+        Normalmente coinciden. Si no, manda la más reciente; si no se puede saber, config.json.
+        """
+        state_db = self.config_store.state_db
+        path = self.config_store.path
+        stored, saved_at = state_db.load_channels()
+        if not stored or stored == file_channels:
+            return file_channels
+        try:
+            file_mtime = os.stat(path).st_mtime
+        except OSError:
+            file_mtime = None
+        if saved_at is not None and (file_mtime is None or saved_at > file_mtime):
+            logging.warning(
+                f"Las definiciones de canales de {state_db.path} son más recientes que las de {path}: se usan "
+                f"las de la base de datos y {path} se reescribirá con ellas en el próximo guardado"
+            )
+            config['channels'] = stored
+            return stored
+        if saved_at is None:
+            logging.warning(
+                f"{path} y {state_db.path} tienen definiciones de canales distintas y no se sabe cuál es más "
+                f"reciente: se mantiene {path} y se actualiza la base de datos"
+            )
+        else:
+            logging.warning(f"{path} cambió después del último guardado en {state_db.path}: se actualiza la base de datos")
+        state_db.save_channels(file_channels)
+        return file_channels
+
+    async def connect(self, websocket: WebSocket, channel_filter=None) -> WebSocketClient:
+        return await self.broadcaster.connect(websocket, channel_filter)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_websockets.remove(websocket)
+        self.broadcaster.disconnect(websocket)
 
     async def broadcast_status(self):
-        if not self.active_websockets:
+        """Marca el estado como modificado; el broadcaster envía el delta en el próximo tick"""
+        self.broadcaster.notify()
+
+    def process_registry(self) -> ProcessRegistry:
+        if self._process_registry is None:
+            self._process_registry = ProcessRegistry(config.get('run_directory', 'run'))
+        return self._process_registry
+
+    def add_channel(self, channel):
+        self.channels[channel.id] = channel
+        self.status_index.setdefault(channel.status, set()).add(channel.id)
+        self._name_index = None
+        if self.history:
+            self.history.record_status(channel.id, channel.status)
+
+    def remove_channel(self, channel_id: int):
+        channel = self.channels.pop(channel_id)
+        self.status_index.get(channel.status, set()).discard(channel_id)
+        self.signal_watchdog.disarm(channel_id)
+        if self.history:
+            self.history.record_status(channel_id, "offline")
+        self._name_index = None
+        return channel
+
+    def status_changed(self, channel, old: str, new: str):
+        """Mantiene el índice por estado y registra la transición en el histórico"""
+        # Solo canales registrados: uno recién creado o ya eliminado no forma parte del índice
+        if old == new or self.channels.get(channel.id) is not channel:
             return
-            
-        # Obtener el estado actual de todos los canales
-        message = self.get_all_statuses()
-        
-        # Crear una lista para almacenar las tareas de envío
-        tasks = []
-        
-        # Crear una tarea de envío para cada websocket activo
-        for ws in self.active_websockets:
+        self.status_index.get(old, set()).discard(channel.id)
+        self.status_index.setdefault(new, set()).add(channel.id)
+        if self.history:
+            self.history.record_status(channel.id, new)
+
+    def name_index(self) -> list:
+        """Canales ordenados por nombre; se reconstruye solo cuando cambia la configuración"""
+        if self._name_index is None:
+            self._name_index = sorted(self.channels.values(), key=CHANNEL_SORT_KEYS["name"])
+        return self._name_index
+
+    def restore_states(self, states: Dict[int, dict]):
+        """Recupera contadores persistidos en la base de estado tras reiniciar el gestor"""
+        for channel_id, state in states.items():
+            channel = self.channels.get(channel_id)
+            if channel:
+                channel.restart_count = state.get('restart_count') or 0
+                channel.crash_count = state.get('crash_count') or 0
+                channel.last_exit_code = state.get('last_exit_code')
+
+    async def apply_config(self, new_config: dict) -> Dict[str, List[int]]:
+        """Compara la nueva configuración con los canales en marcha y aplica solo la diferencia"""
+        async with self.config_lock:
+            diff = self._apply_config(new_config)
+        # Las paradas y arranques se hacen fuera del cerrojo: pueden tardar segundos
+        return await self._run_config_actions(*diff)
+
+    async def update_channel_config(self, channel_id: int, edit) -> Dict[str, List[int]]:
+        """Edita la definición de un canal sobre la configuración en memoria y agenda su guardado.
+
+        La lectura-modificación-aplicación ocurre bajo `config_lock`, así que ediciones concurrentes
+        no se pisan entre sí.
+        """
+        async with self.config_lock:
+            current = self.channel_configs.get(channel_id)
+            ch_conf = dict(current) if current else {'id': channel_id}
+            edit(ch_conf)
+            channels = [ch_conf if ch['id'] == channel_id else ch for ch in config.get('channels', [])]
+            if current is None:
+                channels.append(ch_conf)
+            diff = self._apply_config({**config, 'channels': channels})
+        self.config_store.schedule_save()
+        return await self._run_config_actions(*diff)
+
+    def _apply_config(self, new_config: dict) -> Tuple[list, list, list]:
+        """Actualiza `config` y los canales registrados; devuelve (nuevos, eliminados, a reiniciar).
+
+        Se llama bajo `config_lock` y no espera a nada, para que el cerrojo cubra solo la
+        lectura-modificación-escritura; las acciones las ejecuta `_run_config_actions` después.
+        """
+        globals_changed = (
+            {k: v for k, v in config.items() if k != 'channels'} !=
+            {k: v for k, v in new_config.items() if k != 'channels'}
+        )
+        # Se actualiza el mismo dict para que todas las referencias a `config` lo vean
+        config.clear()
+        config.update(new_config)
+
+        new_configs = {ch_conf['id']: ch_conf for ch_conf in new_config.get('channels', [])}
+        added, removed, restart = [], [], []
+
+        for channel_id in list(self.channels):
+            ch_conf = new_configs.get(channel_id)
+            if ch_conf is None or not ch_conf.get('enabled', True):
+                removed.append(self.remove_channel(channel_id))
+
+        for channel_id, ch_conf in new_configs.items():
+            if not ch_conf.get('enabled', True):
+                continue
+            channel = self.channels.get(channel_id)
+            if channel is None:
+                channel = self.channel_class(ch_conf, self)
+                self.add_channel(channel)
+                added.append(channel)
+            elif globals_changed or ch_conf != self.channel_configs.get(channel_id):
+                if channel.update_config(ch_conf) and channel.is_running():
+                    restart.append(channel)
+        self.channel_configs = new_configs
+        self._name_index = None  # Los nombres pueden haber cambiado
+
+        if added or removed or restart:
+            logging.info(
+                f"Configuración recargada: {len(added)} nuevos, {len(removed)} eliminados, "
+                f"{len(restart)} reiniciados"
+            )
+        return added, removed, restart
+
+    async def _run_config_actions(self, added: list, removed: list, restart: list) -> Dict[str, List[int]]:
+        concurrency = config.get('bulk_concurrency', 10)
+        await self.bulk_action('stop', removed, concurrency=concurrency)
+        # Otra recarga pudo retirar el canal mientras tanto; solo se arrancan los que siguen registrados
+        registered = lambda chs: [ch for ch in chs if self.channels.get(ch.id) is ch]
+        await self.bulk_action('restart', registered(restart), concurrency=concurrency)
+        await self.bulk_action('start', registered(added), concurrency=concurrency)
+        await self.broadcast_status()
+        return {
+            "added": [ch.id for ch in added],
+            "removed": [ch.id for ch in removed],
+            "restarted": [ch.id for ch in restart]
+        }
+
+    async def watch_config(self, path: str = "config.json"):
+        """Vigila config.json (mtime) y aplica los cambios en caliente"""
+        try:
+            last_mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            last_mtime = None
+        while True:
+            await asyncio.sleep(config.get('config_watch_interval', 2.0))
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if mtime == last_mtime:
+                continue
+            last_mtime = mtime
+            # Escritura propia del ConfigStore: la configuración en memoria ya está al día
+            if mtime == self.config_store.last_written_mtime:
+                continue
+            try:
+                new_config = await asyncio.to_thread(load_config)
+            except (OSError, json.JSONDecodeError) as e:
+                logging.error(f"config.json inválido, se mantiene la configuración actual: {e}")
+                continue
             try:
-                # Crear una copia del mensaje para cada websocket
-                task = asyncio.create_task(ws.send_json(message))
-                tasks.append(task)
+                await self.apply_config(new_config)
             except Exception as e:
-                logging.error(f"Error al enviar mensaje a WebSocket: {e}")
+                logging.exception(f"Error al aplicar la nueva configuración: {e}")
                 continue
-        
-        # Esperar a que todas las tareas de envío terminen
-        if tasks:
-            done, pending = await asyncio.wait(
-                tasks,
-                timeout=5.0,  # Tiempo máximo de espera
-                return_when=asyncio.ALL_COMPLETED
-            )
-            
-            # Manejar excepciones de las tareas completadas
-            for task in done:
-                try:
-                    await task  # Esto lanzará cualquier excepción que haya ocurrido
-                except Exception as e:
-                    logging.error(f"Error en tarea de envío WebSocket: {e}")
-            
-            # Cancelar cualquier tarea pendiente
-            for task in pending:
-                task.cancel()
+            # La copia de state_db debe seguir a config.json
+            if self.config_store.state_db:
+                self.config_store.state_db.save_channels(list(config.get('channels', [])))
 
     async def start_all(self):
-        tasks = [channel.start() for channel in self.channels.values()]
-        await asyncio.gather(*tasks)
+        """Arranque escalonado: por prioridad (mayor primero), con un máximo de arranques simultáneos y
+        una pausa por hueco, en lugar de lanzar todos los ffmpeg y listeners SRT a la vez"""
+        slots = asyncio.Semaphore(config.get('startup_concurrency', 8))
+        interval = config.get('startup_interval', 0.5)
+
+        async def start(channel):
+            async with slots:
+                await channel.start()
+                # Un proceso reenganchado ya estaba en marcha: no ocupa el hueco
+                if not getattr(channel.process, 'adopted', False):
+                    await asyncio.sleep(interval)
+
+        # Los semáforos de asyncio atienden a quien espera en orden de llegada
+        ordered = sorted(self.channels.values(), key=lambda channel: -channel.channel_config.get('priority', 0))
+        await asyncio.gather(*(start(channel) for channel in ordered))
 
     async def monitor_processes(self):
+        """Detección de pérdida de señal: sin recorrido periódico, solo despierta al vencer un plazo"""
+        # Las caídas las atiende el supervisor de cada canal
+        await self.signal_watchdog.run(lambda channel: channel.signal_lost())
+
+    async def sample_resources(self):
+        """CPU, memoria, hilos y E/S de todos los ffmpeg con una sola pasada por /proc por intervalo"""
+        interval = config.get('resource_sample_interval', 5.0)
+        previous = {}  # pid -> (instante, ticks de CPU, rchar, wchar)
         while True:
-            status_changed = False
-            for channel in self.channels.values():
-                # 1. Comprobar si el proceso se ha caído (código de retorno no nulo)
-                if channel.process is None or channel.process.poll() is not None:
-                    if channel.status not in ["inactive", "crashed"]:
-                        logging.warning(f"Process for {channel.name} has CRASHED.")
-                        channel.status = "crashed"
-                        channel.last_active_timestamp = None
-                        if channel.log_file and not channel.log_file.closed:
-                            channel.log_file.close()
-                        
-                        logging.info(f"Restarting crashed channel {channel.name} in 5s...")
-                        await asyncio.sleep(5)
-                        await channel.restart() # El reinicio notificará el nuevo estado
-                        status_changed = True
-                
-                # 2. Comprobar si un stream activo se ha quedado sin señal (timeout)
-                elif channel.status == "active" and channel.last_active_timestamp:
-                    if (time.time() - channel.last_active_timestamp) > 15: # 15 segundos de timeout
-                        logging.warning(f"Stream TIMEOUT for channel {channel.name}. Reverting to LISTENING.")
-                        channel.status = "listening"
-                        channel.last_active_timestamp = None
-                        status_changed = True
+            await asyncio.sleep(interval)
+            running = {
+                channel.process.pid: channel for channel in self.channels.values()
+                if getattr(channel, 'process', None) is not None and channel.is_running()
+            }
+            if not running:
+                previous = {}
+                continue
+            stats = await asyncio.to_thread(read_proc_stats, list(running))
+            now = time.monotonic()
+            current = {}
+            for pid, (ticks, rss, threads, rchar, wchar) in stats.items():
+                channel = running[pid]
+                resources = {"rss_mb": round(rss / 1048576, 1), "threads": threads}
+                prev = previous.get(pid)
+                if prev:
+                    elapsed = now - prev[0]
+                    resources["cpu_percent"] = round((ticks - prev[1]) / CLOCK_TICKS / elapsed * 100, 1)
+                    resources["io_read_kbps"] = _rate_kbps(rchar, prev[2], elapsed)
+                    resources["io_write_kbps"] = _rate_kbps(wchar, prev[3], elapsed)
+                channel.resources = resources
+                current[pid] = (now, ticks, rchar, wchar)
+                # Hilos nuevos desde la última vez: extender el plan de ubicación a todos
+                if channel.placement and not channel.placement['failed'] and threads != channel.placed_threads:
+                    channel.placed_threads = self.placement.apply(pid, channel.placement)
+            previous = current
 
-            # Si cualquier estado cambió, notificar a todos los clientes
-            if status_changed:
-                await self.broadcast_status()
+    async def record_history(self):
+        """Guarda cada segundo la media de las métricas de los canales en marcha y agrega el histórico"""
+        interval = config.get('history_sample_interval', 1.0)
+        last_rollup = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            now = time.time()
+            samples = []
+            for channel_id, channel in self.channels.items():
+                if not channel.is_running():
+                    continue
+                means = channel.metrics.mean_since(now - interval)
+                values = tuple(means[field] for field in HistoryStore.FIELDS)
+                if not all(math.isnan(v) for v in values):
+                    samples.append((channel_id, values))
+            self.history.record_samples(now, samples)
+            if time.monotonic() - last_rollup >= config.get('history_rollup_interval', 60):
+                last_rollup = time.monotonic()
+                self.history.maintain()
 
-            await asyncio.sleep(5) # Intervalo de chequeo
+    def close_history(self):
+        if not self.history:
+            return
+        for channel_id in self.channels:
+            self.history.record_status(channel_id, "offline")
+        self.history.close()
 
     def get_all_statuses(self) -> List[Dict]:
         return [
             channel.get_state() for channel in self.channels.values()
         ]
 
+    def render_metrics(self) -> str:
+        """Formato de exposición de texto de Prometheus a partir del último valor de cada buffer"""
+        families = {field: [] for field in MetricsRing.FIELDS}
+        ts_families = {field: [] for field in TS_METRICS}
+        process_families = {field: [] for field in RESOURCE_METRICS}
+        up = []
+        for channel in self.channels.values():
+            labels = f'channel_id="{channel.id}",channel_name="{_escape_label(channel.name)}"'
+            up.append(f"srt_channel_up{{{labels}}} {1 if channel.status == 'active' else 0}")
+            if not channel.is_running():
+                continue
+            for field, value in channel.metrics.latest().items():
+                families[field].append(f"srt_channel_{field}{{{labels}}} {_format_sample(value)}")
+            resources = channel.resources
+            for field in RESOURCE_METRICS:
+                if field in resources:
+                    value = resources[field]
+                    process_families[field].append(
+                        f"srt_channel_process_{field}{{{labels}}} {_format_sample(math.nan if value is None else float(value))}"
+                    )
+            ts_stats = getattr(channel, 'ts_stats', None)
+            if ts_stats:
+                for field in TS_METRICS:
+                    value = ts_stats.get(field)
+                    ts_families[field].append(
+                        f"srt_channel_ts_{field}{{{labels}}} {_format_sample(math.nan if value is None else value)}"
+                    )
+
+        lines = ["# HELP srt_channel_up 1 si el canal está recibiendo video", "# TYPE srt_channel_up gauge", *up]
+        for field, samples in families.items():
+            lines.append(f"# HELP srt_channel_{field} Último valor de {field} reportado por ffmpeg")
+            lines.append(f"# TYPE srt_channel_{field} gauge")
+            lines.extend(samples)
+        for field, samples in ts_families.items():
+            if not samples:
+                continue
+            kind = "counter" if field.endswith("_total") else "gauge"
+            lines.append(f"# HELP srt_channel_ts_{field} {field} del analizador MPEG-TS")
+            lines.append(f"# TYPE srt_channel_ts_{field} {kind}")
+            lines.extend(samples)
+        for field, samples in process_families.items():
+            if not samples:
+                continue
+            lines.append(f"# HELP srt_channel_process_{field} {field} del proceso ffmpeg (muestreo de /proc)")
+            lines.append(f"# TYPE srt_channel_process_{field} gauge")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
     async def start_channel(self, channel_id):
         """Inicia un canal específico"""
         if channel_id in self.channels:
             channel = self.channels[channel_id]
-            if channel.process and channel.process.poll() is None:
+            if channel.is_running():
                 logging.warning(f"El canal {channel_id} ya está en ejecución")
                 return False
             
@@ -317,11 +2438,83 @@ class GlobalChannelManager:
                 return False
         return False
 
+    def ids_with_status(self, status) -> set:
+        statuses = [status] if isinstance(status, str) else status
+        return set().union(*(self.status_index.get(s, ()) for s in statuses))
+
+    def select_channels(self, ids=None, status=None, name=None) -> List[ChannelManager]:
+        """Canales por lista de IDs y/o filtro por estado y nombre (subcadena, sin mayúsculas)"""
+        if status:
+            matching = self.ids_with_status(status)
+            ids = matching if ids is None else [channel_id for channel_id in ids if channel_id in matching]
+        if ids is not None:
+            channels = [self.channels[channel_id] for channel_id in ids if channel_id in self.channels]
+        else:
+            channels = list(self.channels.values())
+        if name:
+            name = name.lower()
+            channels = [channel for channel in channels if name in channel.name.lower()]
+        return channels
+
+    def query_channels(self, status=None, q: str = None, sort: str = "name") -> List[ChannelManager]:
+        """Canales filtrados por estado y nombre (subcadena), ordenados por name, id o status (con - invierte)"""
+        key = sort.lstrip('-')
+        order = CHANNEL_SORT_KEYS[key]
+        if status:
+            # Con filtro de estado se parte del índice y solo se ordenan los canales que coinciden
+            channels = sorted((self.channels[channel_id] for channel_id in self.ids_with_status(status)), key=order)
+        elif key == "name":
+            channels = self.name_index()
+        else:
+            channels = sorted(self.channels.values(), key=order)
+        if q:
+            q = q.lower()
+            channels = [channel for channel in channels if q in channel.name.lower()]
+        return channels[::-1] if sort.startswith('-') else channels
+
+    async def bulk_action(self, action: str, channels: List[ChannelManager], concurrency: int = 10,
+                          rolling: bool = False) -> Dict[int, str]:
+        """Aplica start/stop/restart a varios canales con un máximo de `concurrency` a la vez.
+
+        En modo rolling se procesan lotes de `concurrency` canales y no se pasa al siguiente
+        lote hasta que los canales que estaban activos vuelven a recibir video (o vence
+        `rolling_timeout`).
+        """
+        results: Dict[int, str] = {}
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(channel: ChannelManager):
+            async with semaphore:
+                try:
+                    await getattr(channel, action)()
+                    results[channel.id] = "ok"
+                except Exception as e:
+                    logging.error(f"Error en '{action}' masivo para el canal {channel.id}: {e}")
+                    results[channel.id] = f"error: {e}"
+
+        if not rolling:
+            await asyncio.gather(*(run(channel) for channel in channels))
+            return results
+
+        timeout = config.get('rolling_timeout', 30.0)
+        for i in range(0, len(channels), concurrency):
+            batch = channels[i:i + concurrency]
+            was_active = [channel for channel in batch if channel.status == "active"]
+            await asyncio.gather(*(run(channel) for channel in batch))
+            deadline = time.monotonic() + timeout
+            while was_active and time.monotonic() < deadline:
+                was_active = [channel for channel in was_active if channel.status != "active"]
+                if was_active:
+                    await asyncio.sleep(0.2)
+            if was_active:
+                logging.warning(f"Rolling {action}: canales {[ch.id for ch in was_active]} sin video tras {timeout}s")
+        return results
+
     async def stop_channel(self, channel_id):
         """Detiene un canal específico"""
         if channel_id in self.channels:
             channel = self.channels[channel_id]
-            if not channel.process or channel.process.poll() is not None:
+            if not channel.is_running():
                 logging.warning(f"El canal {channel_id} no está en ejecución")
                 return True
             
@@ -333,40 +2526,601 @@ class GlobalChannelManager:
                 return False
         return False
 
+# Criterios de orden de GET /api/channels
+CHANNEL_SORT_KEYS = {
+    "name": lambda channel: (channel.name.lower(), channel.id),
+    "id": lambda channel: channel.id,
+    "status": lambda channel: (channel.status, channel.name.lower(), channel.id),
+}
+
+# Campos del informe del analizador MPEG-TS expuestos en /metrics
+TS_METRICS = ("bitrate_kbps", "null_ratio", "cc_errors_total", "pcr_jitter_ms", "pcr_interval_max_ms")
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_sample(value: float) -> str:
+    return "NaN" if math.isnan(value) else repr(value)
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))
+
+# --- Modo distribuido: coordinador y agentes ---
+# Claves que cada agente conserva de su propio config.json al recibir la configuración del coordinador
+# Opciones globales que el coordinador impone a sus agentes: las que definen cómo se monitoriza un canal.
+# El resto (comandos de ffmpeg, rutas, tokens, afinidad de CPU...) sale de la configuración local del agente
+AGENT_SHARED_KEYS = (
+    'srt_base_port', 'srt_mode', 'srt_options', 'enable_caller', 'multicast_base_ip', 'multicast_base_port',
+    'multicast_interface', 'multicast_options', 'service_id_base', 'monitor_mode', 'analyzer_interval',
+    'signal_timeout', 'signal_events_history', 'thumbnails', 'thumbnail_interval', 'thumbnail_width',
+    'thumbnail_quality', 'thumbnail_max_bytes', 'restart_backoff_base', 'restart_backoff_max',
+    'crash_loop_window', 'crash_loop_threshold', 'quarantine_retry_interval', 'stop_timeout',
+    'metrics_history_size', 'bulk_concurrency'
+)
+
+def shared_agent_config(source: dict) -> dict:
+    return {k: source[k] for k in AGENT_SHARED_KEYS if k in source}
+
+def host_capacity() -> dict:
+    """Capacidad del host que el agente informa al coordinador (CPU y memoria)"""
+    capacity = {"cpus": os.cpu_count() or 1, "load1": os.getloadavg()[0]}
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ("MemTotal", "MemAvailable"):
+                    capacity[key.lower() + "_mb"] = int(value.split()[0]) // 1024
+    except OSError:
+        pass
+    return capacity
+
+class RemoteChannel:
+    """Canal que corre en un agente, visto desde el coordinador con la misma interfaz que ChannelManager"""
+    def __init__(self, channel_config, channel_manager):
+        self.id = channel_config['id']
+        self.name = channel_config['name']
+        self.channel_config = channel_config
+        self.channel_manager = channel_manager
+        self.agent = None  # AgentSession que lo ejecuta
+        self.wanted = True  # False tras un stop: el agente lo recibe deshabilitado
+        self.state = {}
+        self._status = None
+        self.status = "unassigned"
+        self.stream_info = None
+        self.ts_stats = {}
+        self.resources = {}
+        self.metrics = MetricsRing(config.get('metrics_history_size', 600))
+
+    @property
+    def status(self) -> str:
+        return self._status
+
+    @status.setter
+    def status(self, value: str):
+        self.channel_manager.status_changed(self, self._status, value)
+        self._status = value
+
+    def weight(self) -> float:
+        return self.channel_config.get('weight', 1)
+
+    def is_running(self) -> bool:
+        return self.agent is not None and self.state.get('pid') is not None
+
+    def analyzer_mode(self) -> bool:
+        return self.channel_config.get('monitor_mode', config.get('monitor_mode', 'decode')) == 'analyzer'
+
+    def update_config(self, channel_config: dict) -> bool:
+        # El agente aplica el cambio (y reinicia si hace falta) al recibir su nueva asignación
+        self.channel_config = channel_config
+        self.name = channel_config['name']
+        if self.agent:
+            self.agent.schedule_assignment()
+        return False
+
+    def apply_report(self, state: dict):
+        metrics = state.pop('metrics', None)
+        self.stream_info = state.pop('stream_info', None)
+        self.ts_stats = state.pop('ts_stats', None) or {}
+        self.resources = state.pop('resources', None) or {}
+        self.state = state
+        self.status = state.get('status', self.status)
+        if metrics:
+            self.metrics.append(time.time(), tuple(metrics.get(field, math.nan) for field in MetricsRing.FIELDS))
+
+    def reset(self, status: str):
+        self.state = {}
+        self.status = status
+
+    async def start(self):
+        self.wanted = True
+        if self.agent:
+            self.agent.schedule_assignment()
+        else:
+            self.channel_manager.coordinator.place()
+
+    async def stop(self):
+        self.wanted = False
+        if self.agent:
+            self.agent.schedule_assignment()
+        self.reset("inactive")
+        await self.channel_manager.broadcast_status()
+
+    async def restart(self):
+        if not self.wanted or not self.agent:
+            await self.start()
+            return
+        await self.agent.send({"type": "command", "action": "restart", "id": self.id})
+
+    def get_state(self) -> dict:
+        return {
+            **self.state,
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "pid": self.state.get('pid'),
+            "agent": self.agent.agent_id if self.agent else None
+        }
+
+class AgentSession:
+    """Conexión de un agente en el coordinador: capacidad informada y canales asignados"""
+    def __init__(self, agent_id: str, coordinator):
+        self.agent_id = agent_id
+        self.coordinator = coordinator
+        self.websocket = None
+        self.connected = False
+        self.capacity = {}
+        self.channels: Dict[int, RemoteChannel] = {}
+        self.last_seen = time.time()
+        self.send_lock = asyncio.Lock()
+        self._assignment_pending = False
+        self._loss_timer = None
+        self.running = set()  # IDs de los canales que el agente informó en su último mensaje
+        self.reported = asyncio.Event()  # Se activa (y se sustituye) con cada informe
+
+    def assigned_weight(self) -> float:
+        return sum(channel.weight() for channel in self.channels.values() if channel.wanted)
+
+    def load_score(self, extra: float = 0) -> float:
+        return (self.assigned_weight() + extra) / max(1, self.capacity.get('cpus', 1))
+
+    def has_headroom(self) -> bool:
+        cpus = max(1, self.capacity.get('cpus', 1))
+        if self.capacity.get('load1', 0) / cpus > config.get('agent_max_load', 0.9):
+            return False
+        return self.capacity.get('memavailable_mb', math.inf) >= config.get('agent_min_memory_mb', 256)
+
+    async def send(self, message: dict):
+        if not self.connected:
+            return
+        try:
+            async with self.send_lock:
+                await self.websocket.send_text(json.dumps(message))
+        except Exception as e:
+            logging.warning(f"Error al enviar al agente {self.agent_id}: {e}")
+
+    def schedule_assignment(self):
+        """Agrupa los cambios de asignación del mismo tick en un único mensaje"""
+        if self._assignment_pending:
+            return
+        self._assignment_pending = True
+        asyncio.create_task(self.send_assignment())
+
+    async def send_assignment(self):
+        self._assignment_pending = False
+        channels = self.coordinator.channel_manager.channels
+        # Descartar canales que ya no existen en la configuración del coordinador
+        for channel_id, channel in list(self.channels.items()):
+            if channels.get(channel_id) is not channel:
+                del self.channels[channel_id]
+        await self.send({
+            "type": "assign",
+            "config": shared_agent_config(config),
+            "channels": [
+                {**channel.channel_config, 'enabled': channel.wanted} for channel in self.channels.values()
+            ]
+        })
+
+class Coordinator:
+    """Reparte los canales entre agentes según su capacidad y reequilibra cuando se pierde o se une uno"""
+    def __init__(self, channel_manager):
+        self.channel_manager = channel_manager
+        self.agents: Dict[str, AgentSession] = {}
+        self.moving = set()  # IDs de canales en traslado entre agentes: place() no los toca
+        self._rebalancer = None
+        if not config.get('agent_token'):
+            logging.error("Coordinador sin 'agent_token': se rechazarán todos los agentes")
+
+    def place(self):
+        """Asigna los canales sin agente al agente con más margen (primero los de mayor peso)"""
+        candidates = [agent for agent in self.agents.values() if agent.connected]
+        if not candidates:
+            return
+        unassigned = [
+            channel for channel in self.channel_manager.channels.values()
+            if channel.agent is None and channel.id not in self.moving
+        ]
+        unassigned.sort(key=lambda channel: channel.weight(), reverse=True)
+        touched = set()
+        for channel in unassigned:
+            pool = [agent for agent in candidates if agent.has_headroom()] or candidates
+            agent = min(pool, key=lambda a: a.load_score(channel.weight()))
+            self.assign(channel, agent)
+            touched.add(agent)
+        for agent in touched:
+            agent.schedule_assignment()
+        if unassigned:
+            logging.info(f"Coordinador: {len(unassigned)} canales asignados a {len(touched)} agentes")
+        self.schedule_rebalance()
+
+    def assign(self, channel: RemoteChannel, agent: AgentSession):
+        channel.agent = agent
+        channel.reset("assigned")
+        agent.channels[channel.id] = channel
+
+    def schedule_rebalance(self):
+        if self._rebalancer is None or self._rebalancer.done():
+            self._rebalancer = asyncio.create_task(self.rebalance())
+
+    async def rebalance(self):
+        """Traslada canales del agente más cargado al menos cargado mientras sus load_score difieran en más
+        de `agent_rebalance_threshold`. Cada traslado deja al destino como mucho tan cargado como el origen,
+        así que los canales no van y vienen entre dos agentes"""
+        threshold = config.get('agent_rebalance_threshold', 0.1)
+        for _ in range(config.get('agent_rebalance_max_moves', 20)):
+            agents = [agent for agent in self.agents.values() if agent.connected]
+            if len(agents) < 2:
+                return
+            source = max(agents, key=lambda a: a.load_score())
+            targets = [agent for agent in agents if agent is not source and agent.has_headroom()]
+            if not targets:
+                return
+            target = min(targets, key=lambda a: a.load_score())
+            if source.load_score() - target.load_score() <= threshold:
+                return
+            movable = [
+                channel for channel in source.channels.values()
+                if channel.wanted and target.load_score(channel.weight()) <= source.load_score(-channel.weight())
+            ]
+            if not movable:
+                return
+            await self.move(max(movable, key=lambda channel: channel.weight()), target)
+
+    async def move(self, channel: RemoteChannel, target: AgentSession):
+        """Traslado ordenado: el agente de origen detiene el canal y solo entonces se asigna al destino"""
+        source = channel.agent
+        self.moving.add(channel.id)
+        try:
+            source.channels.pop(channel.id, None)
+            channel.agent = None
+            await source.send_assignment()
+            deadline = time.monotonic() + config.get('agent_move_timeout', 10.0)
+            while source.connected and channel.id in source.running and time.monotonic() < deadline:
+                try:
+                    await asyncio.wait_for(source.reported.wait(), timeout=deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    break
+            if source.connected and channel.id in source.running:
+                logging.warning(f"El agente {source.agent_id} no confirmó la parada del canal {channel.name}")
+            # Una recarga de configuración pudo eliminar el canal mientras tanto
+            if self.channel_manager.channels.get(channel.id) is channel and channel.agent is None:
+                self.assign(channel, target)
+                target.schedule_assignment()
+                logging.info(f"Coordinador: canal {channel.name} trasladado de {source.agent_id} a {target.agent_id}")
+        finally:
+            self.moving.discard(channel.id)
+        await self.channel_manager.broadcast_status()
+
+    async def handle_agent(self, websocket: WebSocket):
+        await websocket.accept()
+        try:
+            hello = json.loads(await websocket.receive_text())
+        except (WebSocketDisconnect, json.JSONDecodeError):
+            return
+        agent_id = str(hello.get('agent_id'))
+        token = config.get('agent_token')
+        if not token or not hmac.compare_digest(str(hello.get('token', '')).encode(), token.encode()):
+            logging.warning(f"Agente {agent_id} rechazado: token inválido")
+            await websocket.close(code=1008)
+            return
+        agent = self.agents.get(agent_id)
+        if agent is not None and agent.connected:
+            logging.warning(f"Agente {agent_id} rechazado: ya hay una conexión activa con ese ID")
+            await websocket.close(code=1008)
+            return
+        if agent is None:
+            agent = AgentSession(agent_id, self)
+            self.agents[agent_id] = agent
+        elif agent._loss_timer:
+            agent._loss_timer.cancel()
+        agent.websocket = websocket
+        agent.connected = True
+        agent.capacity = hello.get('capacity', {})
+        logging.info(f"Agente {agent_id} conectado ({agent.capacity})")
+
+        # Adoptar los canales que el agente ya está ejecutando si nadie más los tiene
+        agent.running = {state.get('id') for state in hello.get('channels', [])}
+        for state in hello.get('channels', []):
+            channel = self.channel_manager.channels.get(state.get('id'))
+            if channel is None or channel.id in self.moving:
+                continue
+            if channel.agent is None or channel.agent is agent or not channel.agent.connected:
+                if channel.agent and channel.agent is not agent:
+                    channel.agent.channels.pop(channel.id, None)
+                self.assign(channel, agent)
+                channel.apply_report(state)
+        self.place()
+        agent.schedule_assignment()
+        await self.channel_manager.broadcast_status()
+
+        try:
+            while True:
+                message = json.loads(await websocket.receive_text())
+                if message.get('type') == 'report':
+                    self.apply_report(agent, message)
+        except WebSocketDisconnect:
+            logging.warning(f"Agente {agent_id} desconectado")
+        except Exception as e:
+            logging.error(f"Error en la conexión con el agente {agent_id}: {e}")
+        finally:
+            if agent.websocket is websocket:
+                agent.connected = False
+                agent._loss_timer = asyncio.create_task(self.expire_agent(agent))
+
+    def apply_report(self, agent: AgentSession, message: dict):
+        agent.last_seen = time.time()
+        agent.capacity = message.get('capacity', agent.capacity)
+        agent.running = {state.get('id') for state in message.get('channels', [])}
+        agent.reported.set()
+        agent.reported = asyncio.Event()
+        reported = set()
+        for state in message.get('channels', []):
+            channel = agent.channels.get(state.get('id'))
+            if channel:
+                channel.apply_report(state)
+                reported.add(channel.id)
+        # Canales asignados que el agente aún no ejecuta (o detenidos)
+        for channel_id, channel in agent.channels.items():
+            if channel_id not in reported and channel.state:
+                channel.reset("assigned" if channel.wanted else "inactive")
+        self.channel_manager.broadcaster.notify()
+        # La capacidad informada cambia con el tiempo: se comprueba si hace falta reequilibrar
+        self.schedule_rebalance()
+
+    async def expire_agent(self, agent: AgentSession):
+        """Tras el periodo de gracia sin reconexión, reubica los canales del agente perdido"""
+        await asyncio.sleep(config.get('agent_timeout', 10.0))
+        if agent.connected:
+            return
+        logging.error(f"Agente {agent.agent_id} perdido; reubicando {len(agent.channels)} canales")
+        for channel in agent.channels.values():
+            channel.agent = None
+            channel.reset("unassigned")
+        agent.channels.clear()
+        self.agents.pop(agent.agent_id, None)
+        self.place()
+        await self.channel_manager.broadcast_status()
+
+    def get_agents(self) -> List[dict]:
+        return [
+            {
+                "agent_id": agent.agent_id,
+                "connected": agent.connected,
+                "capacity": agent.capacity,
+                "channels": sorted(agent.channels),
+                "load_score": round(agent.load_score(), 3),
+                "last_seen": agent.last_seen
+            }
+            for agent in self.agents.values()
+        ]
+
+class AgentLink:
+    """Enlace del agente con el coordinador: recibe su asignación de canales e informa el estado"""
+    def __init__(self, channel_manager, coordinator_url: str, agent_id: str, token: str):
+        self.channel_manager = channel_manager
+        self.url = coordinator_url.rstrip('/') + "/ws/agents"
+        self.agent_id = agent_id
+        self.token = token
+        # Configuración propia del agente; el coordinador solo sustituye las AGENT_SHARED_KEYS
+        self.local_config = {k: v for k, v in config.items() if k != 'channels'}
+
+    async def run(self):
+        delay = 1.0
+        while True:
+            try:
+                async with websockets.connect(self.url) as ws:
+                    delay = 1.0
+                    await self.session(ws)
+            except Exception as e:
+                logging.warning(f"Sin conexión con el coordinador {self.url}: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    def report(self) -> dict:
+        channels = []
+        for channel in self.channel_manager.channels.values():
+            state = channel.get_state()
+            state['metrics'] = channel.metrics.latest()
+            state['stream_info'] = channel.banner.result()
+            state['ts_stats'] = channel.ts_stats
+            state['resources'] = channel.resources
+            channels.append(state)
+        return {"type": "report", "capacity": host_capacity(), "channels": channels}
+
+    async def session(self, ws):
+        hello = self.report()
+        await ws.send(json.dumps({**hello, "type": "register", "agent_id": self.agent_id, "token": self.token}))
+        logging.info(f"Agente {self.agent_id} registrado en {self.url}")
+        reporter = asyncio.create_task(self.report_loop(ws))
+        try:
+            async for raw in ws:
+                message = json.loads(raw)
+                if message.get('type') == 'assign':
+                    await self.channel_manager.apply_config({
+                        **self.local_config, **shared_agent_config(message['config']), 'channels': message['channels']
+                    })
+                elif message.get('type') == 'command':
+                    channel = self.channel_manager.channels.get(message.get('id'))
+                    if channel and message.get('action') in ('start', 'stop', 'restart'):
+                        asyncio.create_task(getattr(channel, message['action'])())
+        finally:
+            reporter.cancel()
+
+    async def report_loop(self, ws):
+        """Envía el estado en cuanto cambia, y como latido cada `agent_report_interval` segundos"""
+        interval = config.get('agent_report_interval', 2.0)
+        broadcaster = self.channel_manager.broadcaster
+        while True:
+            try:
+                await asyncio.wait_for(broadcaster.published.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            await ws.send(json.dumps(self.report()))
+
 # --- Almacén de Estado Global ---
-channel_manager = GlobalChannelManager(config.get("channels", []))
+if MODE == "coordinator":
+    channel_manager = GlobalChannelManager(config.get("channels", []), channel_class=RemoteChannel)
+    channel_manager.coordinator = Coordinator(channel_manager)
+elif MODE == "agent":
+    # El agente arranca sin canales: los recibe del coordinador
+    channel_manager = GlobalChannelManager([], restore_definitions=False)
+else:
+    channel_manager = GlobalChannelManager(config.get("channels", []))
+
+profiler = SamplingProfiler()
 
 # --- Tarea de Monitoreo en Segundo Plano ---
 async def monitor_channels():
+    # La pérdida de señal se vigila ya durante el arranque escalonado
+    watchdog = asyncio.create_task(channel_manager.monitor_processes())
     await channel_manager.start_all()
-    # Da un momento para que los procesos se inicien antes de empezar a monitorear
-    await asyncio.sleep(1)
-    await channel_manager.monitor_processes()
+    await watchdog
 
 # --- Aplicación FastAPI ---
 app = FastAPI()
 
 # Gestionar ciclo de vida de la aplicación
+def install_child_watcher():
+    """En Python < 3.12 usa pidfd para esperar a los hijos en lugar de un hilo por proceso"""
+    if sys.version_info >= (3, 12) or not hasattr(os, "pidfd_open"):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        return  # Kernel sin soporte de pidfd (< 5.3)
+    watcher = asyncio.PidfdChildWatcher()
+    watcher.attach_loop(asyncio.get_running_loop())
+    asyncio.set_child_watcher(watcher)
+
 @app.on_event("startup")
 async def startup_event():
-    # Iniciar la tarea de monitoreo
-    asyncio.create_task(monitor_channels())
+    install_child_watcher()
+    # Iniciar la difusión de estado y la tarea de monitoreo
+    asyncio.create_task(channel_manager.broadcaster.run())
+    asyncio.create_task(hot_path_stats.watch_loop_lag())
+    if channel_manager.history:
+        asyncio.create_task(channel_manager.record_history())
+    if MODE != "coordinator":
+        asyncio.create_task(channel_manager.sample_resources())
+    if MODE == "agent":
+        agent_id = os.environ.get("FFPROBE_AGENT_ID", f"{os.uname().nodename}:{os.getpid()}")
+        coordinator_url = os.environ.get("FFPROBE_COORDINATOR_URL", config.get("coordinator_url"))
+        if not coordinator_url:
+            raise RuntimeError("El modo agent requiere FFPROBE_COORDINATOR_URL o 'coordinator_url'")
+        agent_token = os.environ.get("FFPROBE_AGENT_TOKEN", config.get("agent_token"))
+        if not agent_token:
+            raise RuntimeError("El modo agent requiere FFPROBE_AGENT_TOKEN o 'agent_token'")
+        asyncio.create_task(AgentLink(channel_manager, coordinator_url, agent_id, agent_token).run())
+        asyncio.create_task(channel_manager.monitor_processes())
+        return
+    asyncio.create_task(channel_manager.watch_config())
+    if MODE != "coordinator":
+        asyncio.create_task(monitor_channels())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Volcar ediciones de configuración pendientes antes de salir
+    await channel_manager.config_store.close()
+    channel_manager.close_history()
+    # Volcar los logs de los canales: un gestor que se reengancha a sus procesos continúa esos archivos
+    for channel in channel_manager.channels.values():
+        if getattr(channel, 'log_file', None):
+            channel.log_file.close()
+
+@app.websocket("/ws/agents")
+async def agents_endpoint(websocket: WebSocket):
+    if not channel_manager.coordinator:
+        await websocket.close(code=1008)
+        return
+    await channel_manager.coordinator.handle_agent(websocket)
+
+@app.get("/api/agents")
+async def list_agents():
+    if not channel_manager.coordinator:
+        raise HTTPException(status_code=404, detail="Este nodo no es un coordinador")
+    return channel_manager.coordinator.get_agents()
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await channel_manager.connect(websocket)
+    # /ws?status=crashed,quarantined&q=texto se suscribe solo a los canales que coinciden
+    channel_filter = StatusBroadcaster.make_filter(
+        websocket.query_params.get('status'), websocket.query_params.get('q')
+    )
+    client = await channel_manager.connect(websocket, channel_filter)
     try:
-        # Enviar el estado actual SOLO a este cliente
-        await websocket.send_json(channel_manager.get_all_statuses())
-
-        # Mantener la conexión viva para que el servidor pueda enviar actualizaciones.
-        # El cliente no envía datos, solo recibe, así que no usamos receive_text().
+        # El envío lo hace el broadcaster; aquí solo se esperan mensajes del cliente,
+        # lo que además detecta la desconexión en cuanto ocurre.
         while True:
-            await asyncio.sleep(1) # Previene que la función termine y cierre la conexión.
+            message = await websocket.receive_text()
+            try:
+                request = json.loads(message)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(request, dict):
+                continue
+            if request.get("type") == "resync":
+                channel_manager.broadcaster.resync(client)
+            elif request.get("type") == "subscribe":
+                channel_manager.broadcaster.subscribe(client, request.get("status"), request.get("q"))
     except WebSocketDisconnect:
         logging.info(f"Cliente {websocket.client} desconectado.")
+    finally:
         channel_manager.disconnect(websocket)
 
+@app.websocket("/ws/logs/{channel_id}")
+async def logs_websocket(websocket: WebSocket, channel_id: int):
+    channel = channel_manager.channels.get(channel_id)
+    if not channel or not hasattr(channel, 'log_tail'):
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    tail = _to_int(websocket.query_params.get('tail', 100))
+    backlog = list(channel.log_tail)[-tail:] if tail > 0 else []
+    queue: asyncio.Queue = asyncio.Queue(maxsize=config.get('log_ws_queue_size', 1000))
+    channel.log_subscribers.add(queue)
+
+    async def sender():
+        if backlog:
+            await websocket.send_text("\n".join(backlog))
+        while True:
+            # Enviar de una vez todas las líneas acumuladas
+            lines = [await queue.get()]
+            while not queue.empty():
+                lines.append(queue.get_nowait())
+            await websocket.send_text("\n".join(lines))
+
+    task = asyncio.create_task(sender())
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        task.cancel()
+        channel.log_subscribers.discard(queue)
+
 @app.post("/api/restart/{channel_id}")
 async def restart_channel(channel_id: int):
     channel = channel_manager.channels.get(channel_id)
@@ -406,26 +3160,285 @@ async def stop_channel(channel_id: int):
         logging.error(f"Error al detener el canal {channel_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/channels")
+async def list_channels(status: str = None, q: str = None, page: int = 1, page_size: int = 50, sort: str = "name"):
+    if sort.lstrip('-') not in CHANNEL_SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"'sort' debe ser uno de {', '.join(CHANNEL_SORT_KEYS)}")
+    max_page_size = config.get('api_max_page_size', 500)
+    if page < 1 or not 1 <= page_size <= max_page_size:
+        raise HTTPException(status_code=400, detail=f"'page' >= 1 y 'page_size' entre 1 y {max_page_size}")
+
+    statuses = [s.strip() for s in status.split(',') if s.strip()] if status else None
+    channels = channel_manager.query_channels(status=statuses, q=q, sort=sort)
+    start = (page - 1) * page_size
+    return {
+        "version": channel_manager.broadcaster.version,
+        "total": len(channels),
+        "page": page,
+        "page_size": page_size,
+        "pages": max(1, math.ceil(len(channels) / page_size)),
+        "channels": [channel.get_state() for channel in channels[start:start + page_size]]
+    }
+
+@app.get("/api/channels/{channel_id}/metrics")
+async def channel_metrics(channel_id: int, window: float = 60.0):
+    channel = channel_manager.channels.get(channel_id)
+    if not channel:
+        raise HTTPException(status_code=404, detail=f"Canal {channel_id} no encontrado")
+    if window <= 0:
+        raise HTTPException(status_code=400, detail="El parámetro 'window' debe ser mayor que 0")
+
+    return {
+        "id": channel.id,
+        "name": channel.name,
+        "window": window,
+        "samples": channel.metrics.window(window),
+        "resources": channel.resources if channel.is_running() else None
+    }
+
+@app.get("/api/resources")
+async def list_resources():
+    """Último muestreo de /proc de cada canal en marcha (no viaja en los deltas de estado)"""
+    return {
+        "interval": config.get('resource_sample_interval', 5.0),
+        "channels": [
+            {"id": channel.id, "name": channel.name, "resources": channel.resources}
+            for channel in channel_manager.channels.values() if channel.is_running()
+        ]
+    }
+
+@app.get("/api/channels/{channel_id}/probe")
+async def probe_channel(channel_id: int, refresh: bool = False):
+    channel = channel_manager.channels.get(channel_id)
+    if not channel:
+        raise HTTPException(status_code=404, detail=f"Canal {channel_id} no encontrado")
+
+    try:
+        info = await channel_manager.prober.probe(channel, refresh=refresh)
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except (TimeoutError, RuntimeError, ValueError, OSError) as e:
+        logging.error(f"Error al analizar el canal {channel_id}: {e}")
+        raise HTTPException(status_code=502, detail=str(e))
+    return {"id": channel.id, "name": channel.name, **info}
+
+@app.get("/api/channels/{channel_id}/analyzer")
+async def channel_analyzer(channel_id: int):
+    channel = channel_manager.channels.get(channel_id)
+    if not channel:
+        raise HTTPException(status_code=404, detail=f"Canal {channel_id} no encontrado")
+    if not channel.analyzer_mode():
+        raise HTTPException(status_code=409, detail="El canal no está en modo analyzer")
+
+    return {"id": channel.id, "name": channel.name, **channel.ts_stats}
+
+@app.get("/api/channels/{channel_id}/history")
+async def channel_history(channel_id: int, start: float = Query(None, alias="from"),
+                          end: float = Query(None, alias="to"), resolution: str = "auto"):
+    history = channel_manager.history
+    if not history:
+        raise HTTPException(status_code=404, detail="Histórico deshabilitado (configure 'history_db')")
+    channel = channel_manager.channels.get(channel_id)
+    if not channel and channel_id not in channel_manager.channel_configs:
+        raise HTTPException(status_code=404, detail=f"Canal {channel_id} no encontrado")
+
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - 3600
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' debe ser anterior a 'to'")
+    if resolution == "auto":
+        resolution = history.pick_resolution(start, end, config.get('history_max_points', 1000))
+    elif resolution not in HistoryStore.RESOLUTIONS:
+        raise HTTPException(
+            status_code=400, detail=f"'resolution' debe ser auto o una de {', '.join(HistoryStore.RESOLUTIONS)}"
+        )
+
+    result = await history.query(channel_id, start, end, resolution)
+    return {"id": channel_id, "from": start, "to": end, "resolution": resolution, **result}
+
+@app.get("/api/channels/{channel_id}/signal")
+async def channel_signal(channel_id: int):
+    channel = channel_manager.channels.get(channel_id)
+    if not channel:
+        raise HTTPException(status_code=404, detail=f"Canal {channel_id} no encontrado")
+    if not hasattr(channel, 'signal_events'):
+        raise HTTPException(status_code=409, detail="Las transiciones de señal se registran en el agente del canal")
+
+    return {
+        "id": channel.id,
+        "name": channel.name,
+        "status": channel.status,
+        "signal_timeout": channel.signal_timeout(),
+        "signal_lost_at": channel.signal_lost_at,
+        "last_active_at": channel.last_active_timestamp,
+        "events": list(channel.signal_events)
+    }
+
+@app.get("/api/status")
+async def status_snapshot(wait_version: int = None, timeout: float = None,
+                          if_none_match: str = Header(None), accept_encoding: str = Header(None)):
+    """Snapshot versionado del estado de todos los canales para consumidores sin WebSocket.
+
+    Responde 304 si el ETag no cambió; con `wait_version` espera (long-poll) a una versión posterior.
+    """
+    broadcaster = channel_manager.broadcaster
+    if wait_version is not None:
+        max_wait = config.get('status_max_wait', 60.0)
+        await broadcaster.wait_version(wait_version, min(timeout if timeout is not None else max_wait, max_wait))
+
+    compressed = bool(accept_encoding) and "gzip" in accept_encoding
+    etag, version, body = broadcaster.http_snapshot(compressed)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+        "X-Status-Version": str(version),
+        "X-Status-Epoch": broadcaster.epoch
+    }
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    if compressed:
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/api/channels/{channel_id}/thumbnail")
+async def channel_thumbnail(channel_id: int, if_none_match: str = Header(None)):
+    channel = channel_manager.channels.get(channel_id)
+    if not channel:
+        raise HTTPException(status_code=404, detail=f"Canal {channel_id} no encontrado")
+    if not hasattr(channel, 'thumbnail'):
+        raise HTTPException(status_code=409, detail="Las miniaturas del canal están en su agente")
+    thumbnail = channel.thumbnail
+    if not thumbnail:
+        raise HTTPException(status_code=404, detail="El canal aún no tiene miniatura")
+
+    headers = {"ETag": thumbnail['etag'], "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, thumbnail['etag']):
+        return Response(status_code=304, headers=headers)
+    return Response(content=thumbnail['jpeg'], media_type="image/jpeg", headers=headers)
+
+@app.get("/api/thumbnails")
+async def list_thumbnails():
+    """ETag de la miniatura de cada canal, para que el panel descargue solo las que cambiaron"""
+    return {
+        "interval": config.get('thumbnail_interval', 10),
+        "channels": [
+            {
+                "id": channel.id,
+                "name": channel.name,
+                "status": channel.status,
+                "etag": channel.thumbnail['etag'] if channel.thumbnail else None,
+                "updated_at": channel.thumbnail['updated_at'] if channel.thumbnail else None
+            }
+            for channel in channel_manager.channels.values() if hasattr(channel, 'thumbnail')
+        ]
+    }
+
+@app.get("/api/channels/{channel_id}/logs")
+async def channel_logs(channel_id: int, tail: int = 100):
+    channel = channel_manager.channels.get(channel_id)
+    if not channel:
+        raise HTTPException(status_code=404, detail=f"Canal {channel_id} no encontrado")
+    if not hasattr(channel, 'log_tail'):
+        raise HTTPException(status_code=409, detail="Los logs del canal están en su agente")
+
+    lines = list(channel.log_tail)
+    return {"id": channel.id, "name": channel.name, "lines": lines[-tail:] if tail > 0 else []}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(channel_manager.render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/debug/stats")
+async def debug_stats(reset: bool = False):
+    stats = hot_path_stats.summary()
+    stats["first_frame_ms"] = {
+        channel.id: round(channel.first_frame_latency * 1000, 1)
+        for channel in channel_manager.channels.values()
+        if getattr(channel, 'first_frame_latency', None) is not None
+    }
+    stats["channels"] = len(channel_manager.channels)
+    stats["websocket_clients"] = len(channel_manager.broadcaster.clients)
+    if reset:
+        hot_path_stats.reset()
+    return stats
+
+@app.post("/api/debug/profile", response_class=PlainTextResponse)
+async def debug_profile(seconds: float = 10.0, interval: float = 0.005, x_admin_token: str = Header(None)):
+    """Perfil de muestreo del servidor en vivo en formato de pilas colapsadas (flamegraph.pl, speedscope)"""
+    token = config.get('admin_token')
+    if token and x_admin_token != token:
+        raise HTTPException(status_code=403, detail="Token de administración inválido")
+    max_seconds = config.get('profile_max_seconds', 60.0)
+    if not 0 < seconds <= max_seconds:
+        raise HTTPException(status_code=400, detail=f"'seconds' debe estar entre 0 y {max_seconds}")
+    if not 0.001 <= interval <= 1:
+        raise HTTPException(status_code=400, detail="'interval' debe estar entre 0.001 y 1")
+
+    try:
+        profile = await asyncio.to_thread(profiler.sample, seconds, interval)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(profile)
+
+@app.post("/api/channels/bulk")
+async def bulk_channels(request_data: dict):
+    action = request_data.get('action')
+    if action not in ('start', 'stop', 'restart'):
+        raise HTTPException(status_code=400, detail="La acción debe ser 'start', 'stop' o 'restart'")
+
+    ids = request_data.get('ids')
+    channel_filter = request_data.get('filter') or {}
+    if ids is None and not channel_filter:
+        raise HTTPException(status_code=400, detail="Se requiere 'ids' o 'filter'")
+    if ids is not None and (
+            not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+        raise HTTPException(status_code=400, detail="'ids' debe ser una lista de enteros")
+    if not isinstance(channel_filter, dict):
+        raise HTTPException(status_code=400, detail="'filter' debe ser un objeto con 'status' y/o 'name'")
+    status = channel_filter.get('status')
+    if status is not None and not isinstance(status, str) and not (
+            isinstance(status, list) and all(isinstance(s, str) for s in status)):
+        raise HTTPException(status_code=400, detail="'filter.status' debe ser un texto o una lista de textos")
+    if channel_filter.get('name') is not None and not isinstance(channel_filter['name'], str):
+        raise HTTPException(status_code=400, detail="'filter.name' debe ser un texto")
+
+    concurrency = request_data.get('concurrency', config.get('bulk_concurrency', 10))
+    if not isinstance(concurrency, int) or concurrency < 1:
+        raise HTTPException(status_code=400, detail="'concurrency' debe ser un entero mayor que 0")
+
+    channels = channel_manager.select_channels(
+        ids=ids,
+        status=channel_filter.get('status'),
+        name=channel_filter.get('name')
+    )
+    started = time.monotonic()
+    results = await channel_manager.bulk_action(
+        action, channels, concurrency=concurrency, rolling=bool(request_data.get('rolling', False))
+    )
+    return {
+        "status": "success",
+        "action": action,
+        "elapsed": round(time.monotonic() - started, 3),
+        "results": results
+    }
+
 # --- Funciones de utilidad ---
 def save_channels_to_config():
-    """Guarda la configuración actual de los canales en el archivo config.json"""
-    with open("config.json", "r") as f:
-        current_config = json.load(f)
-    
-    # Actualizar la lista de canales en la configuración
-    current_config["channels"] = [
+    """Agenda el guardado de los canales actuales en config.json (asíncrono, agrupado y atómico)"""
+    config["channels"] = [
+        channel_manager.channel_configs.get(ch.id) or
         {"id": ch.id, "name": ch.name, "enabled": True, "srt_port": ch.id + config['srt_base_port'] - 1}
         for ch in channel_manager.channels.values()
     ]
-    
-    # Mantener otros campos de configuración
-    with open("config.json", "w") as f:
-        json.dump(current_config, f, indent=2)
+    channel_manager.config_store.schedule_save()
 
 @app.put("/api/channels/{channel_id}")
 async def update_channel(channel_id: int, channel_data: dict):
-    global config  # Mover la declaración global al inicio de la función
     try:
+        if MODE == "agent":
+            raise HTTPException(status_code=409, detail="Los canales se configuran en el coordinador")
+
         # Verificar si el canal existe
         channel = channel_manager.channels.get(channel_id)
         if not channel:
@@ -444,67 +3457,38 @@ async def update_channel(channel_id: int, channel_data: dict):
                     detail="Se requieren 'remote_ip' y 'remote_port' para el modo caller"
                 )
         
-        # Actualizar la configuración del canal
-        channel.name = channel_data.get('name', channel.name)
-        
-        # Actualizar el archivo de configuración
-        with open("config.json", "r") as f:
-            config_data = json.load(f)
-        
-        # Buscar y actualizar el canal en la configuración
-        channel_updated = False
-        for ch in config_data.get('channels', []):
-            if ch['id'] == channel_id:
+        def edit(ch):
+            if 'name' not in ch:
+                # Si no existe, agregar el canal a la configuración
                 ch.update({
-                    'name': channel_data.get('name', ch.get('name', '')),
-                    'mode': mode
+                    'name': f'Canal {channel_id}',
+                    'enabled': True,
+                    'srt_port': config['srt_base_port'] + channel_id - 1
                 })
-                
-                # Actualizar o eliminar campos según el modo
-                if mode == 'caller':
-                    ch['remote_ip'] = channel_data['remote_ip']
-                    ch['remote_port'] = channel_data['remote_port']
-                else:
-                    ch.pop('remote_ip', None)
-                    ch.pop('remote_port', None)
-                
-                channel_updated = True
-                break
-        
-        if not channel_updated:
-            # Si no existe, agregar el canal a la configuración
-            new_channel = {
-                'id': channel_id,
-                'name': channel_data.get('name', f'Canal {channel_id}'),
-                'enabled': True,
-                'mode': mode,
-                'srt_port': config['srt_base_port'] + channel_id - 1
-            }
+            ch.update({
+                'name': channel_data.get('name', ch['name']),
+                'mode': mode
+            })
+            
+            # Actualizar o eliminar campos según el modo
             if mode == 'caller':
-                new_channel.update({
-                    'remote_ip': channel_data['remote_ip'],
-                    'remote_port': channel_data['remote_port']
-                })
-            config_data['channels'].append(new_channel)
-        
-        # Guardar la configuración actualizada
-        with open("config.json", "w") as f:
-            json.dump(config_data, f, indent=2)
-        
-        # Recargar la configuración en el ChannelManager
-        config = load_config()
+                ch['remote_ip'] = channel_data['remote_ip']
+                ch['remote_port'] = channel_data['remote_port']
+            else:
+                ch.pop('remote_ip', None)
+                ch.pop('remote_port', None)
         
-        # Reiniciar el canal para aplicar los cambios
-        await channel_manager.stop_channel(channel_id)
-        await channel_manager.start_channel(channel_id)
+        # Aplicar sobre la configuración en memoria (solo se reinicia el canal si su comando cambió);
+        # el guardado en disco se hace en segundo plano
+        await channel_manager.update_channel_config(channel_id, edit)
         
         return {
             "status": "success", 
             "message": f"Canal {channel_id} actualizado correctamente"
         }
         
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Formato de datos inválido")
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error al actualizar el canal {channel_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
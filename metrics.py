@@ -0,0 +1,271 @@
+"""Estructuras de métricas sin dependencias del gestor: series temporales y análisis de MPEG-TS.
+
+No leen la configuración global, así que pueden importarse sin arrancar la aplicación.
+"""
+import math
+import time
+from array import array
+from typing import Dict
+
+try:
+    import numpy as np
+except ImportError:  # Opcional: el analizador MPEG-TS recorre columnas de bytes si no está disponible
+    np = None
+
+# --- Series temporales de métricas ---
+class MetricsRing:
+    """Buffer circular de tamaño fijo: un array de floats por métrica, sin objetos por muestra"""
+    FIELDS = ("fps", "bitrate_kbps", "speed", "drop_frames", "dup_frames", "out_time_seconds")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.count = 0  # Total de muestras escritas (la posición es count % size)
+        self.timestamps = array('d', bytes(8 * size))
+        self.columns = {field: array('d', bytes(8 * size)) for field in self.FIELDS}
+
+    def append(self, timestamp: float, values: tuple):
+        idx = self.count % self.size
+        self.timestamps[idx] = timestamp
+        for field, value in zip(self.FIELDS, values):
+            self.columns[field][idx] = value
+        self.count += 1
+
+    def latest(self) -> Dict[str, float]:
+        if not self.count:
+            return {}
+        idx = (self.count - 1) % self.size
+        return {field: column[idx] for field, column in self.columns.items()}
+
+    def mean_since(self, since: float) -> Dict[str, float]:
+        """Media de cada métrica en las muestras posteriores a `since` (NaN si no hay ninguna)"""
+        sums = [0.0] * len(self.FIELDS)
+        counts = [0] * len(self.FIELDS)
+        columns = list(self.columns.values())
+        for i in range(1, min(self.count, self.size) + 1):
+            idx = (self.count - i) % self.size
+            if self.timestamps[idx] < since:
+                break
+            for k, column in enumerate(columns):
+                value = column[idx]
+                if not math.isnan(value):
+                    sums[k] += value
+                    counts[k] += 1
+        return {field: total / n if n else math.nan for field, total, n in zip(self.FIELDS, sums, counts)}
+
+    def window(self, seconds: float) -> Dict[str, list]:
+        """Devuelve las muestras de los últimos `seconds` segundos, de la más antigua a la más reciente"""
+        since = time.time() - seconds
+        n = min(self.count, self.size)
+        indexes = []
+        for i in range(1, n + 1):
+            idx = (self.count - i) % self.size
+            if self.timestamps[idx] < since:
+                break
+            indexes.append(idx)
+        indexes.reverse()
+        series = {"timestamp": [self.timestamps[i] for i in indexes]}
+        for field, column in self.columns.items():
+            series[field] = [None if math.isnan(column[i]) else column[i] for i in indexes]
+        return series
+
+# --- Análisis de MPEG-TS ---
+class TSAnalyzer:
+    """Analizador ligero de MPEG-TS: mide el transport stream por paquetes de 188 bytes, sin decodificar.
+
+    Por ventana calcula el bitrate por PID, los errores de continuity counter, el jitter y el intervalo
+    máximo de PCR y la proporción de paquetes nulos. El jitter compara el avance del PCR con la hora de
+    llegada de cada lectura, así que incluye la granularidad con la que llegan los datos por el pipe.
+    Las lecturas grandes se procesan con NumPy como una matriz (n, 188); las pequeñas (lo habitual en un
+    pipe a ritmo real) y todas si NumPy no está instalado, recorriendo columnas de bytes.
+    """
+    PACKET_SIZE = 188
+    SYNC_BYTE = 0x47
+    NULL_PID = 0x1FFF
+    PCR_HZ = 27_000_000
+    PCR_WRAP = (1 << 33) * 300
+    PCR_MAX_INTERVAL = 0.04  # TR 101 290: el PCR debe repetirse al menos cada 40 ms
+    NUMPY_MIN_PACKETS = 160  # Por debajo, el coste fijo de NumPy supera al del bucle
+
+    def __init__(self, use_numpy: bool = True):
+        self.use_numpy = use_numpy and np is not None
+        self.buffer = bytearray()
+        self.continuity: Dict[int, int] = {}  # Último continuity counter por PID
+        self.pcr_pid = None
+        self.last_pcr = None
+        self.pcr_elapsed = 0.0  # Segundos de PCR acumulados desde el primero
+        self.cc_errors_total = 0
+        self.sync_losses = 0
+        self.packets_total = 0
+        self.reset_window(None)
+
+    def reset_window(self, now):
+        self.window_started = now
+        self.pid_packets: Dict[int, int] = {}
+        self.pid_cc_errors: Dict[int, int] = {}
+        self.pcr_offsets = None  # (mínimo, máximo) de llegada - PCR en la ventana
+        self.pcr_interval_max = 0.0
+        self.pcr_repetition_errors = 0
+        self.pcr_advanced = False
+
+    def feed(self, data: bytes, now: float):
+        if self.window_started is None:
+            self.window_started = now
+        buffer = self.buffer
+        buffer += data
+        size = self.PACKET_SIZE
+        start = 0
+        while len(buffer) - start >= size:
+            if buffer[start] != self.SYNC_BYTE:
+                start = self.resync(buffer, start)
+                continue
+            n = (len(buffer) - start) // size
+            syncs = buffer[start:start + n * size:size]
+            if syncs.count(self.SYNC_BYTE) != n:
+                # Procesar hasta el primer paquete desalineado y resincronizar desde ahí
+                n = next(i for i, byte in enumerate(syncs) if byte != self.SYNC_BYTE)
+            end = start + n * size
+            packets = bytes(buffer[start:end])
+            if self.use_numpy and n >= self.NUMPY_MIN_PACKETS:
+                pcr_rows = self.scan_numpy(packets, n)
+            else:
+                pcr_rows = self.scan_bytes(packets, n)
+            self.read_pcrs(packets, pcr_rows, now)
+            self.packets_total += n
+            start = end
+        del buffer[:start]
+
+    def resync(self, buffer: bytearray, start: int) -> int:
+        """Busca el siguiente byte 0x47 seguido de otro a 188 bytes; devuelve su posición"""
+        self.sync_losses += 1
+        size = self.PACKET_SIZE
+        idx = buffer.find(self.SYNC_BYTE, start + 1)
+        while idx != -1 and idx + size < len(buffer) and buffer[idx + size] != self.SYNC_BYTE:
+            idx = buffer.find(self.SYNC_BYTE, idx + 1)
+        return len(buffer) if idx == -1 else idx
+
+    def count_cc_error(self, pid: int):
+        self.pid_cc_errors[pid] = self.pid_cc_errors.get(pid, 0) + 1
+        self.cc_errors_total += 1
+
+    def scan_numpy(self, packets: bytes, n: int) -> list:
+        rows = np.frombuffer(packets, dtype=np.uint8).reshape(n, self.PACKET_SIZE)
+        pids = ((rows[:, 1].astype(np.uint16) & 0x1F) << 8) | rows[:, 2]
+        flags = rows[:, 3]
+        has_adaptation = ((flags & 0x20) != 0) & (rows[:, 4] > 0)
+        discontinuity = has_adaptation & ((rows[:, 5] & 0x80) != 0)
+
+        unique, counts = np.unique(pids, return_counts=True)
+        for pid, count in zip(unique.tolist(), counts.tolist()):
+            self.pid_packets[pid] = self.pid_packets.get(pid, 0) + count
+
+        # Continuity counter: solo paquetes con payload; agrupados por PID conservando el orden
+        checked = np.flatnonzero(((flags & 0x10) != 0) & (pids != self.NULL_PID))
+        if len(checked):
+            order = checked[np.argsort(pids[checked], kind='stable')]
+            group_pids = pids[order]
+            cc = flags[order] & 0x0F
+            reset = discontinuity[order]
+            same = group_pids[1:] == group_pids[:-1]
+            errors = same & (cc[1:] != ((cc[:-1] + 1) & 0x0F)) & (cc[1:] != cc[:-1]) & ~reset[1:]
+            for pid in group_pids[1:][errors].tolist():
+                self.count_cc_error(pid)
+            # Primer paquete de cada PID contra el último de la lectura anterior
+            starts = np.flatnonzero(np.concatenate(([True], ~same)))
+            ends = np.concatenate((starts[1:], [len(order)])) - 1
+            for first, last in zip(starts.tolist(), ends.tolist()):
+                pid = int(group_pids[first])
+                prev = self.continuity.get(pid)
+                value = int(cc[first])
+                if prev is not None and not reset[first] and value not in (prev, (prev + 1) & 0x0F):
+                    self.count_cc_error(pid)
+                self.continuity[pid] = int(cc[last])
+
+        return np.flatnonzero(has_adaptation & (rows[:, 4] >= 7) & ((rows[:, 5] & 0x10) != 0)).tolist()
+
+    def scan_bytes(self, packets: bytes, n: int) -> list:
+        size = self.PACKET_SIZE
+        pid_high, pid_low, flags = packets[1::size], packets[2::size], packets[3::size]
+        adaptation_length, adaptation_flags = packets[4::size], packets[5::size]
+        pid_packets = self.pid_packets
+        continuity = self.continuity
+        pcr_rows = []
+        for i in range(n):
+            pid = (pid_high[i] & 0x1F) << 8 | pid_low[i]
+            pid_packets[pid] = pid_packets.get(pid, 0) + 1
+            if pid == self.NULL_PID:
+                continue
+            flag = flags[i]
+            has_adaptation = flag & 0x20 and adaptation_length[i] > 0
+            if has_adaptation and adaptation_flags[i] & 0x10 and adaptation_length[i] >= 7:
+                pcr_rows.append(i)
+            if flag & 0x10:
+                cc = flag & 0x0F
+                prev = continuity.get(pid)
+                if (prev is not None and cc != prev and cc != (prev + 1) & 0x0F
+                        and not (has_adaptation and adaptation_flags[i] & 0x80)):
+                    self.count_cc_error(pid)
+                continuity[pid] = cc
+        return pcr_rows
+
+    def read_pcrs(self, packets: bytes, rows: list, now: float):
+        size = self.PACKET_SIZE
+        for row in rows:
+            offset = row * size
+            pid = (packets[offset + 1] & 0x1F) << 8 | packets[offset + 2]
+            if self.pcr_pid is None:
+                self.pcr_pid = pid
+            if pid != self.pcr_pid:
+                continue
+            b = packets[offset + 6:offset + 12]
+            base = b[0] << 25 | b[1] << 17 | b[2] << 9 | b[3] << 1 | b[4] >> 7
+            self.observe_pcr(base * 300 + ((b[4] & 0x01) << 8 | b[5]), now)
+
+    def observe_pcr(self, pcr: int, now: float):
+        if self.last_pcr is not None:
+            delta = ((pcr - self.last_pcr) % self.PCR_WRAP) / self.PCR_HZ
+            if delta > 1.0:
+                # Discontinuidad de PCR (reinicio del emisor): el desfase cambia, no es jitter
+                self.pcr_offsets = None
+            else:
+                self.pcr_elapsed += delta
+                self.pcr_advanced = self.pcr_advanced or delta > 0
+                self.pcr_interval_max = max(self.pcr_interval_max, delta)
+                if delta > self.PCR_MAX_INTERVAL:
+                    self.pcr_repetition_errors += 1
+        self.last_pcr = pcr
+        offset = now - self.pcr_elapsed
+        if self.pcr_offsets is None:
+            self.pcr_offsets = (offset, offset)
+        else:
+            low, high = self.pcr_offsets
+            self.pcr_offsets = (min(low, offset), max(high, offset))
+
+    def report(self, now: float) -> dict:
+        """Resumen de la ventana transcurrida desde el último informe; abre una ventana nueva"""
+        elapsed = max(now - (self.window_started or now), 1e-6)
+        kbps = lambda packets: round(packets * self.PACKET_SIZE * 8 / elapsed / 1000, 1)
+        total = sum(self.pid_packets.values())
+        null = self.pid_packets.get(self.NULL_PID, 0)
+        report = {
+            "timestamp": time.time(),
+            "window": round(elapsed, 3),
+            "packets": total,
+            "bitrate_kbps": kbps(total),
+            "null_ratio": round(null / total, 4) if total else None,
+            "cc_errors": sum(self.pid_cc_errors.values()),
+            "cc_errors_total": self.cc_errors_total,
+            "sync_losses": self.sync_losses,
+            "pcr_pid": self.pcr_pid,
+            "pcr_jitter_ms": round((self.pcr_offsets[1] - self.pcr_offsets[0]) * 1000, 3) if self.pcr_offsets else None,
+            "pcr_interval_max_ms": round(self.pcr_interval_max * 1000, 3) if self.pcr_advanced else None,
+            "pcr_repetition_errors": self.pcr_repetition_errors,
+            "pcr_seconds": round(self.pcr_elapsed, 3),
+            # Hay señal si llegan paquetes con contenido y, si el stream lleva PCR, este avanza
+            "signal": total > null and (self.pcr_pid is None or self.pcr_advanced),
+            "pids": [
+                {"pid": pid, "packets": count, "bitrate_kbps": kbps(count), "cc_errors": self.pid_cc_errors.get(pid, 0)}
+                for pid, count in sorted(self.pid_packets.items())
+            ]
+        }
+        self.reset_window(now)
+        return report
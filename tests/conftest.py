@@ -0,0 +1,48 @@
+import copy
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(scope="session")
+def main_module():
+    """Importa main una sola vez desde la raíz del repositorio (lee config.json y monta frontend/)"""
+    previous = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        import main
+    finally:
+        os.chdir(previous)
+    return main
+
+
+@pytest.fixture
+def app_config(main_module, tmp_path, monkeypatch):
+    """`config` global de pruebas en un directorio temporal; se restaura la original al terminar.
+
+    Los tests la modifican en sitio, igual que el gestor, y construyen sus propios gestores.
+    """
+    monkeypatch.chdir(tmp_path)
+    saved = copy.deepcopy(main_module.config)
+    main_module.config.clear()
+    # Las opciones globales de config.json, sin canales ni almacenes persistentes
+    main_module.config.update({
+        key: value for key, value in saved.items()
+        if key not in ("state_db", "history_db", "run_directory", "detached_processes", "mode")
+    })
+    main_module.config.update({"log_directory": str(tmp_path / "logs"), "channels": []})
+    yield main_module.config
+    main_module.config.clear()
+    main_module.config.update(saved)
+
+
+@pytest.fixture
+def channel_definition():
+    def make(channel_id: int, **extra) -> dict:
+        return {"id": channel_id, "name": f"Canal {channel_id}", "enabled": True, "srt_port": 9000 + channel_id, **extra}
+    return make
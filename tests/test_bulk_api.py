@@ -0,0 +1,20 @@
+"""Validación de POST /api/channels/bulk: las peticiones mal formadas dan 400, no 500"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+
+@pytest.mark.parametrize("request_data", [
+    {"action": "stop", "ids": 3},
+    {"action": "stop", "ids": "1,2"},
+    {"action": "stop", "ids": [1, "2"]},
+    {"action": "stop", "ids": [True]},
+    {"action": "stop", "filter": ["crashed"]},
+    {"action": "stop", "filter": {"status": 5}},
+    {"action": "stop", "filter": {"name": ["a"]}},
+])
+def test_malformed_bulk_requests_are_rejected(main_module, request_data):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main_module.bulk_channels(request_data))
+    assert error.value.status_code == 400
@@ -0,0 +1,48 @@
+"""Recarga de configuración por delta: solo se tocan los canales cuya definición cambió"""
+import asyncio
+from types import SimpleNamespace
+
+
+def running(channel):
+    """Simula un canal en marcha: proceso vivo y comando ya construido en el spawn"""
+    channel.build_command()
+    channel.process = SimpleNamespace(pid=1, returncode=None)
+    return channel
+
+
+def test_apply_config_diffs_against_the_registry(main_module, app_config, channel_definition):
+    app_config["channels"] = [
+        channel_definition(1), channel_definition(2), channel_definition(3), channel_definition(4, enabled=False)
+    ]
+    manager = main_module.GlobalChannelManager(app_config["channels"])
+    first, second = running(manager.channels[1]), running(manager.channels[2])
+
+    added, removed, restart = manager._apply_config({**app_config, "channels": [
+        channel_definition(1, priority=5),  # No cambia el comando: no hace falta reiniciar
+        channel_definition(2, mode="caller", remote_ip="10.0.0.1", remote_port=7000),
+        channel_definition(4),
+        channel_definition(5, enabled=False),
+    ]})
+
+    assert [ch.id for ch in added] == [4]
+    assert [ch.id for ch in removed] == [3]
+    assert restart == [second]
+    assert manager.channels[1] is first and first.channel_config["priority"] == 5
+    assert sorted(manager.channels) == [1, 2, 4]
+    assert sorted(manager.channel_configs) == [1, 2, 4, 5]
+
+
+def test_apply_config_runs_actions_outside_the_lock(main_module, app_config, channel_definition, monkeypatch):
+    app_config["channels"] = [channel_definition(1), channel_definition(2)]
+    manager = main_module.GlobalChannelManager(app_config["channels"])
+    calls = []
+
+    async def bulk_action(action, channels, concurrency=10):
+        assert not manager.config_lock.locked()
+        calls.append((action, [ch.id for ch in channels]))
+
+    monkeypatch.setattr(manager, "bulk_action", bulk_action)
+    result = asyncio.run(manager.apply_config({**app_config, "channels": [channel_definition(2), channel_definition(3)]}))
+
+    assert result == {"added": [3], "removed": [1], "restarted": []}
+    assert calls == [("stop", [1]), ("restart", []), ("start", [3])]
@@ -0,0 +1,123 @@
+"""Reparto de canales del coordinador: autenticación de agentes, configuración enviada y reequilibrado"""
+import asyncio
+import json
+
+import pytest
+
+TOKEN = "secreto-de-prueba"
+
+
+class FakeAgentSocket:
+    """WebSocket de un agente simulado: responde a cada asignación con un informe de los canales habilitados"""
+    def __init__(self, agent_id: str, log: list, token: str = TOKEN, cpus: int = 4):
+        self.agent_id = agent_id
+        self.log = log
+        self.capacity = {"cpus": cpus, "load1": 0.0}
+        self.incoming = asyncio.Queue()
+        self.incoming.put_nowait(json.dumps({
+            "type": "register", "agent_id": agent_id, "token": token, "capacity": self.capacity, "channels": []
+        }))
+        self.assignments = []
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def receive_text(self):
+        return await self.incoming.get()
+
+    async def send_text(self, text: str):
+        message = json.loads(text)
+        if message["type"] != "assign":
+            return
+        self.assignments.append(message)
+        running = [ch["id"] for ch in message["channels"] if ch.get("enabled", True)]
+        self.log.append((self.agent_id, set(running)))
+        self.incoming.put_nowait(json.dumps({
+            "type": "report", "capacity": self.capacity,
+            "channels": [{"id": channel_id, "status": "active", "pid": 1} for channel_id in running]
+        }))
+
+    async def close(self, code: int = 1000):
+        self.closed = code
+
+
+@pytest.fixture
+def coordinator(main_module, app_config, channel_definition):
+    app_config.update({"agent_token": TOKEN, "admin_token": "admin", "agent_rebalance_threshold": 0.1})
+    app_config["channels"] = [channel_definition(i) for i in range(1, 5)]
+    manager = main_module.GlobalChannelManager(app_config["channels"], channel_class=main_module.RemoteChannel)
+    manager.coordinator = main_module.Coordinator(manager)
+    return manager.coordinator
+
+
+async def settle(coordinator):
+    for _ in range(20):
+        await asyncio.sleep(0.01)
+        if coordinator._rebalancer:
+            await coordinator._rebalancer
+
+
+def test_agent_joining_later_takes_its_share(coordinator):
+    async def scenario():
+        log = []
+        first, second = FakeAgentSocket("a1", log), FakeAgentSocket("a2", log)
+        tasks = [asyncio.create_task(coordinator.handle_agent(first))]
+        await settle(coordinator)
+        assert sorted(coordinator.agents["a1"].channels) == [1, 2, 3, 4]
+
+        tasks.append(asyncio.create_task(coordinator.handle_agent(second)))
+        await settle(coordinator)
+        for task in tasks:
+            task.cancel()
+        return log, first, second
+
+    log, first, second = asyncio.run(scenario())
+    agents = coordinator.agents
+    assert len(agents["a1"].channels) == 2 and len(agents["a2"].channels) == 2
+    # Traslado ordenado: a2 solo recibe un canal después de que a1 lo haya dejado
+    for channel_id in coordinator.agents["a2"].channels:
+        released = next(i for i, (agent, running) in enumerate(log) if agent == "a1" and channel_id not in running)
+        taken = next(i for i, (agent, running) in enumerate(log) if agent == "a2" and channel_id in running)
+        assert released < taken
+    for message in first.assignments + second.assignments:
+        assert "admin_token" not in message["config"]
+        assert "agent_token" not in message["config"]
+        assert "ffmpeg_command_template" not in message["config"]
+
+
+def test_balanced_agents_are_left_alone(coordinator):
+    async def scenario():
+        log = []
+        tasks = [asyncio.create_task(coordinator.handle_agent(FakeAgentSocket(name, log))) for name in ("a1", "a2")]
+        await settle(coordinator)
+        placed = {name: sorted(agent.channels) for name, agent in coordinator.agents.items()}
+        coordinator.schedule_rebalance()
+        await settle(coordinator)
+        for task in tasks:
+            task.cancel()
+        return placed
+
+    placed = asyncio.run(scenario())
+    assert {name: sorted(agent.channels) for name, agent in coordinator.agents.items()} == placed
+    assert sorted(len(channels) for channels in placed.values()) == [2, 2]
+
+
+def test_agents_need_the_shared_token(coordinator):
+    async def scenario():
+        log = []
+        intruder = FakeAgentSocket("a1", log, token="otro")
+        await coordinator.handle_agent(intruder)
+        legitimate = FakeAgentSocket("a1", log)
+        task = asyncio.create_task(coordinator.handle_agent(legitimate))
+        await settle(coordinator)
+        # Reutilizar el ID de un agente conectado no permite quedarse con sus canales
+        impostor = FakeAgentSocket("a1", log)
+        await coordinator.handle_agent(impostor)
+        task.cancel()
+        return intruder, impostor
+
+    intruder, impostor = asyncio.run(scenario())
+    assert intruder.closed == 1008 and not intruder.assignments
+    assert impostor.closed == 1008 and not impostor.assignments
+    assert sorted(coordinator.agents["a1"].channels) == [1, 2, 3, 4]
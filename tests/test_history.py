@@ -0,0 +1,57 @@
+"""Histórico de estados: el tiempo sin vigilancia (caída del gestor, huecos sin muestras) no cuenta como activo"""
+import asyncio
+import math
+import sqlite3
+import time
+
+
+def sample(channel_id):
+    return (channel_id, (25.0, 4000.0, 1.0, 0.0, 0.0))
+
+
+def test_gap_without_samples_counts_as_offline(main_module):
+    buckets = list(range(0, 40)) + list(range(70, 100))
+
+    uptime = main_module.HistoryStore.uptime((0, "active"), [], 0, 100, buckets, 1)
+
+    assert uptime["durations"]["active"] == 70
+    assert uptime["durations"]["offline"] == 30
+    assert uptime["uptime"] == 0.7
+    assert uptime["drops"] == [{"at": 40, "status": "offline"}]
+
+
+def test_short_gaps_and_unsampled_windows_are_not_drops(main_module):
+    buckets = [t for t in range(0, 100) if t not in (10, 11, 12)]
+
+    uptime = main_module.HistoryStore.uptime((0, "active"), [], 0, 100, buckets, 1)
+    # Sin buckets todavía agregados a partir de 50: no es un hueco
+    partial = main_module.HistoryStore.uptime((0, "active"), [], 0, 100, buckets[:47], 1, (0, 50))
+
+    assert uptime["uptime"] == 1.0 and uptime["drops"] == []
+    assert partial["uptime"] == 1.0 and partial["drops"] == []
+
+
+def test_crash_is_closed_as_offline_at_the_last_heartbeat(main_module, app_config, tmp_path):
+    path = str(tmp_path / "history.db")
+    now = time.time()
+    start = now - 300
+    history = main_module.HistoryStore(path)
+    history.record_status(1, "active", start)
+    for t in range(int(start), int(start) + 60):
+        history.record_samples(t, [sample(1)])
+    # El gestor muere sin close_history(): no se escribe "offline"
+    history.executor.shutdown(wait=True)
+    history.conn.close()
+    history.read_conn.close()
+
+    restarted = main_module.HistoryStore(path)
+    restarted.record_status(1, "active", now)
+    restarted.record_samples(now, [sample(1)])
+    result = asyncio.run(restarted.query(1, start, now, "1s"))
+    restarted.close()
+
+    events = sqlite3.connect(path).execute("SELECT at, status FROM status_events ORDER BY at").fetchall()
+    assert [status for _, status in events] == ["active", "offline", "active"]
+    assert events[1][0] == int(start) + 59
+    assert math.isclose(result["uptime"]["durations"]["active"], int(start) + 59 - start, abs_tol=0.001)
+    assert result["uptime"]["drops"][0]["status"] == "offline"
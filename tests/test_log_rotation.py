@@ -0,0 +1,48 @@
+"""Rotación de logs: las partes por tamaño de una ejecución no desplazan los logs de ejecuciones anteriores"""
+import os
+
+
+def names(log_directory):
+    return sorted(os.listdir(log_directory))
+
+
+def test_size_rotation_keeps_previous_runs(main_module, app_config, channel_definition):
+    app_config.update({"log_backup_count": 2, "log_max_parts": 3, "log_max_bytes": 100, "log_rotate_interval": 0})
+    channel = main_module.GlobalChannelManager([channel_definition(1)]).channels[1]
+    base = channel.log_path.name
+
+    channel.open_log()
+    channel._write_log("ejecución 1: caída\n", tail=False)
+    channel.open_log()
+    # Ejecución muy habladora: muchas rotaciones por tamaño
+    for i in range(40):
+        channel._write_log(f"ejecución 2, línea {i:02d} " + "x" * 30 + "\n", tail=False)
+    channel.log_file.close()
+
+    files = names(app_config["log_directory"])
+    assert f"{base}.1" in files
+    with open(channel.run_log_base(1), encoding="utf-8") as f:
+        assert f.read() == "ejecución 1: caída\n"
+    assert [path.name for path in channel.run_log_files(0)] == [base, f"{base}.part1", f"{base}.part2", f"{base}.part3"]
+
+
+def test_runs_are_archived_with_their_parts_and_pruned_by_count(main_module, app_config, channel_definition):
+    app_config.update({"log_backup_count": 2, "log_max_parts": 2, "log_max_bytes": 50, "log_rotate_interval": 0})
+    channel = main_module.GlobalChannelManager([channel_definition(1)]).channels[1]
+    base = channel.log_path.name
+
+    for run in range(1, 5):
+        channel.open_log()
+        for i in range(3):
+            channel._write_log(f"ejecución {run}, línea {i} " + "x" * 40 + "\n", tail=False)
+    channel.log_file.close()
+
+    # Ejecución 4 en curso, 3 y 2 archivadas con sus partes; la 1 se eliminó entera
+    assert names(app_config["log_directory"]) == sorted([
+        base, f"{base}.part1", f"{base}.part2",
+        f"{base}.1", f"{base}.1.part1", f"{base}.1.part2",
+        f"{base}.2", f"{base}.2.part1", f"{base}.2.part2",
+    ])
+    # Cada línea supera log_max_bytes: la primera de cada ejecución ya salió de sus log_max_parts partes
+    with open(channel.run_log_files(2)[-1], encoding="utf-8") as f:
+        assert f.read().startswith("ejecución 2, línea 1")
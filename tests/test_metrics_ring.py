@@ -0,0 +1,32 @@
+import math
+import time
+
+from metrics import MetricsRing
+
+
+def values(fps: float) -> tuple:
+    return (fps, 4000.0, 1.0, 0.0, 0.0, fps / 25)
+
+
+def test_ring_keeps_the_latest_samples_in_order():
+    ring = MetricsRing(4)
+    now = time.time()
+    for i in range(6):
+        ring.append(now - 6 + i, values(float(i)))
+    assert ring.latest()["fps"] == 5.0
+    assert ring.window(60)["fps"] == [2.0, 3.0, 4.0, 5.0]
+
+
+def test_mean_since_skips_missing_values():
+    ring = MetricsRing(8)
+    ring.append(10.0, values(20.0))
+    ring.append(11.0, values(math.nan))
+    ring.append(12.0, values(30.0))
+    assert ring.mean_since(11.0)["fps"] == 30.0
+    assert math.isnan(ring.mean_since(20.0)["fps"])
+
+
+def test_window_maps_nan_to_none():
+    ring = MetricsRing(2)
+    ring.append(time.time(), values(math.nan))
+    assert ring.window(60)["fps"] == [None]
@@ -0,0 +1,66 @@
+"""Definiciones de canales en config.json frente a su copia en state_db al arrancar"""
+import json
+import os
+import time
+
+
+def write_config(app_config, channels, mtime=None):
+    app_config["channels"] = channels
+    with open("config.json", "w") as f:
+        json.dump(app_config, f)
+    if mtime is not None:
+        os.utime("config.json", (mtime, mtime))
+
+
+def start_manager(main_module, app_config):
+    manager = main_module.GlobalChannelManager(app_config["channels"])
+    stored = manager.config_store.state_db.load_channels()[0]
+    manager.config_store.state_db.close()
+    return manager, [ch["id"] for ch in stored]
+
+
+def seed_state_db(main_module, path, channels):
+    state_db = main_module.StateDB(path)
+    state_db.save_channels(channels).result()
+    state_db.close()
+
+
+def test_config_json_edited_while_down_wins(main_module, app_config, channel_definition):
+    app_config["state_db"] = "state.db"
+    seed_state_db(main_module, "state.db", [channel_definition(1), channel_definition(2)])
+    # Edición a mano con el gestor parado: config.json queda más reciente que la base de datos
+    write_config(app_config, [channel_definition(1), channel_definition(2), channel_definition(5)], time.time() + 5)
+
+    manager, stored_ids = start_manager(main_module, app_config)
+
+    assert sorted(manager.channels) == [1, 2, 5]
+    assert [ch["id"] for ch in app_config["channels"]] == [1, 2, 5]
+    assert stored_ids == [1, 2, 5]
+
+
+def test_newer_state_db_wins_over_stale_config_json(main_module, app_config, channel_definition, caplog):
+    app_config["state_db"] = "state.db"
+    # config.json no llegó a escribirse tras el último guardado en la base de datos
+    write_config(app_config, [channel_definition(1)], time.time() - 60)
+    seed_state_db(main_module, "state.db", [channel_definition(1), channel_definition(2)])
+
+    manager, stored_ids = start_manager(main_module, app_config)
+
+    assert sorted(manager.channels) == [1, 2]
+    assert [ch["id"] for ch in app_config["channels"]] == [1, 2]
+    assert "se reescribirá" in caplog.text
+
+
+def test_state_db_without_timestamp_keeps_config_json(main_module, app_config, channel_definition, caplog):
+    app_config["state_db"] = "state.db"
+    seed_state_db(main_module, "state.db", [channel_definition(1), channel_definition(2)])
+    state_db = main_module.StateDB("state.db")
+    state_db.executor.submit(lambda: state_db.conn.execute("DELETE FROM meta") and state_db.conn.commit()).result()
+    state_db.close()
+    write_config(app_config, [channel_definition(3)], time.time() - 60)
+
+    manager, stored_ids = start_manager(main_module, app_config)
+
+    assert sorted(manager.channels) == [3]
+    assert stored_ids == [3]
+    assert "no se sabe cuál es más reciente" in caplog.text
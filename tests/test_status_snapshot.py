@@ -0,0 +1,37 @@
+"""Snapshot de GET /api/status: disponible antes del primer tick y sin bloquear tras un reinicio"""
+import asyncio
+import json
+import time
+
+
+def test_snapshot_before_first_publish_lists_channels(main_module, app_config, channel_definition):
+    app_config["channels"] = [channel_definition(1), channel_definition(2)]
+    broadcaster = main_module.GlobalChannelManager(app_config["channels"]).broadcaster
+
+    etag, version, body = broadcaster.http_snapshot(compressed=False)
+
+    assert version == 1
+    assert sorted(state["id"] for state in json.loads(body)["channels"]) == [1, 2]
+
+
+def test_pending_changes_are_published_before_answering(main_module, app_config, channel_definition):
+    app_config["channels"] = [channel_definition(1)]
+    manager = main_module.GlobalChannelManager(app_config["channels"])
+    first_etag, _, _ = manager.broadcaster.http_snapshot(compressed=False)
+    manager.channels[1].status = "error"
+    manager.broadcaster.notify()
+
+    etag, version, body = manager.broadcaster.http_snapshot(compressed=False)
+
+    assert etag != first_etag
+    assert json.loads(body)["channels"][0]["status"] == "error"
+
+
+def test_wait_for_a_version_from_a_previous_run_returns_at_once(main_module, app_config, channel_definition):
+    app_config["channels"] = [channel_definition(1)]
+    broadcaster = main_module.GlobalChannelManager(app_config["channels"]).broadcaster
+
+    started = time.monotonic()
+    asyncio.run(broadcaster.wait_version(500, timeout=5))
+
+    assert time.monotonic() - started < 1
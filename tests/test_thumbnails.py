@@ -0,0 +1,38 @@
+"""Opciones de la salida de miniaturas: no deben alterar la salida principal"""
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture
+def thumbnail_channel(main_module, app_config, channel_definition):
+    fake_ffmpeg = str(Path(main_module.__file__).with_name("fake_ffmpeg.py"))
+    app_config.update({"thumbnails": True, "thumbnail_interval": 10})
+    app_config["ffmpeg_command_template"] = [fake_ffmpeg, "-i", "{srt_url}", "-f", "null", "-"]
+
+    def make(template=None, **options):
+        app_config.update(options)
+        if template:
+            app_config["ffmpeg_command_template"] = [fake_ffmpeg, *template]
+        return main_module.GlobalChannelManager([channel_definition(1)]).channels[1]
+    return make
+
+
+def test_recent_ffmpeg_scopes_fps_mode_to_the_thumbnail_output(thumbnail_channel):
+    command = thumbnail_channel().build_command()
+    thumbnails = command[command.index("-map"):]
+    assert "-vsync" not in command
+    assert thumbnails[thumbnails.index("-fps_mode:v") + 1] == "vfr"
+    assert "-skip_frame" not in command  # La salida principal ya decodifica
+
+
+def test_old_ffmpeg_limits_the_rate_with_the_fps_filter(thumbnail_channel):
+    command = thumbnail_channel(thumbnail_fps_mode=False).build_command()
+    assert "-vsync" not in command and "-fps_mode:v" not in command
+    assert ",fps=1/10," in command[command.index("-vf") + 1]
+
+
+def test_stream_copy_decodes_only_keyframes(thumbnail_channel):
+    command = thumbnail_channel(["-i", "{srt_url}", "-c", "copy", "-f", "mpegts", "{multicast_url}"]).build_command()
+    assert command[command.index("-skip_frame") + 1] == "nokey"
+    assert command.index("-skip_frame") < command.index("-i")